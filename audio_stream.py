@@ -0,0 +1,169 @@
+"""
+分块解码 MP3 / WAV，内存占用与文件时长无关
+
+MP3 按帧切分，每块前后多带几帧一起解码再裁掉，保证位储备（bit reservoir）
+和重采样在块边界处连续；WAV 按块读取，格式与混音器一致时直接使用 PCM 数据。
+解码结果为混音器格式的 int16 数组，形状为 (帧数, 声道数)，需要先初始化 pygame.mixer。
+"""
+import io
+import wave
+import numpy as np
+import pygame
+
+STREAM_CHUNK_SECONDS = 1.0  # 每块的时长
+MP3_PREROLL_FRAMES = 6  # 每块之前多解码的帧数，覆盖位储备引用的前几帧
+MP3_POSTROLL_FRAMES = 2  # 每块之后多解码的帧数，避免重采样丢失块尾
+WAV_MARGIN_SECONDS = 0.01  # WAV 需要重采样时每块前后多解码的时长
+READ_SIZE = 65536
+
+MP3_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MP3_SAMPLE_RATES = (44100, 48000, 32000)
+
+def parse_mp3_header(b0, b1, b2, b3):
+    """解析MP3帧头，返回 (采样率, 声道数, 每帧样本数, 帧长度)，不是有效帧头时返回None"""
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version_bits = (b1 >> 3) & 3  # 3: MPEG1, 2: MPEG2, 0: MPEG2.5
+    layer = 4 - ((b1 >> 1) & 3)
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 3
+    if version_bits == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    version = 1 if version_bits == 3 else 2
+    bitrate = MP3_BITRATES[(version, layer)][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[rate_index] >> {3: 0, 2: 1, 0: 2}[version_bits]
+    padding = (b2 >> 1) & 1
+    channels = 1 if (b3 >> 6) == 3 else 2
+    if layer == 1:
+        return sample_rate, channels, 384, (12 * bitrate // sample_rate + padding) * 4
+    if layer == 3 and version == 2:
+        return sample_rate, channels, 576, 72 * bitrate // sample_rate + padding
+    return sample_rate, channels, 1152, 144 * bitrate // sample_rate + padding
+
+def iter_mp3_frames(path):
+    """依次读取MP3帧，返回 (帧数据, 采样率, 声道数, 每帧样本数)，跳过标签和无法识别的数据"""
+    with open(path, 'rb') as f:
+        header = f.read(10)
+        if header[:3] == b'ID3' and len(header) == 10:
+            f.seek(10 + ((header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9])
+                   + (10 if header[5] & 0x10 else 0))
+        else:
+            f.seek(0)
+        data = b''
+        pos = 0
+        while True:
+            info = None
+            if len(data) - pos >= 4:
+                info = parse_mp3_header(data[pos], data[pos + 1], data[pos + 2], data[pos + 3])
+                if info is None:
+                    pos += 1
+                    continue
+                if len(data) - pos >= info[3]:
+                    sample_rate, channels, samples, length = info
+                    yield data[pos:pos + length], sample_rate, channels, samples
+                    pos += length
+                    continue
+            # 剩余数据不足一个帧头或一帧，继续读取
+            more = f.read(READ_SIZE)
+            if not more:
+                return  # 文件末尾不完整的帧
+            data = data[pos:] + more
+            pos = 0
+
+def decode_segment(blob, skip, keep, source_rate):
+    """解码一段音频（带完整文件头），裁掉前 skip 个、保留 keep 个源样本对应的部分"""
+    frequency = pygame.mixer.get_init()[0]
+    samples = pygame.sndarray.array(pygame.mixer.Sound(io.BytesIO(blob)))
+    if samples.ndim == 1:
+        samples = samples[:, np.newaxis]
+    ratio = frequency / source_rate
+    return samples[round(skip * ratio):round((skip + keep) * ratio)]
+
+def iter_mp3_chunks(path, chunk_seconds=STREAM_CHUNK_SECONDS):
+    """分块解码MP3"""
+    frames = []  # 已读取、尚未输出的帧，最前面是上一块末尾的预解码帧
+    start = 0  # 当前块第一帧在 frames 中的位置
+    per_chunk = None
+    samples = source_rate = None
+    for frame, source_rate, _, samples in iter_mp3_frames(path):
+        frames.append(frame)
+        if per_chunk is None:
+            per_chunk = max(1, int(chunk_seconds * source_rate / samples))
+        if len(frames) - start < per_chunk + MP3_POSTROLL_FRAMES:
+            continue
+        first = max(0, start - MP3_PREROLL_FRAMES)
+        blob = b''.join(frames[first:start + per_chunk + MP3_POSTROLL_FRAMES])
+        yield decode_segment(blob, (start - first) * samples, per_chunk * samples, source_rate)
+        drop = max(0, start + per_chunk - MP3_PREROLL_FRAMES)
+        del frames[:drop]
+        start += per_chunk - drop
+    if len(frames) > start:
+        first = max(0, start - MP3_PREROLL_FRAMES)
+        yield decode_segment(b''.join(frames[first:]), (start - first) * samples,
+                             (len(frames) - start) * samples, source_rate)
+
+def wav_blob(params, data):
+    """把 PCM 数据包装成完整的 WAV 文件"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as out:
+        out.setnchannels(params.nchannels)
+        out.setsampwidth(params.sampwidth)
+        out.setframerate(params.framerate)
+        out.writeframes(data)
+    return buffer.getvalue()
+
+def iter_wav_chunks(path, chunk_seconds=STREAM_CHUNK_SECONDS):
+    """分块读取PCM WAV，格式与混音器一致时不经过转换"""
+    frequency, size, channels = pygame.mixer.get_init()
+    with wave.open(path, 'rb') as wav:
+        params = wav.getparams()
+        chunk_frames = max(1, int(chunk_seconds * params.framerate))
+        frame_bytes = params.nchannels * params.sampwidth
+        if (params.framerate, params.sampwidth, params.nchannels) == (frequency, abs(size) // 8, channels) \
+                and size < 0:
+            while True:
+                data = wav.readframes(chunk_frames)
+                if not data:
+                    return
+                yield np.frombuffer(data, np.int16).reshape(-1, channels)
+
+        # 需要转换格式或重采样：每块前后多带一点数据，转换后裁掉
+        margin = int(WAV_MARGIN_SECONDS * params.framerate)
+        previous = b''
+        data = wav.readframes(chunk_frames)
+        while data:
+            following = wav.readframes(chunk_frames)
+            blob = wav_blob(params, previous + data + following[:margin * frame_bytes])
+            yield decode_segment(blob, len(previous) // frame_bytes, len(data) // frame_bytes,
+                                 params.framerate)
+            previous = data[-margin * frame_bytes:] if margin else b''
+            data = following
+
+def iter_chunks(path, chunk_seconds=STREAM_CHUNK_SECONDS):
+    """按文件内容选择解码方式，返回混音器格式的样本块生成器"""
+    with open(path, 'rb') as f:
+        header = f.read(12)
+    if header[:4] == b'RIFF' and header[8:12] == b'WAVE':
+        return iter_wav_chunks(path, chunk_seconds)
+    return iter_mp3_chunks(path, chunk_seconds)
+
+def source_channels(path):
+    """源文件的声道数（混音器会把单声道复制为多声道），无法识别时返回None"""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(12)
+        if header[:4] == b'RIFF' and header[8:12] == b'WAVE':
+            with wave.open(path, 'rb') as wav:
+                return wav.getnchannels()
+        for _, _, channels, _ in iter_mp3_frames(path):
+            return channels
+    except (OSError, wave.Error, EOFError):
+        pass
+    return None
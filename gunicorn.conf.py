@@ -0,0 +1,23 @@
+# Time-Play 生产环境 gunicorn 配置
+# 多个工作进程中只有取得主进程锁的一个运行定时任务和音频设备，
+# 其余进程处理网页请求并把播放命令转发给它。
+import os
+
+bind = os.environ.get('TIME_PLAY_BIND', '0.0.0.0:80')
+
+# 线程型工作进程，SSE 长连接各占一个线程
+worker_class = 'gthread'
+workers = int(os.environ.get('TIME_PLAY_WORKERS', '2'))
+threads = int(os.environ.get('TIME_PLAY_THREADS', '16'))
+
+# 不预加载应用，每个工作进程在 fork 之后各自初始化，避免共享音频设备和线程
+preload_app = False
+
+# SSE 连接会长时间保持，超时只针对无响应的工作进程
+timeout = 60
+graceful_timeout = 10
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+loglevel = 'info'
@@ -0,0 +1,165 @@
+"""
+音频响度分析（ITU-R BS.1770 / EBU R128 积分响度和采样峰值）
+
+在独立的工作进程中运行：WAV 文件按块读取，MP3 用 audio_stream 分块解码。
+滤波和分块能量计算均由 NumPy/SciPy 向量化完成，内存占用与文件时长无关。
+"""
+import os
+import wave
+import numpy as np
+from scipy import signal
+
+ANALYSIS_VERSION = 1  # 算法变化时递增，已保存的结果会重新分析
+BLOCK_SECONDS = 0.4  # 门限块长度
+STEP_SECONDS = 0.1  # 门限块步长（75% 重叠）
+CHUNK_SECONDS = 10  # 每次读取和滤波的长度
+ABSOLUTE_GATE = -70.0  # 绝对门限（LUFS）
+RELATIVE_GATE = -10.0  # 相对门限（LU）
+
+def k_weighting(sample_rate):
+    """K 计权滤波器（高频搁架 + 高通），返回 SOS 系数
+
+    按 BS.1770 的参数对任意采样率计算，48kHz 时与标准给出的系数一致。
+    """
+    # 第一级：约 +4dB 的高频搁架
+    gain_db, q, frequency = 3.99984385397, 0.7071752369554193, 1681.9744509555319
+    k = np.tan(np.pi * frequency / sample_rate)
+    vh = 10 ** (gain_db / 20)
+    vb = vh ** 0.499666774155
+    a0 = 1 + k / q + k * k
+    shelf = [(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0,
+             1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    # 第二级：38Hz 高通
+    q, frequency = 0.5003270373253953, 38.13547087613982
+    k = np.tan(np.pi * frequency / sample_rate)
+    a0 = 1 + k / q + k * k
+    highpass = [1.0, -2.0, 1.0, 1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    return np.array([shelf, highpass])
+
+class LoudnessMeter:
+    """逐块输入 PCM 数据，累计每 100ms 的 K 计权能量和峰值"""
+
+    def __init__(self, sample_rate, channels):
+        self.sample_rate = sample_rate
+        self.step = int(round(sample_rate * STEP_SECONDS))
+        self.sos = k_weighting(sample_rate)
+        self.zi = np.zeros((self.sos.shape[0], 2, channels))
+        self.pending = np.zeros((0, channels))  # 不足一个步长的剩余样本
+        self.energies = []  # 每 100ms 各声道的能量和
+        self.peak = 0.0
+
+    def feed(self, samples):
+        """输入 (帧数, 声道数) 的浮点样本，取值范围 -1~1"""
+        if not len(samples):
+            return
+        self.peak = max(self.peak, float(np.abs(samples).max()))
+        filtered, self.zi = signal.sosfilt(self.sos, samples, axis=0, zi=self.zi)
+        filtered = np.concatenate([self.pending, filtered])
+        usable = len(filtered) // self.step * self.step
+        squares = np.square(filtered[:usable])
+        self.energies.append(squares.reshape(-1, self.step, squares.shape[1]).sum(axis=1))
+        self.pending = filtered[usable:]
+
+    def result(self):
+        """返回 {'loudness': 积分响度(LUFS), 'peak': 采样峰值(dBFS)}，静音时为None"""
+        peak = float(20 * np.log10(self.peak)) if self.peak > 0 else None
+        energies = np.concatenate(self.energies) if self.energies else np.zeros((0, 1))
+        steps = int(round(BLOCK_SECONDS / STEP_SECONDS))
+        if len(energies) < steps:
+            return {'loudness': None, 'peak': peak}
+
+        # 400ms 块 = 连续 4 个 100ms 能量之和，各声道权重为 1（不含环绕声道）
+        cumulative = np.concatenate([np.zeros((1, energies.shape[1])), np.cumsum(energies, axis=0)])
+        blocks = (cumulative[steps:] - cumulative[:-steps]) / (steps * self.step)
+        block_power = blocks.sum(axis=1)
+        with np.errstate(divide='ignore'):
+            block_loudness = -0.691 + 10 * np.log10(block_power)
+
+        gated = block_loudness > ABSOLUTE_GATE
+        if not gated.any():
+            return {'loudness': None, 'peak': peak}
+        threshold = -0.691 + 10 * np.log10(block_power[gated].mean()) + RELATIVE_GATE
+        gated &= block_loudness > threshold
+        loudness = -0.691 + 10 * np.log10(block_power[gated].mean())
+        return {'loudness': float(loudness), 'peak': peak}
+
+def read_wav(path):
+    """按块读取 PCM WAV 文件，返回 (采样率, 声道数, 样本块生成器)"""
+    wav = wave.open(path, 'rb')
+    sample_rate, channels, width = wav.getframerate(), wav.getnchannels(), wav.getsampwidth()
+    chunk_frames = int(sample_rate * CHUNK_SECONDS)
+
+    def chunks():
+        with wav:
+            while True:
+                data = wav.readframes(chunk_frames)
+                if not data:
+                    break
+                if width == 1:
+                    samples = (np.frombuffer(data, np.uint8).astype(np.float32) - 128) / 128
+                elif width == 3:
+                    raw = np.frombuffer(data, np.uint8).reshape(-1, 3)
+                    values = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8)
+                              | (raw[:, 2].astype(np.int8).astype(np.int32) << 16))
+                    samples = values.astype(np.float32) / 8388608
+                else:
+                    dtype = {2: '<i2', 4: '<i4'}[width]
+                    samples = np.frombuffer(data, dtype).astype(np.float32) / float(2 ** (8 * width - 1))
+                yield samples.reshape(-1, channels)
+
+    return sample_rate, channels, chunks()
+
+def decode_with_pygame(path):
+    """用 pygame 解码，返回 (采样率, 声道数, 样本块生成器)
+
+    MP3 分块解码，内存占用与时长无关；非 PCM 编码的 WAV 只能整体解码。
+    """
+    import pygame
+    import audio_stream
+    if not pygame.mixer.get_init():
+        pygame.mixer.init(frequency=44100, size=-16, channels=2)
+    sample_rate, size, _ = pygame.mixer.get_init()
+    scale = float(2 ** (abs(size) - 1))
+    channels = audio_stream.source_channels(path)
+    if channels is not None:
+        arrays = audio_stream.iter_mp3_chunks(path, CHUNK_SECONDS)
+    else:
+        samples = pygame.sndarray.array(pygame.mixer.Sound(path))
+        if samples.ndim == 1:
+            samples = samples[:, np.newaxis]
+        channels = 1 if samples.shape[1] == 2 and np.array_equal(samples[:, 0], samples[:, 1]) else samples.shape[1]
+        chunk_frames = int(sample_rate * CHUNK_SECONDS)
+        arrays = (samples[start:start + chunk_frames] for start in range(0, len(samples), chunk_frames))
+
+    def chunks():
+        # 单声道文件被混音器复制成了多个声道，只取第一个声道
+        for samples in arrays:
+            yield samples[:, :channels].astype(np.float32) / scale
+
+    return sample_rate, channels, chunks()
+
+def analyze_file(path):
+    """分析一个音频文件，返回 {'loudness': LUFS, 'peak': dBFS, 'version': 算法版本}"""
+    try:
+        sample_rate, channels, chunks = read_wav(path)
+    except (wave.Error, EOFError, KeyError):
+        # 非 PCM WAV 或其他格式交给 pygame 解码
+        sample_rate, channels, chunks = decode_with_pygame(path)
+    meter = LoudnessMeter(sample_rate, channels)
+    for samples in chunks:
+        meter.feed(samples)
+    result = meter.result()
+    return {
+        'loudness': None if result['loudness'] is None else round(result['loudness'], 2) + 0.0,
+        'peak': None if result['peak'] is None else round(result['peak'], 2) + 0.0,
+        'version': ANALYSIS_VERSION
+    }
+
+def init_worker():
+    """工作进程初始化：降低优先级，不影响播放；pygame 只用于解码，不打开声卡"""
+    try:
+        os.nice(10)
+    except OSError:
+        pass
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    os.environ.pop('AUDIODEV', None)
@@ -27,7 +27,7 @@ Environment=PATH=$VENV_PATH/bin:/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bi
 Environment=PYTHONPATH=$PROJECT_PATH
 Environment=LC_ALL=zh_CN.UTF-8
 Environment=LANG=zh_CN.UTF-8
-ExecStart=$VENV_PATH/bin/python3 $PROJECT_PATH/play_music.py
+ExecStart=$VENV_PATH/bin/gunicorn -c $PROJECT_PATH/gunicorn.conf.py wsgi:app
 Restart=always
 RestartSec=5
 
@@ -5,15 +5,42 @@ import json
 import datetime
 import logging
 import threading
-from flask import Flask, render_template, request, jsonify, send_from_directory, redirect, url_for, flash
+import bisect
+import queue
+import uuid
+import itertools
+import sqlite3
+import fcntl
+import hashlib
+import copy
+import contextlib
+import subprocess
+import multiprocessing
+import atexit
+import struct
+import random
+import wave
+import secrets
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.connection import Listener, Client
+from array import array
+try:
+    import alsaaudio  # 可选：pyalsaaudio，直接调用 ALSA 混音器
+except ImportError:
+    alsaaudio = None
+from flask import Flask, Response, render_template, request, jsonify, send_from_directory, redirect, url_for, flash
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 import chinese_calendar
 import pygame
 import pkg_resources
-from collections import deque
+from collections import deque, OrderedDict
 import schedule
 import numpy as np
+import loudness
+import audio_stream
+from audio_stream import MP3_BITRATES, MP3_SAMPLE_RATES
 import locale
 
 # 初始化日志记录器
@@ -25,6 +52,15 @@ LOG_DIR = os.path.join(os.path.expanduser('~'), '.time-play', 'logs')
 LOG_FILE = os.path.join(LOG_DIR, 'app.log')
 os.makedirs(LOG_DIR, mode=0o700, exist_ok=True)
 
+# 数据文件路径
+DATA_DIR = os.path.join(os.path.expanduser('~'), '.time-play')
+HISTORY_DB = os.path.join(DATA_DIR, 'history.db')
+LEADER_LOCK_FILE = os.path.join(DATA_DIR, 'leader.lock')  # 多进程部署时的主进程锁
+CONTROL_SOCKET = os.path.join(DATA_DIR, 'control.sock')  # 主进程的控制通道
+CONTROL_KEY_FILE = os.path.join(DATA_DIR, 'control.key')  # 控制通道的认证密钥，每个部署随机生成
+MUSIC_INDEX_FILE = os.path.join(DATA_DIR, 'music_index.json')  # 音乐库索引
+LOUDNESS_FILE = os.path.join(DATA_DIR, 'loudness.json')  # 按文件内容哈希保存的响度分析结果
+
 # 配置文件路径
 CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config')
 CONFIG_FILE = os.path.join(CONFIG_DIR, 'config.json')
@@ -48,11 +84,9 @@ class MemoryHandler(logging.Handler):
         try:
             # 格式化日志消息
             msg = self.format(record)
-            # 添加到缓冲区
-            log_buffer.append(msg)
-            # 保持最近1000条日志
-            if len(log_buffer) > 1000:
-                log_buffer.pop(0)
+            # 添加到缓冲区（保持最近1000条日志）
+            seq = append_log_line(msg)
+            event_bus.publish('logs', {'lines': [msg], 'last_seq': seq})
         except Exception:
             self.handleError(record)
 
@@ -62,8 +96,97 @@ memory_handler = MemoryHandler()
 memory_handler.setFormatter(formatter)
 logger.addHandler(memory_handler)
 
-# 创建一个环形缓冲区来存储最近的日志
+# 创建一个环形缓冲区来存储最近的日志，每条记录为 (序号, 日志行)
 log_buffer = deque(maxlen=1000)
+log_seq = 0  # 最近一条日志的序号，单调递增，清除日志后也不重置
+log_cleared_seq = 0  # 最近一次清除日志时的序号
+log_lock = threading.Lock()
+MAX_LOG_LINES = 1000  # 单次返回的最大日志条数
+
+def append_log_line(line):
+    """追加一条日志到缓冲区，返回其序号"""
+    global log_seq
+    with log_lock:
+        log_seq += 1
+        log_buffer.append((log_seq, line))
+        return log_seq
+
+def clear_log_buffer():
+    """清空内存中的日志并通知页面"""
+    global log_seq, log_cleared_seq
+    with log_lock:
+        log_buffer.clear()
+        # 清除操作占用一个序号，此前取得的游标都会收到 reset
+        log_seq += 1
+        log_cleared_seq = log_seq
+    event_bus.publish('logs_cleared', {'last_seq': log_cleared_seq})
+
+def get_logs_since(since, limit):
+    """返回序号大于 since 的日志，最多 limit 条
+
+    since 早于缓冲区中最早的日志或日志已被清除时返回最近的 limit 条并标记 reset，
+    客户端应替换而不是追加。
+    """
+    with log_lock:
+        last_seq = log_seq
+        first_seq = log_buffer[0][0] if log_buffer else last_seq + 1
+        reset = since < log_cleared_seq or since < first_seq - 1 or since > last_seq
+        if reset:
+            count = min(limit, len(log_buffer))
+        else:
+            count = last_seq - since
+        # 新日志位于缓冲区尾部，从尾部取，代价只与新日志条数有关
+        entries = list(itertools.islice(reversed(log_buffer), count))
+    entries.reverse()
+    more = not reset and len(entries) > limit
+    if more:
+        entries = entries[:limit]
+    return {
+        'logs': [line for _, line in entries],
+        'last_seq': entries[-1][0] if entries else (last_seq if reset else since),
+        'reset': reset,
+        'more': more
+    }
+
+# 服务器推送事件
+class EventBroadcaster:
+    """服务器推送事件的发布/订阅中心，每个订阅者一个有界队列"""
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self.lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def has_subscribers(self):
+        return bool(self.subscribers)
+
+    def publish(self, event, data):
+        """向所有订阅者发布事件；消费过慢的订阅者改为收到一次完整同步"""
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((event, data))
+            except queue.Full:
+                # 此处不能写日志，日志处理器本身会调用 publish
+                try:
+                    while True:
+                        subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                subscriber.put_nowait(('resync', None))
+
+event_bus = EventBroadcaster()
 
 def get_calendar_version():
     """获取日历版本信息"""
@@ -115,7 +238,104 @@ app.config['SECRET_KEY'] = 'your_secret_key_here'
 
 # 全局变量
 MUSIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'music')
+USERS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'users.json')
 schedule_thread = None
+schedule_wakeup = threading.Event()  # 时间表变化时唤醒定时任务线程
+schedule_changes = queue.Queue()  # 发给定时任务线程的时间表修改：(修改前的版本号, [(操作, 任务), ...])，None 表示重新加载
+SCHEDULE_MAX_SLEEP = 60  # 单次休眠上限（秒），用于感知系统时间校准
+SCHEDULE_MISFIRE_SECONDS = 60  # 延迟不超过该值的触发视为准时，超过时按任务的错过策略处理
+MISFIRE_POLICIES = ('skip', 'run_late', 'coalesce')  # 错过策略：跳过、宽限时间内逐次补播、宽限时间内只补播最近一次
+DEFAULT_MISFIRE_GRACE_SECONDS = 600  # 补播的宽限时间（秒），可通过 config.json 的 misfire_grace_seconds 调整
+SCHEDULE_RECOVERY_DAYS = 7  # 启动恢复最多检查多少天内错过的任务
+SCHEDULE_HEARTBEAT_SECONDS = 10  # 定时任务线程保存心跳的最小间隔（秒）
+current_volume = None  # 当前音量（0-100），首次播放前从配置加载
+VOLUME_SAVE_DELAY = 1.0  # 停止调整音量多久后保存到配置文件（秒）
+DEFAULT_MIXER_CONTROL = 'Master'  # 系统混音器控件，可通过 config.json 的 mixer_control 调整
+AUDIO_START_TIMEOUT = 0.5  # 等待播放开始的最长时间（秒）
+AUDIO_START_POLL_INTERVAL = 0.005  # 确认播放开始的轮询间隔（秒）
+AUDIO_CHANNELS = 3  # 保留给缓存音频和分块解码播放的声道数，交叉淡化和叠加播放时同时使用多个
+DEFAULT_STREAM_BUFFER_KB = 1024  # 分块解码播放的缓冲区上限（KB），可通过 config.json 的 stream_buffer_kb 调整
+STREAM_POLL_INTERVAL = 0.02  # 分块解码线程检查声道播放队列的间隔（秒）
+GAIN_WATCH_INTERVAL = 0.05  # 没有渐变、只等待叠加播放结束时的检查间隔（秒）
+# 渐变设置（毫秒），均可在 config.json 中用同名小写键覆盖
+DEFAULT_FADE_IN_MS = 0  # 开始播放时的淡入时间
+DEFAULT_FADE_OUT_MS = 800  # 停止播放时的淡出时间
+DEFAULT_CROSSFADE_MS = 500  # 新音乐替换正在播放的音乐时的交叉淡化时间
+DEFAULT_DUCK_MS = 300  # 叠加播放时压低和恢复音量的过渡时间
+DEFAULT_DUCK_VOLUME = 25  # 叠加播放时正在播放的音乐压低到的音量比例（%）
+DEFAULT_AUDIO_CACHE_MB = 64  # 解码缓存默认内存预算，可通过 config.json 的 audio_cache_mb 调整
+audio_preload_wakeup = threading.Event()  # 时间表变化时唤醒预解码线程
+playback_thread = None  # 音频工作线程
+playback_queue = queue.Queue()  # 待执行的播放命令（任务ID）
+playback_jobs = OrderedDict()  # 任务ID -> 播放任务状态
+playback_job_events = {}  # 任务ID -> 完成事件
+playback_jobs_lock = threading.Lock()
+MAX_PLAYBACK_JOBS = 200  # 保留的播放任务记录数
+PLAYBACK_TEST_TIMEOUT = 10  # 音频测试等待播放结果的最长时间（秒）
+service_role = None  # 'leader'、'follower'，单独导入模块时为None（直接在本进程执行）
+leader_lock_file = None  # 持有主进程锁的文件对象
+control_authkey = None  # 控制通道的认证密钥，首次使用时从 CONTROL_KEY_FILE 读取
+leader_playback_state = {'busy': False, 'queue': None}  # 从进程中继的主进程播放状态
+LEADER_RETRY_SECONDS = 5  # 从进程重连主进程或尝试接管的间隔（秒）
+LEADER_REQUEST_TIMEOUT = 10  # 转发命令等待主进程响应的最长时间（秒）
+history_db = None  # 执行记录数据库连接
+history_db_lock = threading.Lock()
+live_state = {}  # 最近推送给页面的状态
+live_state_lock = threading.Lock()
+state_monitor_thread = None  # 状态监视线程
+state_monitor_wakeup = threading.Event()  # 时间表或配置变化时唤醒状态监视线程
+STATE_MONITOR_INTERVAL = 1  # 有页面订阅时检查播放状态的间隔（秒）
+SSE_KEEPALIVE_SECONDS = 15  # 事件流保活注释的发送间隔（秒）
+SSE_RETRY_MS = 5000  # 浏览器断线重连间隔（毫秒）
+last_fired_at = {}  # 每个任务最近一次触发的时刻，同时保存在执行记录数据库中，避免重建队列或重启后重复执行
+schedule_cache = {'index': None, 'version': 0}  # 定时任务索引及其对应的文件版本
+schedule_cache_lock = threading.Lock()
+users_cache = {'mtime': None, 'data': {}}  # 已解析的用户信息及其文件修改时间，data 整体替换、不原地修改
+users_cache_lock = threading.Lock()
+music_index = {'files': {}, 'version': 0, 'dir_mtime': None, 'scanned_at': 0.0}  # 音乐库索引，files 整体替换、不原地修改
+music_index_lock = threading.Lock()
+music_scan_lock = threading.Lock()  # 同一时间只进行一次扫描；扫描时不持有 music_index_lock
+music_watcher_thread = None  # 音乐目录监视线程
+MUSIC_SCAN_INTERVAL = 5  # 检查音乐目录修改时间的间隔（秒）
+MUSIC_FULL_SCAN_INTERVAL = 60  # 逐个检查文件修改时间的间隔（秒），用于发现原地覆盖的文件
+MUSIC_FIELDS = ('name', 'size', 'mtime', 'format', 'duration', 'sample_rate', 'channels', 'bitrate', 'hash',
+                'loudness', 'peak', 'gain')
+LOUDNESS_FIELDS = ('loudness', 'peak', 'gain')  # 来自响度分析结果的字段
+DEFAULT_LOUDNESS_TARGET = -18  # 响度校正的目标响度（LUFS），可通过 config.json 的 loudness_target 调整
+MAX_LOUDNESS_GAIN_DB = 12  # 响度校正的最大幅度（dB）
+LOUDNESS_RETRY_SECONDS = 60  # 分析进程异常退出后重试的间隔（秒）
+loudness_wakeup = threading.Event()  # 音乐库变化时唤醒响度分析线程
+MAX_MUSIC_PAGE_SIZE = 500
+DEFAULT_PASSWORD_HASH_METHOD = 'pbkdf2:sha256:260000'  # 可通过 config.json 的 password_hash_method 调整
+DEFAULT_PASSWORD_HASH_WORKERS = 2  # 密码哈希线程数，可通过 config.json 的 password_hash_workers 调整
+PASSWORD_HASH_TIMEOUT = 30  # 等待密码哈希完成的最长时间（秒）
+password_pool = None  # 密码哈希线程池，首次使用时创建
+password_pool_slots = None  # 限制排队中的哈希请求数量
+password_pool_lock = threading.Lock()
+password_hash_prefixes = {}  # 哈希方法 -> 生成的哈希前缀，用于判断已存哈希是否需要更新
+DEFAULT_WEEK_SCHEDULE = {
+    "odd_week_rest": True,
+    "even_week_rest": False,
+    "saturday_work": True
+}
+workday_calendar = None  # 预计算的工作日日历表
+workday_calendar_lock = threading.Lock()
+workday_calendar_dirty = threading.Event()  # 配置保存后置位，下次查询时检查周设置
+workday_calendar_checked_at = 0.0  # 最近一次检查配置文件修改时间的时刻（monotonic）
+CONFIG_CHECK_INTERVAL = 1  # 检查配置文件是否被其他进程修改的最小间隔（秒）
+daily_responses = {}  # 接口名 -> 按日期和配置版本缓存的响应内容
+daily_responses_lock = threading.Lock()
+MAX_WORKDAY_SEARCH_DAYS = 31  # 日历表范围外查找下一个工作日的最大天数
+MAX_NEXT_FIRINGS = 100  # /api/next-task 单次最多返回的触发次数
+MAX_SCHEDULE_SEARCH_DAYS = 366  # 查找下一次触发时向后搜索的最大天数
+SCHEDULE_FORMAT_VERSION = 2  # schedule.json 的格式版本
+WEEKDAY_NAMES = ['一', '二', '三', '四', '五', '六', '日']
+DEFAULT_PREFLIGHT_MINUTES = 5  # 提前预检的时间（分钟），可通过 config.json 的 preflight_minutes 调整
+PREFLIGHT_LOOKAHEAD = 20  # 每次计算的后续触发次数
+PREFLIGHT_MAX_SLEEP = 60  # 预检线程单次休眠上限（秒），预检失败的任务按此间隔重试
+preflight_results = {}  # (触发时间, 任务ID) -> 预检结果
+preflight_lock = threading.Lock()
+preflight_wakeup = threading.Event()  # 时间表变化时唤醒预检线程
 
 # 确保必要的目录存在
 os.makedirs(os.path.dirname(MUSIC_DIR), exist_ok=True)
@@ -132,7 +352,7 @@ def load_logs():
                 for line in lines:
                     line = line.strip()
                     if line:
-                        log_buffer.append(line)
+                        append_log_line(line)
     except Exception as e:
         print(f"加载日志失败: {str(e)}")
 
@@ -147,100 +367,195 @@ def create_app():
         os.makedirs(CONFIG_DIR, mode=0o755, exist_ok=True)
         if not os.path.exists(SCHEDULE_FILE):
             with open(SCHEDULE_FILE, 'w', encoding='utf-8') as f:
-                json.dump({}, f, ensure_ascii=False, indent=4)
+                json.dump({'version': SCHEDULE_FORMAT_VERSION, 'tasks': []}, f, ensure_ascii=False, indent=4)
             logger.info(f"创建空的定时任务文件: {SCHEDULE_FILE}")
         
-        # 初始化pygame
-        try:
-            pygame.mixer.quit()
-            pygame.mixer.init()
-            logger.info("音频系统初始化成功")
-        except Exception as e:
-            logger.warning(f"pygame音频初始化失败，将使用备用播放器: {str(e)}")
-        
-        # 启动后台线程
-        start_background_threads()
+        # 启动后台服务（仅主进程打开音频设备并运行定时任务）
+        start_services()
         logger.info("应用初始化完成")
     
     return app
 
+def get_history_db():
+    """获取执行记录数据库连接，首次调用时建表"""
+    global history_db
+    if history_db is None:
+        os.makedirs(DATA_DIR, mode=0o700, exist_ok=True)
+        conn = sqlite3.connect(HISTORY_DB, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS executions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_date TEXT NOT NULL,
+                task_time TEXT NOT NULL,
+                music_file TEXT,
+                fired_at TEXT NOT NULL,
+                outcome TEXT NOT NULL,
+                latency_ms REAL,
+                source TEXT
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_executions_run_date ON executions (run_date, task_time)')
+        # 任务ID列在支持同一时间多个任务后加入
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info(executions)')}
+        if 'task_id' not in columns:
+            conn.execute('ALTER TABLE executions ADD COLUMN task_id TEXT')
+        # 定时任务线程的持久状态：每个任务最近一次处理的触发时刻，以及已处理到的时刻（心跳）
+        conn.execute('CREATE TABLE IF NOT EXISTS task_last_fired (task_id TEXT PRIMARY KEY, fired_at TEXT NOT NULL)')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS scheduler_heartbeat (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                beat_at TEXT NOT NULL
+            )
+        ''')
+        conn.commit()
+        history_db = conn
+    return history_db
+
+def record_execution(task_time, music_file, fired_at, outcome, latency_ms=None, source='schedule', task_id=None):
+    """追加一条任务执行记录"""
+    try:
+        with history_db_lock:
+            conn = get_history_db()
+            conn.execute(
+                'INSERT INTO executions (run_date, task_time, music_file, fired_at, outcome, latency_ms, source, task_id) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (fired_at.strftime('%Y-%m-%d'), task_time, music_file,
+                 fired_at.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3], outcome, latency_ms, source, task_id)
+            )
+            conn.commit()
+    except Exception as e:
+        logger.error(f"保存执行记录失败: {str(e)}")
+
+def load_scheduler_state(task_ids):
+    """读取心跳和各任务最近一次触发的时刻，同时清理已删除任务的记录
+
+    返回 (心跳时刻或None, {任务ID: 触发时刻})。
+    """
+    with history_db_lock:
+        conn = get_history_db()
+        row = conn.execute('SELECT beat_at FROM scheduler_heartbeat WHERE id = 1').fetchone()
+        fired = {}
+        for task_id, fired_at in conn.execute('SELECT task_id, fired_at FROM task_last_fired').fetchall():
+            if task_id in task_ids:
+                fired[task_id] = datetime.datetime.strptime(fired_at, '%Y-%m-%d %H:%M:%S')
+            else:
+                conn.execute('DELETE FROM task_last_fired WHERE task_id = ?', (task_id,))
+        conn.commit()
+    heartbeat = datetime.datetime.strptime(row['beat_at'], '%Y-%m-%d %H:%M:%S') if row else None
+    return heartbeat, fired
+
+def save_last_fired(task_id, fired_at):
+    """记录任务已处理到的触发时刻（播放、跳过或错过）"""
+    last_fired_at[task_id] = fired_at
+    try:
+        with history_db_lock:
+            conn = get_history_db()
+            conn.execute('INSERT OR REPLACE INTO task_last_fired (task_id, fired_at) VALUES (?, ?)',
+                         (task_id, fired_at.strftime('%Y-%m-%d %H:%M:%S')))
+            conn.commit()
+    except Exception as e:
+        logger.error(f"保存任务触发时刻失败: {str(e)}")
+
+def save_heartbeat(beat_at):
+    """记录定时任务线程已处理完该时刻之前的所有触发"""
+    try:
+        with history_db_lock:
+            conn = get_history_db()
+            conn.execute('INSERT OR REPLACE INTO scheduler_heartbeat (id, beat_at) VALUES (1, ?)',
+                         (beat_at.strftime('%Y-%m-%d %H:%M:%S'),))
+            conn.commit()
+    except Exception as e:
+        logger.error(f"保存定时任务心跳失败: {str(e)}")
+
+def get_executions(run_date):
+    """按日期查询执行记录，按触发时间排序"""
+    with history_db_lock:
+        rows = get_history_db().execute(
+            'SELECT task_id, task_time, music_file, fired_at, outcome, latency_ms, source '
+            'FROM executions WHERE run_date = ? ORDER BY fired_at',
+            (run_date,)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+@app.route('/api/history', methods=['GET'])
+@login_required
+def execution_history():
+    """查询某一天的任务执行记录，默认今天"""
+    try:
+        run_date = request.args.get('date') or datetime.datetime.now().strftime('%Y-%m-%d')
+        datetime.datetime.strptime(run_date, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'error': '日期格式应为 YYYY-MM-DD'}), 400
+    try:
+        return jsonify({'date': run_date, 'executions': get_executions(run_date)})
+    except Exception as e:
+        logger.error(f"查询执行记录失败: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 def get_task_overview():
     """获取任务概览信息"""
     try:
         now = datetime.datetime.now()
-        today = now.strftime('%Y-%m-%d')
-        current_time = now.strftime('%H:%M')
-        schedule = load_schedule()
+        today = now.date()
+        index = load_schedule_snapshot()[1]
         
         # 获取今日任务
         today_tasks = []
         next_task = None
-        next_task_time = None
         
-        # 按时间排序的任务列表
-        sorted_times = sorted(schedule.keys())
+        # 查询今日的任务执行记录，旧记录没有任务ID，按时间匹配
+        outcomes = {}
+        for execution in get_executions(today.strftime('%Y-%m-%d')):
+            outcomes[execution['task_id'] or execution['task_time']] = execution['outcome']
         
-        # 检查日志中的任务执行记录
-        executed_tasks = set()
-        for line in list(log_buffer):
-            if "执行定时任务:" in line:
-                # 从日志中提取时间和文件名
-                parts = line.split(" - ")
-                if len(parts) >= 2:
-                    time_str = parts[1].strip()
-                    executed_tasks.add(time_str)
-        
-        for time_str in sorted_times:
-            task = schedule[time_str]
+        is_workday_today = workday(today)
+        midnight = datetime.datetime.combine(today, datetime.time())
+        for fire_at, task in index.due(midnight, midnight + datetime.timedelta(days=1), check_workday=False):
+            # 非工作日不显示仅工作日的任务
+            if task.get('workday_only', False) and not is_workday_today:
+                continue
+            
             task_info = {
-                'time': time_str,
+                'id': task['id'],
+                'time': format_task_time(task['time']),
                 'music_file': task['music_file'],
-                'workday_only': task.get('workday_only', False)
+                'workday_only': task.get('workday_only', False),
+                'volume': task.get('volume')
             }
             
-            # 检查是否是今日任务
-            if task.get('workday_only', False) and not workday(datetime.datetime.now()):
-                continue
-            
-            # 根据日志记录和当前时间判断任务状态
-            if time_str in executed_tasks:
+            # 根据执行记录和当前时间判断任务状态
+            outcome = outcomes.get(task['id'], outcomes.get(task_info['time']))
+            if outcome == 'done':
                 task_info['status'] = '已完成'
-            elif time_str < current_time:
-                if task.get('workday_only', False) and not workday(datetime.datetime.now()):
-                    task_info['status'] = '已跳过'
-                else:
-                    task_info['status'] = '已过期'
+            elif outcome == 'failed':
+                task_info['status'] = '执行失败'
+            elif outcome == 'superseded':
+                task_info['status'] = '已触发'
+            elif outcome == 'missed':
+                task_info['status'] = '已错过'
+            elif outcome == 'coalesced':
+                task_info['status'] = '已合并补播'
+            elif fire_at < now:
+                task_info['status'] = '已过期'
             else:
-                if task.get('workday_only', False) and not workday(datetime.datetime.now()):
-                    task_info['status'] = '将跳过'
-                else:
-                    task_info['status'] = '待执行'
+                task_info['status'] = '待执行'
             
             today_tasks.append(task_info)
             
-            # 查找下一个要执行的任务
-            if time_str > current_time and (next_task is None or time_str < next_task_time):
-                if not task.get('workday_only', False) or workday(datetime.datetime.now()):
-                    next_task = task_info.copy()
-                    next_task_time = time_str
-                    
-                    # 计算倒计时和执行日期
-                    task_time = datetime.datetime.strptime(f"{today} {time_str}", "%Y-%m-%d %H:%M")
-                    time_diff = task_time - now
-                    
-                    # 如果任务时间小于当前时间，说明是明天的任务
-                    if task_time < now:
-                        task_time = task_time + datetime.timedelta(days=1)
-                        time_diff = task_time - now
-                    
-                    # 格式化执行日期
-                    next_task['execute_date'] = task_time.strftime("%Y-%m-%d")
-                    next_task['execute_time'] = task_time.strftime("%H:%M")
-                    
-                    # 计算倒计时
-                    hours = int(time_diff.total_seconds() // 3600)
-                    minutes = int((time_diff.total_seconds() % 3600) // 60)
-                    next_task['countdown'] = f"{hours}小时{minutes}分钟"
+            # 今天接下来第一个要执行的任务
+            if next_task is None and fire_at > now:
+                next_task = task_info.copy()
+                next_task['execute_date'] = fire_at.strftime("%Y-%m-%d")
+                next_task['execute_time'] = task_info['time']
+                
+                # 计算倒计时
+                time_diff = fire_at - now
+                hours = int(time_diff.total_seconds() // 3600)
+                minutes = int((time_diff.total_seconds() % 3600) // 60)
+                next_task['countdown'] = f"{hours}小时{minutes}分钟"
         
         return {
             'today_tasks': today_tasks,
@@ -253,44 +568,496 @@ def get_task_overview():
             'next_task': None
         }
 
-def load_schedule():
-    """加载定时任务"""
-    try:
-        if os.path.exists(SCHEDULE_FILE):
-            # 以二进制模式读取文件
-            with open(SCHEDULE_FILE, 'rb') as f:
-                content = f.read().decode('utf-8')
-                return json.loads(content)
-    except Exception as e:
-        logger.error(f"加载定时任务失败: {str(e)}")
-    return {}
+class JsonFileStore:
+    """JSON 配置文件的存取服务
 
-def save_schedule(schedule):
-    """保存定时任务"""
-    try:
-        # 确保父目录存在
-        os.makedirs(os.path.dirname(SCHEDULE_FILE), exist_ok=True)
-        
-        # 确保文件存在
-        if not os.path.exists(SCHEDULE_FILE):
-            with open(SCHEDULE_FILE, 'w', encoding='utf-8') as f:
-                json.dump({}, f, ensure_ascii=False)
+    读取时直接返回内存中的快照，快照发布后不再修改（写时复制），读取方无需加锁，
+    文件被其他进程或手动修改后按修改时间重新加载。
+    写入时用进程内的锁和文件锁串行化：在锁内基于文件的最新内容修改，
+    先写临时文件并 fsync 再原子替换，不会出现写了一半的文件，也不会丢失其他人的修改。
+    内容每变化一次版本号加一。
+    """
 
-        # 使用临时文件来保存，以避免写入过程中的文件损坏
-        temp_file = SCHEDULE_FILE + '.tmp'
-        
-        # 将schedule转换为JSON字符串，确保使用UTF-8编码
-        json_str = json.dumps(schedule, ensure_ascii=False, indent=2)
-        
-        # 以二进制模式写入文件
+    def __init__(self, path, default, migrate=None, on_change=None):
+        self.path = path
+        self.default = default  # 文件不存在时的默认内容
+        self.migrate = migrate  # migrate(data) -> (data, 是否需要写回)，用于格式升级
+        self.on_change = on_change  # 本进程修改内容后的回调
+        self.lock = threading.RLock()
+        self.data = None
+        self.mtime = None
+        self.version = 0
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """跨进程的写锁"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write(self, data):
+        temp_file = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
         with open(temp_file, 'wb') as f:
-            f.write(json_str.encode('utf-8'))
-        
-        # 替换原文件
-        os.replace(temp_file, SCHEDULE_FILE)
-        
+            f.write(json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.path)
+        self.mtime = self._file_mtime()
+
+    def _reload(self, locked=False):
+        """从文件重新加载，文件损坏时保留上一次成功加载的内容
+
+        locked=True 表示调用方已持有文件锁（flock 在同一进程内不可重入）。
+        """
+        mtime = self._file_mtime()
+        if self.data is not None and mtime == self.mtime:
+            return
+        try:
+            if mtime is None:
+                data = self.default()
+            else:
+                # 以二进制模式读取文件
+                with open(self.path, 'rb') as f:
+                    data = json.loads(f.read().decode('utf-8'))
+                if self.migrate:
+                    data, changed = self.migrate(data)
+                    if changed:
+                        if locked:
+                            self._write(data)
+                        else:
+                            with self._file_lock():
+                                self._write(data)
+                        mtime = self.mtime
+        except Exception as e:
+            logger.error(f"加载 {os.path.basename(self.path)} 失败: {str(e)}")
+            if self.data is not None:
+                self.mtime = mtime  # 文件再次修改后重试
+                return
+            data = self.default()
+        self.data = data
+        self.mtime = mtime
+        self.version += 1
+
+    def snapshot(self):
+        """返回 (版本号, 内容)，内容为只读快照"""
+        if self.data is not None and self._file_mtime() == self.mtime:
+            return self.version, self.data
+        with self.lock:
+            self._reload()
+            return self.version, self.data
+
+    def get(self):
+        """返回内容的副本，可以自由修改"""
+        return copy.deepcopy(self.snapshot()[1])
+
+    def update(self, func):
+        """在写锁内基于最新内容执行 func(data) 并保存，返回 func 的返回值
+
+        func 直接修改传入的副本；抛出异常时不保存。
+        """
+        with self.lock:
+            with self._file_lock():
+                self._reload(locked=True)
+                data = copy.deepcopy(self.data)
+                result = func(data)
+                self._write(data)
+                self.data = data
+                self.version += 1
+        if self.on_change:
+            self.on_change()
+        return result
+
+    def replace(self, data):
+        """整体替换内容并保存"""
+        data = copy.deepcopy(data)
+        def apply(current):
+            current.clear()
+            current.update(data)
+        self.update(apply)
+
+def parse_task_time(value):
+    """解析任务时间（HH:MM 或 HH:MM:SS），返回 datetime.time"""
+    for fmt in ('%H:%M:%S', '%H:%M'):
+        try:
+            return datetime.datetime.strptime(value, fmt).time()
+        except (TypeError, ValueError):
+            continue
+    raise ValueError(f"无效的任务时间: {value}")
+
+def format_task_time(value):
+    """显示用的任务时间，整分钟时省略秒"""
+    return value[:5] if value.endswith(':00') else value
+
+def normalize_task(data, task_id=None):
+    """校验并规范化一个任务，返回新的任务字典，数据无效时抛出 ValueError
+
+    任务字段：
+        id: 任务ID
+        time: 开始时间 HH:MM:SS
+        music_file: 音乐文件名（有播放列表时为列表的第一首）
+        playlist: 播放列表（音乐文件名的列表，依次无缝播放），None表示只播放 music_file
+        shuffle: 随机顺序播放列表（每次开始播放时打乱）
+        workday_only: 是否仅工作日播放
+        weekdays: 播放的星期（0为周一），None表示每天
+        start_date / end_date: 生效日期范围（YYYY-MM-DD，含首尾），None表示不限
+        volume: 播放音量（0-100），None表示使用全局音量
+        duck: 叠加播放，正在播放的音乐压低音量继续播放，而不是被替换
+        streaming: 分块解码播放，不预先整体解码（适合很长的音频）
+        misfire: 错过策略（服务停止或线程阻塞导致触发延迟超过 SCHEDULE_MISFIRE_SECONDS 时）：
+            skip 跳过；run_late 在宽限时间内补播每一次；coalesce 在宽限时间内只补播最近一次
+        misfire_grace: 补播的宽限时间（秒），None表示使用全局设置
+        enabled: 是否启用
+    """
+    if not isinstance(data, dict):
+        raise ValueError('任务格式无效')
+    music_file = data.get('music_file')
+    playlist = data.get('playlist') or None
+    if playlist is not None:
+        if not isinstance(playlist, list) or not all(isinstance(name, str) and name for name in playlist):
+            raise ValueError('播放列表应为音乐文件名的列表')
+        music_file = playlist[0]
+        if len(playlist) == 1:
+            playlist = None
+    if not music_file or not isinstance(music_file, str):
+        raise ValueError('缺少音乐文件')
+    
+    weekdays = data.get('weekdays')
+    if weekdays is not None:
+        if not isinstance(weekdays, list) or not weekdays \
+                or not all(isinstance(day, int) and 0 <= day <= 6 for day in weekdays):
+            raise ValueError('星期设置无效，应为0（周一）到6（周日）的列表')
+        weekdays = sorted(set(weekdays))
+        if len(weekdays) == 7:
+            weekdays = None
+    
+    dates = {}
+    for field in ('start_date', 'end_date'):
+        value = data.get(field) or None
+        if value is not None:
+            try:
+                value = datetime.datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+            except (TypeError, ValueError):
+                raise ValueError(f"日期格式应为 YYYY-MM-DD: {value}")
+        dates[field] = value
+    if dates['start_date'] and dates['end_date'] and dates['start_date'] > dates['end_date']:
+        raise ValueError('开始日期不能晚于结束日期')
+    
+    volume = data.get('volume')
+    if volume is not None and volume != '':
+        try:
+            volume = int(volume)
+        except (TypeError, ValueError):
+            raise ValueError('音量应为0到100的整数')
+        if not 0 <= volume <= 100:
+            raise ValueError('音量应为0到100的整数')
+    else:
+        volume = None
+    
+    misfire = data.get('misfire') or 'skip'
+    if misfire not in MISFIRE_POLICIES:
+        raise ValueError(f"错过策略应为 {'、'.join(MISFIRE_POLICIES)} 之一")
+    misfire_grace = data.get('misfire_grace')
+    if misfire_grace is not None and misfire_grace != '':
+        try:
+            misfire_grace = int(misfire_grace)
+        except (TypeError, ValueError):
+            raise ValueError('补播宽限时间应为非负整数（秒）')
+        if misfire_grace < 0:
+            raise ValueError('补播宽限时间应为非负整数（秒）')
+    else:
+        misfire_grace = None
+    
+    return {
+        'id': task_id or data.get('id') or uuid.uuid4().hex[:8],
+        'time': parse_task_time(data.get('time')).strftime('%H:%M:%S'),
+        'music_file': music_file,
+        'playlist': playlist,
+        'shuffle': bool(playlist and data.get('shuffle', False)),
+        'workday_only': bool(data.get('workday_only', False)),
+        'weekdays': weekdays,
+        'start_date': dates['start_date'],
+        'end_date': dates['end_date'],
+        'volume': volume,
+        'duck': bool(data.get('duck', False)),
+        'streaming': bool(data.get('streaming', False)),
+        'misfire': misfire,
+        'misfire_grace': misfire_grace,
+        'enabled': bool(data.get('enabled', True))
+    }
+
+def migrate_schedule_data(data):
+    """将旧格式（以 HH:MM 为键的字典）转换为任务列表
+
+    任务ID由时间计算得出，多个进程同时迁移时结果一致。
+    """
+    tasks = []
+    for time_str, task in data.items():
+        try:
+            task_id = hashlib.sha1(time_str.encode('utf-8')).hexdigest()[:8]
+            tasks.append(normalize_task(dict(task, time=time_str), task_id))
+        except (ValueError, TypeError) as e:
+            logger.error(f"迁移定时任务失败，已忽略: {time_str} - {str(e)}")
+    return tasks
+
+def migrate_schedule_file(data):
+    """加载定时任务文件时规范化任务；旧格式自动迁移（原文件备份为 schedule.json.v1.bak）"""
+    if 'tasks' in data:
+        tasks = []
+        changed = False
+        invalid = False
+        for position, task in enumerate(data['tasks']):
+            try:
+                task_id = None
+                if isinstance(task, dict) and not task.get('id'):
+                    # 手动添加的任务没有ID：由内容和位置计算，多个进程结果一致，并写回文件
+                    content = json.dumps(task, sort_keys=True, ensure_ascii=False)
+                    task_id = hashlib.sha1(f"{position}:{content}".encode('utf-8')).hexdigest()[:8]
+                tasks.append(normalize_task(task, task_id))
+                changed = changed or task_id is not None
+            except (ValueError, TypeError) as e:
+                logger.error(f"忽略无效的定时任务: {task} - {str(e)}")
+                invalid = True
+        # 有无效任务时不写回，以免覆盖手动编辑的内容；计算出的ID不变，下次修改时一并保存
+        return {'version': SCHEDULE_FORMAT_VERSION, 'tasks': tasks}, changed and not invalid
+    
+    backup_file = SCHEDULE_FILE + '.v1.bak'
+    if not os.path.exists(backup_file):
+        with open(backup_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    tasks = migrate_schedule_data(data)
+    logger.info(f"定时任务文件已迁移到新格式，共 {len(tasks)} 个任务")
+    return {'version': SCHEDULE_FORMAT_VERSION, 'tasks': tasks}, True
+
+class ScheduleIndex:
+    """按一天中的秒数排序的定时任务索引
+
+    任务按开始时间排序存放，查询某个时间窗口内的触发或接下来的若干次触发时，
+    每天只需二分查找起止位置，再按星期、日期范围和工作日条件筛选。
+    启用的任务都仅工作日播放时，查找下一次触发用 next_workday 在工作日序号上二分查找，
+    一次跳过整个假期。
+    load_schedule_snapshot 返回的索引创建后不再修改，可在多个线程间共享；
+    定时任务线程持有自己的索引，用 add / remove 按二分查找的位置增量调整。
+    """
+
+    def __init__(self, tasks):
+        ordered = sorted(tasks, key=lambda task: (task['time'], task['id']))
+        self.tasks = {task['id']: task for task in ordered}
+        self.ids = [task['id'] for task in ordered]
+        self.seconds = array('l', (self._time_seconds(task['time']) for task in ordered))
+        self.rules = {task['id']: self._task_rules(task) for task in ordered}
+        self.enabled_count = sum(1 for rule in self.rules.values() if rule[0])
+        self.workday_only_count = sum(1 for rule in self.rules.values() if rule[0] and rule[4])  # 启用且仅工作日
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def active(self):
+        return self.enabled_count > 0
+
+    @staticmethod
+    def _task_rules(task):
+        """(是否启用, 星期, 开始日期, 结束日期, 仅工作日)"""
+        return (
+            task.get('enabled', True),
+            frozenset(task['weekdays']) if task.get('weekdays') is not None else None,
+            datetime.date.fromisoformat(task['start_date']) if task.get('start_date') else None,
+            datetime.date.fromisoformat(task['end_date']) if task.get('end_date') else None,
+            task.get('workday_only', False)
+        )
+
+    def _position(self, seconds, task_id):
+        """按 (时间, 任务ID) 排序时任务应在的位置"""
+        lo = bisect.bisect_left(self.seconds, seconds)
+        hi = bisect.bisect_right(self.seconds, seconds, lo)
+        return lo + bisect.bisect_left(self.ids[lo:hi], task_id)
+
+    def add(self, task):
+        """加入一个任务，已存在同一ID的任务时替换"""
+        self.remove(task['id'])
+        seconds = self._time_seconds(task['time'])
+        position = self._position(seconds, task['id'])
+        self.seconds.insert(position, seconds)
+        self.ids.insert(position, task['id'])
+        self.tasks[task['id']] = task
+        rule = self.rules[task['id']] = self._task_rules(task)
+        self.enabled_count += 1 if rule[0] else 0
+        self.workday_only_count += 1 if rule[0] and rule[4] else 0
+
+    def remove(self, task_id):
+        """删除一个任务，返回是否存在"""
+        task = self.tasks.pop(task_id, None)
+        if task is None:
+            return False
+        position = self._position(self._time_seconds(task['time']), task_id)
+        del self.seconds[position]
+        del self.ids[position]
+        rule = self.rules.pop(task_id)
+        self.enabled_count -= 1 if rule[0] else 0
+        self.workday_only_count -= 1 if rule[0] and rule[4] else 0
+        return True
+
+    @staticmethod
+    def _time_seconds(value):
+        hours, minutes, seconds = map(int, value.split(':'))
+        return hours * 3600 + minutes * 60 + seconds
+
+    @staticmethod
+    def _ceil_seconds(moment):
+        """moment 在当天的秒数，有小数部分时向上取整"""
+        seconds = moment.hour * 3600 + moment.minute * 60 + moment.second
+        return seconds + 1 if moment.microsecond else seconds
+
+    def task_list(self):
+        """按时间排序的任务副本列表"""
+        return [self.copy_task(task_id) for task_id in self.ids]
+
+    def copy_task(self, task_id):
+        task = dict(self.tasks[task_id])
+        if task.get('weekdays') is not None:
+            task['weekdays'] = list(task['weekdays'])
+        return task
+
+    def runs_on(self, task_id, date, check_workday=True):
+        """判断任务在指定日期是否播放"""
+        enabled, weekdays, start_date, end_date, workday_only = self.rules[task_id]
+        if not enabled:
+            return False
+        if weekdays is not None and date.weekday() not in weekdays:
+            return False
+        if (start_date and date < start_date) or (end_date and date > end_date):
+            return False
+        if check_workday and workday_only and not workday(date):
+            return False
+        return True
+
+    def _day_firings(self, day, lo, hi, check_workday):
+        firings = []
+        midnight = datetime.datetime.combine(day, datetime.time())
+        for i in range(lo, hi):
+            task_id = self.ids[i]
+            if self.runs_on(task_id, day, check_workday):
+                firings.append((midnight + datetime.timedelta(seconds=self.seconds[i]), self.tasks[task_id]))
+        return firings
+
+    def due(self, start, end, check_workday=True):
+        """返回时间窗口 [start, end) 内的所有触发 [(触发时间, 任务), ...]"""
+        firings = []
+        if not self.active or end <= start:
+            return firings
+        day = start.date()
+        while day <= end.date():
+            lo = bisect.bisect_left(self.seconds, self._ceil_seconds(start)) if day == start.date() else 0
+            hi = bisect.bisect_left(self.seconds, self._ceil_seconds(end)) if day == end.date() else len(self.ids)
+            firings.extend(self._day_firings(day, lo, hi, check_workday))
+            day += datetime.timedelta(days=1)
+        return firings
+
+    def next_firings(self, start, count=1, check_workday=True, max_days=MAX_SCHEDULE_SEARCH_DAYS):
+        """返回 start 及之后的 count 次触发 [(触发时间, 任务), ...]"""
+        firings = []
+        if not self.active:
+            return firings
+        day = start.date()
+        last_day = day + datetime.timedelta(days=max_days - 1)
+        lo = bisect.bisect_left(self.seconds, self._ceil_seconds(start))
+        skip_holidays = check_workday and self.workday_only_count == self.enabled_count
+        while day <= last_day:
+            if skip_holidays:
+                # 非工作日没有任何触发，直接跳到下一个工作日
+                following = next_workday(day)
+                if following is None or following > last_day:
+                    break
+                if following != day:
+                    day, lo = following, 0
+            firings.extend(self._day_firings(day, lo, len(self.ids), check_workday))
+            if len(firings) >= count:
+                break
+            day += datetime.timedelta(days=1)
+            lo = 0
+        return firings[:count]
+
+schedule_store = JsonFileStore(
+    SCHEDULE_FILE,
+    default=lambda: {'version': SCHEDULE_FORMAT_VERSION, 'tasks': []},
+    migrate=migrate_schedule_file,
+    on_change=lambda: notify_schedule_changed()
+)
+
+def load_schedule_snapshot():
+    """获取定时任务快照，返回 (版本号, ScheduleIndex)
+
+    文件内容由 schedule_store 缓存，索引只在版本变化后重建一次。
+    """
+    version, data = schedule_store.snapshot()
+    with schedule_cache_lock:
+        if schedule_cache['index'] is None or schedule_cache['version'] != version:
+            schedule_cache['index'] = ScheduleIndex(data['tasks'])
+            schedule_cache['version'] = version
+        return version, schedule_cache['index']
+
+def load_schedule():
+    """加载定时任务，返回按时间排序的任务列表（副本）"""
+    return load_schedule_snapshot()[1].task_list()
+
+def update_schedule_tasks(func):
+    """在写锁内执行 func(tasks) 并保存，返回 func 的返回值，func 抛出异常时不保存
+
+    func 直接修改传入的任务列表，基于文件的最新内容执行，并发修改不会互相覆盖。
+    保存后把新增、修改和删除的任务发给定时任务线程，由其增量调整触发索引。
+    """
+    edit = {}
+
+    def apply(data):
+        # 写锁内的快照就是修改前的内容
+        edit['base'], current = schedule_store.snapshot()
+        before = {task['id']: task for task in current['tasks']}
+        result = func(data['tasks'])
+        changes = []
+        for task in data['tasks']:
+            old = before.pop(task['id'], None)
+            if old is None:
+                changes.append(('add', task))
+            elif old != task:
+                changes.append(('update', task))
+        changes.extend(('remove', task) for task in before.values())
+        edit['changes'] = changes
+        return result
+
+    result = schedule_store.update(apply)
+    post_schedule_changes(edit['base'], edit['changes'])
+    return result
+
+def post_schedule_changes(base_version=None, changes=None):
+    """把时间表的修改发给定时任务线程，立即返回
+
+    changes 为 [(操作, 任务), ...]，操作为 add、update 或 remove，base_version 为修改前的版本号；
+    版本号与定时任务线程的索引衔接时增量调整，否则（或 changes 为 None 时）整体重新加载。
+    """
+    if service_role == 'follower':
+        return  # 定时任务线程只在主进程运行，主进程会收到 notify_leader 的通知
+    schedule_changes.put(None if changes is None else (base_version, changes))
+    schedule_wakeup.set()
+
+def modify_schedule(func):
+    """在写锁内修改定时任务列表并保存，返回 (是否成功, func 的返回值或错误信息)
+
+    func(tasks) 直接修改传入的任务列表，基于文件的最新内容执行，并发修改不会互相覆盖。
+    """
+    try:
+        result = update_schedule_tasks(func)
         logger.info("定时任务保存成功")
-        return True, "保存成功"
+        return True, result
     except Exception as e:
         error_msg = f"保存定时任务失败: {str(e)}"
         logger.error(error_msg)
@@ -321,14 +1088,51 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message = '请先登录'
 
+def _users_file_mtime():
+    """获取用户文件的修改时间，文件不存在时返回None"""
+    try:
+        return os.stat(USERS_FILE).st_mtime_ns
+    except OSError:
+        return None
+
+def _get_users_data():
+    """获取内存中的用户信息，只在文件修改时间变化后重新解析
+
+    返回的字典在缓存中共享，调用方不能修改。
+    """
+    mtime = _users_file_mtime()
+    data = users_cache['data']
+    if mtime == users_cache['mtime']:
+        return data
+    with users_cache_lock:
+        if mtime != users_cache['mtime']:
+            try:
+                data = {}
+                if mtime is not None:
+                    with open(USERS_FILE, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                users_cache['data'] = data
+                users_cache['mtime'] = mtime
+            except Exception as e:
+                # 保留上一次成功加载的内容，下次调用时重试
+                app.logger.error(f"加载用户信息失败: {str(e)}")
+        return users_cache['data']
+
+def get_user_record(username):
+    """获取单个用户信息的副本，不存在时返回None"""
+    record = _get_users_data().get(username)
+    return dict(record) if record is not None else None
+
+def load_users():
+    """加载全部用户信息的副本，可修改后交给 save_users 保存"""
+    return {username: dict(record) for username, record in _get_users_data().items()}
+
 @login_manager.user_loader
 def load_user(user_id):
     try:
-        users_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'users.json')
-        with open(users_file, 'r', encoding='utf-8') as f:
-            users = json.load(f)
-            if user_id in users:
-                return User(user_id, user_id, users[user_id]['name'])
+        record = get_user_record(user_id)
+        if record is not None:
+            return User(user_id, user_id, record['name'])
     except Exception as e:
         app.logger.error(f"加载用户时出错: {str(e)}")
     return None
@@ -341,19 +1145,18 @@ def login():
         password = request.form.get('password')
         
         try:
-            users_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'users.json')
-            with open(users_file, 'r', encoding='utf-8') as f:
-                users = json.load(f)
-                app.logger.info(f"尝试登录用户: {username}")
-                if username in users:
-                    stored_hash = users[username]['password']
-                    if check_password_hash(stored_hash, password):
-                        user = User(username, username, users[username]['name'])
-                        login_user(user)
-                        app.logger.info("登录成功")
-                        return redirect(url_for('index'))
-                app.logger.info("验证失败")
-                return render_template('login.html', error='用户名或密码错误')
+            app.logger.info(f"尝试登录用户: {username}")
+            record = get_user_record(username)
+            if record is not None:
+                stored_hash = record['password']
+                if verify_password(stored_hash, password):
+                    rehash_password_if_needed(username, password, stored_hash)
+                    user = User(username, username, record['name'])
+                    login_user(user)
+                    app.logger.info("登录成功")
+                    return redirect(url_for('index'))
+            app.logger.info("验证失败")
+            return render_template('login.html', error='用户名或密码错误')
         except Exception as e:
             app.logger.error(f"登录时出错: {str(e)}")
             return render_template('login.html', error='系统错误，请稍后重试')
@@ -384,17 +1187,15 @@ def change_password():
             return render_template('change_password.html', error='新密码长度不能少于6个字符')
             
         try:
-            users_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'users.json')
-            with open(users_file, 'r', encoding='utf-8') as f:
-                users = json.load(f)
+            users = load_users()
             
             # 验证当前密码是否正确
             stored_hash = users[current_user.id]['password']
-            if not check_password_hash(stored_hash, current_password):
+            if not verify_password(stored_hash, current_password):
                 return render_template('change_password.html', error='当前密码错误')
             
-            # 更新密码
-            users[current_user.id]['password'] = generate_password_hash(new_password)
+            # 更新密码，使用当前配置的哈希方法
+            users[current_user.id]['password'] = generate_password(new_password)
             
             # 保存更改
             if save_users(users):
@@ -415,16 +1216,393 @@ def change_password():
 def index():
     return render_template('index.html')
 
+def probe_wav(path):
+    """读取WAV文件头，返回时长、采样率、声道数和码率"""
+    with open(path, 'rb') as f:
+        header = f.read(12)
+        if header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+            raise ValueError('不是有效的WAV文件')
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                break
+            chunk_id, chunk_size = struct.unpack('<4sI', chunk)
+            if chunk_id == b'fmt ':
+                fmt = struct.unpack('<HHIIHH', f.read(16))
+                f.seek(chunk_size - 16 + (chunk_size & 1), 1)
+            elif chunk_id == b'data' and fmt is not None:
+                channels, sample_rate, byte_rate = fmt[1], fmt[2], fmt[3]
+                # 部分录音软件写入的 data 长度不准确，以文件实际长度为上限
+                data_size = min(chunk_size, os.path.getsize(path) - f.tell())
+                return {
+                    'duration': round(data_size / byte_rate, 3) if byte_rate else None,
+                    'sample_rate': sample_rate,
+                    'channels': channels,
+                    'bitrate': byte_rate * 8 // 1000
+                }
+            else:
+                f.seek(chunk_size + (chunk_size & 1), 1)
+    raise ValueError('WAV文件缺少fmt或data块')
+
+def probe_mp3(path):
+    """解析MP3第一帧的帧头（及Xing/VBRI头），返回时长、采样率、声道数和码率"""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        # 跳过 ID3v2 标签
+        offset = 0
+        header = f.read(10)
+        if header[:3] == b'ID3':
+            tag_size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+            offset = 10 + tag_size + (10 if header[5] & 0x10 else 0)
+        f.seek(offset)
+        data = f.read(65536)
+        # 末尾的 ID3v1 标签不计入音频数据
+        f.seek(max(size - 128, 0))
+        tail = 128 if f.read(3) == b'TAG' else 0
+    
+    for i in range(len(data) - 4):
+        if data[i] != 0xFF or (data[i + 1] & 0xE0) != 0xE0:
+            continue
+        b1, b2, b3 = data[i + 1], data[i + 2], data[i + 3]
+        version_bits = (b1 >> 3) & 3  # 3: MPEG1, 2: MPEG2, 0: MPEG2.5
+        layer = 4 - ((b1 >> 1) & 3)
+        bitrate_index = b2 >> 4
+        rate_index = (b2 >> 2) & 3
+        if version_bits == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+            continue  # 不是有效的帧头，继续查找
+        version = 1 if version_bits == 3 else 2
+        bitrate = MP3_BITRATES[(version, layer)][bitrate_index]
+        sample_rate = MP3_SAMPLE_RATES[rate_index] >> {3: 0, 2: 1, 0: 2}[version_bits]
+        channels = 1 if (b3 >> 6) == 3 else 2
+        samples_per_frame = 384 if layer == 1 else (1152 if layer == 2 or version == 1 else 576)
+        
+        # VBR 文件的 Xing/Info 或 VBRI 头中记录了总帧数
+        frames = None
+        side_info = (32 if channels == 2 else 17) if version == 1 else (17 if channels == 2 else 9)
+        xing = i + 4 + side_info
+        if data[xing:xing + 4] in (b'Xing', b'Info') and data[xing + 7] & 1:
+            frames = struct.unpack('>I', data[xing + 8:xing + 12])[0]
+        elif data[i + 36:i + 40] == b'VBRI':
+            frames = struct.unpack('>I', data[i + 50:i + 54])[0]
+        
+        audio_bytes = size - offset - i - tail
+        if frames:
+            duration = frames * samples_per_frame / sample_rate
+            bitrate = int(audio_bytes * 8 / duration / 1000) if duration else bitrate
+        else:
+            duration = audio_bytes * 8 / (bitrate * 1000)
+        return {
+            'duration': round(duration, 3),
+            'sample_rate': sample_rate,
+            'channels': channels,
+            'bitrate': bitrate
+        }
+    raise ValueError('未找到MP3帧头')
+
+def file_sha1(path):
+    """分块计算文件内容的SHA1"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def index_music_file(name, stat):
+    """生成单个音乐文件的索引项，元数据读取失败时只记录文件信息"""
+    entry = {
+        'name': name,
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+        'format': os.path.splitext(name)[1][1:].lower(),
+        'duration': None,
+        'sample_rate': None,
+        'channels': None,
+        'bitrate': None,
+        'hash': None
+    }
+    path = os.path.join(MUSIC_DIR, name)
+    try:
+        entry.update(probe_wav(path) if entry['format'] == 'wav' else probe_mp3(path))
+    except Exception as e:
+        logger.warning(f"读取音乐文件信息失败 {name}: {str(e)}")
+    try:
+        entry['hash'] = file_sha1(path)
+    except OSError as e:
+        logger.warning(f"计算音乐文件校验值失败 {name}: {str(e)}")
+    return entry
+
+def load_music_index_file():
+    """读取上次保存的索引，程序重启后未变化的文件无需重新分析"""
+    try:
+        with open(MUSIC_INDEX_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('music_dir') == MUSIC_DIR:
+            return data.get('files', {})
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"读取音乐库索引失败: {str(e)}")
+    return {}
+
+def save_music_index_file(files):
+    """保存索引，先写临时文件再替换"""
+    try:
+        os.makedirs(DATA_DIR, mode=0o700, exist_ok=True)
+        temp_file = f"{MUSIC_INDEX_FILE}.{os.getpid()}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({'music_dir': MUSIC_DIR, 'files': files}, f, ensure_ascii=False)
+        os.replace(temp_file, MUSIC_INDEX_FILE)
+    except Exception as e:
+        logger.warning(f"保存音乐库索引失败: {str(e)}")
+
+def scan_music_index(full=False):
+    """增量更新音乐库索引
+
+    目录修改时间不变时跳过（文件增删和改名都会改变目录修改时间）；
+    full=True 时逐个比较文件大小和修改时间，只重新分析变化的文件。
+    读取文件和计算校验值时不持有 music_index_lock，完成后整体替换索引，
+    扫描期间接口继续返回原来的索引。
+    """
+    with music_scan_lock:
+        try:
+            dir_mtime = os.stat(MUSIC_DIR).st_mtime_ns
+        except OSError as e:
+            logger.error(f"读取音乐目录失败: {str(e)}")
+            return
+        if not full and dir_mtime == music_index['dir_mtime']:
+            return
+        
+        old_files = music_index['files'] if music_index['version'] else load_music_index_file()
+        
+        files = {}
+        for item in os.scandir(MUSIC_DIR):
+            if not item.is_file() or not item.name.lower().endswith(('.mp3', '.wav')):
+                continue
+            stat = item.stat()
+            entry = old_files.get(item.name)
+            if entry is None or entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime_ns:
+                entry = index_music_file(item.name, stat)
+            files[item.name] = entry
+        
+        with music_index_lock:
+            music_index['dir_mtime'] = dir_mtime
+            music_index['scanned_at'] = time.monotonic()
+            changed = files != music_index['files'] or music_index['version'] == 0
+            if changed:
+                music_index['files'] = files
+                music_index['version'] += 1
+        if changed:
+            if files != old_files or not os.path.exists(MUSIC_INDEX_FILE):
+                save_music_index_file(files)
+                logger.info(f"音乐库索引已更新，共 {len(files)} 个文件")
+            loudness_wakeup.set()
+
+def music_watcher():
+    """音乐目录监视线程：启动后先完整扫描一次，之后定期检查目录变化，并定期逐个检查文件"""
+    full = True
+    while True:
+        try:
+            scan_music_index(full=full)
+        except Exception as e:
+            logger.error(f"更新音乐库索引失败: {str(e)}")
+        time.sleep(MUSIC_SCAN_INTERVAL)
+        full = time.monotonic() - music_index['scanned_at'] >= MUSIC_FULL_SCAN_INTERVAL
+
+def ensure_music_watcher():
+    """确保音乐目录监视线程正在运行"""
+    global music_watcher_thread
+    with music_index_lock:
+        if music_watcher_thread is None or not music_watcher_thread.is_alive():
+            music_watcher_thread = threading.Thread(target=music_watcher, daemon=True)
+            music_watcher_thread.start()
+
+def get_music_index():
+    """获取音乐库索引 (版本号, 文件信息)
+
+    扫描在监视线程中进行，不阻塞请求；首次扫描完成前返回上次保存的索引。
+    """
+    if music_index['version'] == 0:
+        with music_index_lock:
+            if music_index['version'] == 0:
+                music_index['files'] = load_music_index_file()
+                music_index['version'] = 1
+    ensure_music_watcher()
+    return music_index['version'], music_index['files']
+
+loudness_store = JsonFileStore(LOUDNESS_FILE, lambda: {'files': {}})
+
+def get_loudness_results():
+    """返回 内容哈希 -> 响度分析结果 的只读字典"""
+    return loudness_store.snapshot()[1]['files']
+
+def loudness_gain_db(result):
+    """按分析结果计算校正到目标响度所需的增益（dB），无法计算时返回0"""
+    if not result or result.get('loudness') is None:
+        return 0.0
+    target = get_config_value('loudness_target', DEFAULT_LOUDNESS_TARGET)
+    return max(-MAX_LOUDNESS_GAIN_DB, min(MAX_LOUDNESS_GAIN_DB, target - result['loudness']))
+
+def loudness_fields(entry, results):
+    """音乐库接口中来自响度分析的字段"""
+    result = results.get(entry['hash']) if entry['hash'] else None
+    if not result or 'error' in result:
+        return {'loudness': None, 'peak': None, 'gain': None}
+    return {'loudness': result['loudness'], 'peak': result['peak'],
+            'gain': round(loudness_gain_db(result), 1)}
+
+def get_track_gain(music_file):
+    """播放时的响度校正系数，未分析、文件已变化或未启用校正时返回1.0"""
+    if not get_config_value('loudness_normalize', True):
+        return 1.0
+    entry = music_index['files'].get(os.path.basename(music_file))
+    if entry is None or not entry['hash']:
+        return 1.0
+    try:
+        if os.stat(music_file).st_mtime_ns != entry['mtime']:
+            return 1.0  # 文件已被覆盖，索引尚未更新
+    except OSError:
+        return 1.0
+    return 10 ** (loudness_gain_db(get_loudness_results().get(entry['hash'])) / 20)
+
+def scale_samples(samples, gain):
+    """按响度校正系数缩放 int16 样本，超出满刻度的样本削波，返回新的数组
+
+    声道音量最大为1，只能衰减；提升安静的文件必须直接放大样本。
+    """
+    if gain == 1.0:
+        return samples
+    scaled = samples.astype(np.float32) * gain
+    np.clip(scaled, -32768, 32767, out=scaled)
+    return scaled.astype(np.int16)
+
+def get_loudness_workers():
+    """响度分析的进程数，默认保留一个核给播放和网页服务"""
+    return max(1, get_config_value('loudness_workers', (os.cpu_count() or 2) - 1))
+
+def analyze_music_loudness(pending):
+    """在进程池中并行分析 {内容哈希: 文件名}，每完成一个保存一个
+
+    单个文件无法分析时保存错误信息，不再重复分析；
+    分析进程异常退出（如内存不足）时抛出 BrokenProcessPool，不保存结果，稍后重试。
+    """
+    workers = min(get_loudness_workers(), len(pending))
+    logger.info(f"开始分析 {len(pending)} 个音乐文件的响度（{workers} 个进程）")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=loudness.init_worker) as pool:
+        futures = {}
+        for file_hash, name in pending.items():
+            path = os.path.join(MUSIC_DIR, name)
+            futures[pool.submit(loudness.analyze_file, path)] = (file_hash, name, os.stat(path).st_mtime_ns)
+        for future in as_completed(futures):
+            file_hash, name, mtime = futures[future]
+            try:
+                result = future.result()
+                logger.info(f"响度分析完成: {name} {result['loudness']} LUFS，峰值 {result['peak']} dBFS")
+            except BrokenProcessPool:
+                raise
+            except Exception as e:
+                result = {'error': str(e), 'version': loudness.ANALYSIS_VERSION}
+                logger.warning(f"响度分析失败 {name}: {str(e)}")
+            try:
+                if os.stat(os.path.join(MUSIC_DIR, name)).st_mtime_ns != mtime:
+                    continue  # 分析期间文件被修改，等索引更新后按新内容重新分析
+            except OSError:
+                continue
+            result['analyzed_at'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            loudness_store.update(lambda data: data['files'].__setitem__(file_hash, result))
+
+def loudness_analyzer():
+    """响度分析线程：音乐库变化时只分析新增或内容变化的文件
+
+    分析结果按内容哈希保存，文件改名或重新复制不会重复分析；
+    计算在低优先级的子进程中进行，不占用定时任务和播放线程。
+    """
+    while True:
+        loudness_wakeup.clear()
+        timeout = None
+        try:
+            _, files = get_music_index()
+            results = get_loudness_results()
+            pending = {}
+            for name, entry in sorted(files.items()):
+                result = results.get(entry['hash'])
+                if entry['hash'] and (not result or result.get('version') != loudness.ANALYSIS_VERSION):
+                    pending.setdefault(entry['hash'], name)
+            if pending:
+                analyze_music_loudness(pending)
+                # 响度校正系数变化，缓存中的声音需要按新系数重新解码
+                audio_preload_wakeup.set()
+                preflight_wakeup.set()
+            
+            # 清理已不在音乐库中的文件的结果
+            current = {entry['hash'] for entry in files.values()}
+            if any(file_hash not in current for file_hash in get_loudness_results()):
+                def prune(data):
+                    for file_hash in [file_hash for file_hash in data['files'] if file_hash not in current]:
+                        del data['files'][file_hash]
+                loudness_store.update(prune)
+        except BrokenProcessPool as e:
+            logger.error(f"响度分析进程异常退出，{LOUDNESS_RETRY_SECONDS}秒后重试: {str(e)}")
+            timeout = LOUDNESS_RETRY_SECONDS
+        except Exception as e:
+            logger.error(f"响度分析失败: {str(e)}")
+        loudness_wakeup.wait(timeout)
+
 @app.route('/api/music')
 @login_required
 def list_music():
-    """列出所有音乐文件"""
+    """列出所有音乐文件
+
+    不带参数时返回文件名列表；带 fields、q、page、per_page 参数时返回文件信息：
+    fields 为逗号分隔的字段名，q 按文件名筛选（不区分大小写），
+    page 从1开始，per_page 最大500，不指定 page 和 per_page 时返回全部。
+    """
     try:
-        # 确保返回的文件名是UTF-8编码
-        files = [f.decode('utf-8') if isinstance(f, bytes) else f 
-                for f in os.listdir(MUSIC_DIR) 
-                if f.lower().endswith(('.mp3', '.wav'))]
-        return jsonify(files)
+        version, files = get_music_index()
+        args = request.args
+        if not any(name in args for name in ('fields', 'q', 'page', 'per_page')):
+            response = jsonify(sorted(files))
+        else:
+            fields = [field for field in args.get('fields', ','.join(MUSIC_FIELDS)).split(',') if field]
+            unknown = [field for field in fields if field not in MUSIC_FIELDS]
+            if unknown:
+                return jsonify({'error': f"未知字段: {', '.join(unknown)}"}), 400
+            if 'name' not in fields:
+                fields.insert(0, 'name')
+            
+            names = sorted(files)
+            keyword = args.get('q', '').strip().lower()
+            if keyword:
+                names = [name for name in names if keyword in name.lower()]
+            
+            total = len(names)
+            page = max(args.get('page', 1, type=int), 1)
+            per_page = args.get('per_page', 0, type=int)
+            if per_page > 0 or 'page' in args:
+                per_page = min(per_page if per_page > 0 else 50, MAX_MUSIC_PAGE_SIZE)
+                names = names[(page - 1) * per_page:page * per_page]
+            else:
+                page, per_page = 1, total
+            
+            rows = []
+            results = get_loudness_results() if any(field in LOUDNESS_FIELDS for field in fields) else None
+            for name in names:
+                entry = files[name]
+                if results is not None:
+                    entry = dict(entry, **loudness_fields(entry, results))
+                rows.append({field: entry[field] for field in fields})
+            response = jsonify({
+                'total': total,
+                'page': page,
+                'per_page': per_page,
+                'files': rows
+            })
+        
+        # 索引、响度分析结果和配置都不变时浏览器重新验证可直接返回304
+        response.set_etag(f"{version}-{music_index['dir_mtime']}-{loudness_store.snapshot()[0]}-{get_config_version()}")
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     except Exception as e:
         error_msg = f"列出音乐文件错误: {e}"
         logger.error(error_msg)
@@ -433,11 +1611,21 @@ def list_music():
 @app.route('/api/play', methods=['POST'])
 @login_required
 def play():
-    """播放音乐"""
+    """播放音乐，提交到音频工作线程后立即返回任务ID
+
+    传入 playlist（音乐文件名列表）时依次无缝播放，shuffle 为 true 时打乱顺序。
+    """
     try:
         data = request.json
-        play_music(os.path.join(MUSIC_DIR, data.get('music_file')))
-        return jsonify({'status': 'success'})
+        playlist = data.get('playlist') or None
+        if playlist is not None and (not isinstance(playlist, list)
+                                     or not all(isinstance(name, str) and name for name in playlist)):
+            return jsonify({'status': 'error', 'error': '播放列表应为音乐文件名的列表'}), 400
+        music_file = playlist[0] if playlist else data.get('music_file')
+        if not music_file:
+            return jsonify({'status': 'error', 'error': '缺少music_file参数'}), 400
+        job_id = submit_playback('play', music_file, playlist=playlist, shuffle=bool(data.get('shuffle', False)))
+        return jsonify({'status': 'success', 'job_id': job_id}), 202
     except Exception as e:
         error_msg = f"播放音乐错误: {e}"
         logger.error(error_msg)
@@ -446,119 +1634,197 @@ def play():
 @app.route('/api/stop', methods=['POST'])
 @login_required
 def stop():
-    """停止播放"""
+    """停止播放，提交到音频工作线程后立即返回任务ID"""
     try:
-        stop_music()
-        return jsonify({'status': 'success'})
+        job_id = submit_playback('stop')
+        return jsonify({'status': 'success', 'job_id': job_id}), 202
     except Exception as e:
         error_msg = f"停止播放错误: {e}"
         logger.error(error_msg)
         return jsonify({'error': error_msg}), 500
 
+@app.route('/api/queue', methods=['GET'])
+@login_required
+def playback_queue_status():
+    """正在播放的播放列表：曲目、当前位置，没有播放列表时 active 为 false"""
+    try:
+        state = get_playback_state()['queue']
+        return jsonify(dict(state, active=True) if state else {'active': False})
+    except Exception as e:
+        logger.error(f"获取播放队列失败: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/queue/next', methods=['POST'])
+@login_required
+def playback_queue_next():
+    """播放列表跳到下一首，提交到音频工作线程后立即返回任务ID"""
+    try:
+        job_id = submit_playback('next')
+        return jsonify({'status': 'success', 'job_id': job_id}), 202
+    except Exception as e:
+        error_msg = f"切换曲目错误: {e}"
+        logger.error(error_msg)
+        return jsonify({'error': error_msg}), 500
+
+@app.route('/api/playback/<job_id>', methods=['GET'])
+@login_required
+def playback_job_status(job_id):
+    """查询播放任务的执行结果"""
+    job = get_playback_job(job_id)
+    if job:
+        return jsonify(job)
+    return jsonify({'status': 'error', 'error': '指定的播放任务不存在'}), 404
+
+def describe_task(task):
+    """任务的简要描述，用于日志"""
+    parts = [format_task_time(task['time']), task['music_file']]
+    if task.get('playlist'):
+        parts.append(f"播放列表{len(task['playlist'])}首" + ('（随机）' if task.get('shuffle') else ''))
+    if task.get('weekdays') is not None:
+        parts.append('周' + '、'.join(WEEKDAY_NAMES[day] for day in task['weekdays']))
+    if task.get('start_date') or task.get('end_date'):
+        parts.append(f"{task.get('start_date') or ''}~{task.get('end_date') or ''}")
+    if task.get('volume') is not None:
+        parts.append(f"音量{task['volume']}")
+    if task.get('duck'):
+        parts.append('叠加播放')
+    if task.get('streaming'):
+        parts.append('分块解码')
+    if task.get('misfire', 'skip') != 'skip':
+        parts.append({'run_late': '错过补播', 'coalesce': '错过合并补播'}[task['misfire']])
+    parts.append('仅工作日' if task.get('workday_only') else '每天')
+    if not task.get('enabled', True):
+        parts.append('已停用')
+    return ' - '.join(parts)
+
 @app.route('/api/schedule', methods=['GET', 'POST'])
 @login_required
 def manage_schedule():
-    """管理定时任务"""
+    """管理定时任务
+
+    GET 返回按时间排序的任务列表；POST 添加一个任务，同一时间可以有多个任务。
+    """
     if request.method == 'POST':
         try:
             data = request.get_json()
             if not data:
                 return jsonify({'status': 'error', 'error': '无效的请求数据'}), 400
-
-            time = data.get('time')
-            music_file = data.get('music_file')
-            workday_only = data.get('workday_only', False)
-
-            if not time or not music_file:
-                return jsonify({'status': 'error', 'error': '缺少必要的参数'}), 400
-
-            # 加载现有的时间表
-            schedule = load_schedule()
             
-            # 添加新任务
-            schedule[time] = {
-                'music_file': music_file,
-                'workday_only': workday_only
-            }
-            
-            # 保存时间表
-            save_schedule(schedule)
-            logger.info("定时任务保存成功")
-            logger.info(f"添加定时任务: {time} - {music_file} ({'仅工作日' if workday_only else '每天'})")
-            
-            # 重启定时任务线程
-            check_and_restart_schedule_thread()
-            
-            return jsonify({'status': 'success'})
+            try:
+                task = normalize_task(data, uuid.uuid4().hex[:8])
+            except ValueError as e:
+                return jsonify({'status': 'error', 'error': str(e)}), 400
+
+            # 添加新任务并保存
+            ok, message = modify_schedule(lambda tasks: tasks.append(task))
+            if not ok:
+                return jsonify({'status': 'error', 'error': message}), 500
+            logger.info(f"添加定时任务: {describe_task(task)}")
+            return jsonify({'status': 'success', 'task': task})
         except Exception as e:
             logger.error(f"保存定时任务失败: {str(e)}")
             return jsonify({'status': 'error', 'error': str(e)}), 500
     elif request.method == 'GET':
         try:
-            schedule = load_schedule()
-            return jsonify(schedule)
+            return jsonify({'tasks': load_schedule()})
         except Exception as e:
             logger.error(f"获取定时任务失败: {str(e)}")
             return jsonify({'status': 'error', 'error': str(e)}), 500
 
-@app.route('/api/schedule/<time>', methods=['DELETE'])
+@app.route('/api/schedule/<task_id>', methods=['PUT'])
+@login_required
+def update_schedule(task_id):
+    """修改定时任务，未提供的字段保持不变"""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'status': 'error', 'error': '无效的请求数据'}), 400
+        
+        def apply(tasks):
+            for i, task in enumerate(tasks):
+                if task['id'] == task_id:
+                    tasks[i] = normalize_task(dict(task, **data), task_id)
+                    return tasks[i]
+            raise LookupError('指定的任务不存在')
+        
+        try:
+            task = update_schedule_tasks(apply)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'error': str(e)}), 400
+        except LookupError as e:
+            return jsonify({'status': 'error', 'error': str(e)}), 404
+        logger.info(f"修改定时任务: {describe_task(task)}")
+        return jsonify({'status': 'success', 'task': task})
+    except Exception as e:
+        logger.error(f"修改定时任务失败: {str(e)}")
+        return jsonify({'status': 'error', 'error': str(e)}), 500
+
+@app.route('/api/schedule/<task_id>', methods=['DELETE'])
 @login_required
-def delete_schedule(time):
-    """删除定时任务"""
+def delete_schedule(task_id):
+    """删除定时任务
+
+    参数为任务ID；为兼容旧接口，也可以传入时间（HH:MM），删除该时间的所有任务。
+    """
     try:
-        schedule = load_schedule()
+        def apply(tasks):
+            removed = [task for task in tasks if task['id'] == task_id]
+            if not removed:
+                try:
+                    task_time = parse_task_time(task_id).strftime('%H:%M:%S')
+                    removed = [task for task in tasks if task['time'] == task_time]
+                except ValueError:
+                    pass
+            if not removed:
+                raise LookupError('指定的任务不存在')
+            removed_ids = {task['id'] for task in removed}
+            tasks[:] = [task for task in tasks if task['id'] not in removed_ids]
+            return removed
         
-        if time in schedule:
-            task = schedule[time]
-            del schedule[time]
-            save_schedule(schedule)
-            logger.info("定时任务保存成功")
-            logger.info(f"删除定时任务: {time} - {task['music_file']} ({'仅工作日' if task.get('workday_only') else '每天'})")
-            
-            # 重启定时任务线程
-            check_and_restart_schedule_thread()
-            
-            return jsonify({'status': 'success'})
-        else:
-            return jsonify({'status': 'error', 'error': '指定的时间不存在'}), 404
+        try:
+            removed = update_schedule_tasks(apply)
+        except LookupError as e:
+            return jsonify({'status': 'error', 'error': str(e)}), 404
+        for task in removed:
+            logger.info(f"删除定时任务: {describe_task(task)}")
+        return jsonify({'status': 'success'})
     except Exception as e:
         logger.error(f"删除定时任务失败: {str(e)}")
         return jsonify({'status': 'error', 'error': str(e)}), 500
 
 def get_week_schedule():
     """获取周日程配置"""
-    config = load_config()
-    return config.get('week_schedule', {
-        "odd_week_rest": True,
-        "even_week_rest": False,
-        "saturday_work": True
-    })
-
-def load_config():
-    """加载配置文件"""
-    try:
-        if os.path.exists(CONFIG_FILE):
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-    except Exception as e:
-        logger.error(f"加载配置文件失败: {str(e)}")
-    
-    # 默认配置
+    return dict(get_workday_calendar()['week_schedule'])
+
+def default_config():
+    """默认配置"""
     return {
-        "week_schedule": {
-            "odd_week_rest": True,
-            "even_week_rest": False,
-            "saturday_work": True
-        },
+        "week_schedule": dict(DEFAULT_WEEK_SCHEDULE),
         "volume": 80  # 添加默认音量设置
     }
 
-def save_config(config):
-    """保存配置文件"""
+def on_config_changed():
+    """本进程修改配置后通知相关模块"""
+    invalidate_workday_calendar()
+    # 目标响度等设置可能变化，按新的响度校正系数重新预解码
+    audio_preload_wakeup.set()
+    preflight_wakeup.set()
+    notify_state_changed()
+    notify_leader('config')
+
+config_store = JsonFileStore(CONFIG_FILE, default=default_config, on_change=on_config_changed)
+
+def get_config_value(key, default=None):
+    """读取单个配置项，不复制整个配置"""
+    return copy.deepcopy(config_store.snapshot()[1].get(key, default))
+
+def update_config(func):
+    """在写锁内基于最新配置执行 func(config) 并保存，成功返回True
+
+    只修改需要的字段，并发修改不同字段时不会互相覆盖。
+    """
     try:
-        os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=4, ensure_ascii=False)
+        config_store.update(func)
         return True
     except Exception as e:
         logger.error(f"保存配置文件失败: {str(e)}")
@@ -589,17 +1855,21 @@ def task_overview():
 @app.route('/api/logs')
 @login_required
 def get_logs():
-    """获取运行日志的API端点"""
+    """获取运行日志的API端点
+
+    带 since 参数时只返回该序号之后的新日志（最多 limit 条）。
+    """
     try:
-        # 确保日志文件存在
-        if not os.path.exists(LOG_FILE):
-            with open(LOG_FILE, 'w', encoding='utf-8') as f:
-                pass
-            
+        since = request.args.get('since', type=int)
+        limit = max(1, min(request.args.get('limit', MAX_LOG_LINES, type=int), MAX_LOG_LINES))
+        if since is not None:
+            return jsonify(get_logs_since(since, limit))
+        
         # 返回内存中的日志缓存
-        logs = list(log_buffer)
-        logger.debug(f"返回日志条数: {len(logs)}")
-        return jsonify({"logs": logs})
+        with log_lock:
+            logs = [line for _, line in log_buffer][-limit:]
+            last_seq = log_seq
+        return jsonify({"logs": logs, "last_seq": last_seq})
     except Exception as e:
         error_msg = f"获取日志失败: {str(e)}"
         logger.error(error_msg)
@@ -607,12 +1877,19 @@ def get_logs():
 
 def clear_logs():
     """清除所有日志"""
+    if service_role == 'follower':
+        # 日志文件和推送由主进程负责，清除结果会通过事件流同步回来
+        try:
+            return leader_request('clear_logs')
+        except Exception as e:
+            logger.error(f"清除日志失败: {str(e)}")
+            return False
     try:
         # 清除日志文件
         with open(LOG_FILE, 'w', encoding='utf-8') as f:
             f.write('')
         # 清除内存中的日志缓存
-        log_buffer.clear()
+        clear_log_buffer()
         logger.info('日志已清除')
         return True
     except Exception as e:
@@ -633,8 +1910,7 @@ def clear_logs_endpoint():
 def get_week_schedule_api():
     """获取周设置"""
     try:
-        config = load_config()
-        return jsonify(config['week_schedule'])
+        return daily_json_response('week_schedule', lambda today: get_week_schedule())
     except Exception as e:
         logger.error(f"获取周设置失败: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -651,15 +1927,15 @@ def update_week_schedule_api():
         if data is None:
             return jsonify({'error': '无效的JSON数据'}), 400
             
-        config = load_config()
-        config['week_schedule'] = {
+        week_schedule = {
             'odd_week_rest': bool(data.get('odd_week_rest', True)),
             'even_week_rest': bool(data.get('even_week_rest', False)),
             'saturday_work': bool(data.get('saturday_work', True))
         }
         
-        if save_config(config):
-            logger.info(f"更新周设置成功: {config['week_schedule']}")
+        if update_config(lambda config: config.__setitem__('week_schedule', week_schedule)):
+            invalidate_daily_responses()
+            logger.info(f"更新周设置成功: {week_schedule}")
             return jsonify({'status': 'success'})
         else:
             return jsonify({'error': '保存配置失败'}), 500
@@ -687,8 +1963,10 @@ def test_audio():
             # 如果没有 scipy，使用 pygame 生成音频
             pygame.mixer.Sound(test_signal.astype(np.int16)).save(test_file)
         
-        # 播放测试音频
-        success = play_music(test_file)
+        # 播放测试音频，等待音频工作线程执行完毕后再清理
+        job = wait_playback_job(submit_playback('play', os.path.basename(test_file), source='test'),
+                                timeout=PLAYBACK_TEST_TIMEOUT)
+        success = job is not None and job['status'] == 'done'
         
         # 清理临时文件
         try:
@@ -704,78 +1982,65 @@ def test_audio():
         logger.error(f"音频测试失败: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def get_next_firings(count=1, now=None):
+    """在时间表索引中查找接下来的 count 次触发（不早于 now），按时间排序
+
+    返回 [(触发时间, 任务), ...]
+    """
+    now = now or datetime.datetime.now()
+    return load_schedule_snapshot()[1].next_firings(now, count)
+
+def format_next_task(fire_at, task, current_time):
+    """将一次触发格式化为前端展示所需的信息"""
+    # 计算剩余时间
+    time_diff = fire_at - current_time
+    total_minutes = time_diff.days * 24 * 60 + time_diff.seconds // 60
+    
+    # 根据剩余时间确定状态
+    if total_minutes <= 60:  # 1小时内
+        status = 'imminent'
+        status_text = '即将执行'
+    elif fire_at.date() == current_time.date():  # 今天
+        status = 'today'
+        status_text = '今日任务'
+    elif fire_at.date() == current_time.date() + datetime.timedelta(days=1):  # 明天
+        status = 'tomorrow'
+        status_text = '明日任务'
+    else:  # 更远的将来
+        status = 'future'
+        status_text = '未来任务'
+    
+    # 格式化剩余时间
+    if time_diff.days > 0:
+        time_remaining = f"还有{time_diff.days}天{time_diff.seconds // 3600}小时{(time_diff.seconds % 3600) // 60}分钟"
+    elif time_diff.seconds >= 3600:
+        time_remaining = f"还有{time_diff.seconds // 3600}小时{(time_diff.seconds % 3600) // 60}分钟"
+    else:
+        time_remaining = f"还有{time_diff.seconds // 60}分钟"
+    
+    # 格式化显示日期和时间
+    weekday = WEEKDAY_NAMES[fire_at.weekday()]
+    display_date = fire_at.strftime("%m月%d日")
+    display_time = f"{display_date}（星期{weekday}）{format_task_time(task['time'])}"
+    
+    return {
+        'id': task['id'],
+        'time': display_time,
+        'music_file': task['music_file'],
+        'workday_only': task.get('workday_only', False),
+        'next_run': fire_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'time_remaining': time_remaining,
+        'status': status,
+        'status_text': status_text
+    }
+
 def get_next_task():
     """获取下一个要执行的任务"""
     try:
         current_time = datetime.datetime.now()
-        schedule = load_schedule()
-        
-        # 将所有时间转换为今天的日期时间对象进行比较
-        next_task = None
-        next_task_time = None
-        
-        for time_str, task in schedule.items():
-            # 解析时间
-            task_time = datetime.datetime.strptime(time_str, '%H:%M').time()
-            task_datetime = datetime.datetime.combine(current_time.date(), task_time)
-            
-            # 如果时间已过，则看明天的这个时间
-            if task_datetime <= current_time:
-                task_datetime += datetime.timedelta(days=1)
-            
-            # 如果是工作日任务，找到下一个工作日
-            if task.get('workday_only', False):
-                while not workday(task_datetime.date()):
-                    task_datetime += datetime.timedelta(days=1)
-            
-            # 检查是否是最近的任务
-            if next_task_time is None or task_datetime < next_task_time:
-                next_task = task
-                next_task_time = task_datetime
-                next_task['time'] = time_str
-        
-        if next_task:
-            # 计算剩余时间
-            time_diff = next_task_time - current_time
-            total_minutes = time_diff.days * 24 * 60 + time_diff.seconds // 60
-            
-            # 根据剩余时间确定状态
-            if total_minutes <= 60:  # 1小时内
-                status = 'imminent'
-                status_text = '即将执行'
-            elif next_task_time.date() == current_time.date():  # 今天
-                status = 'today'
-                status_text = '今日任务'
-            elif next_task_time.date() == current_time.date() + datetime.timedelta(days=1):  # 明天
-                status = 'tomorrow'
-                status_text = '明日任务'
-            else:  # 更远的将来
-                status = 'future'
-                status_text = '未来任务'
-            
-            # 格式化剩余时间
-            if time_diff.days > 0:
-                time_remaining = f"还有{time_diff.days}天{time_diff.seconds // 3600}小时{(time_diff.seconds % 3600) // 60}分钟"
-            elif time_diff.seconds >= 3600:
-                time_remaining = f"还有{time_diff.seconds // 3600}小时{(time_diff.seconds % 3600) // 60}分钟"
-            else:
-                time_remaining = f"还有{time_diff.seconds // 60}分钟"
-            
-            # 格式化显示日期和时间
-            weekday_names = ['一', '二', '三', '四', '五', '六', '日']
-            weekday = weekday_names[next_task_time.weekday()]
-            display_date = next_task_time.strftime("%m月%d日")
-            display_time = f"{display_date}（星期{weekday}）{next_task['time']}"
-            
-            return {
-                'time': display_time,
-                'music_file': next_task['music_file'],
-                'workday_only': next_task.get('workday_only', False),
-                'next_run': next_task_time.strftime('%Y-%m-%d %H:%M:%S'),
-                'time_remaining': time_remaining,
-                'status': status,
-                'status_text': status_text
-            }
+        firings = get_next_firings(1, current_time)
+        if firings:
+            return format_next_task(*firings[0], current_time)
         return None
     except Exception as e:
         logger.error(f"获取下一个任务失败: {str(e)}")
@@ -784,8 +2049,19 @@ def get_next_task():
 @app.route('/api/next-task', methods=['GET'])
 @login_required
 def next_task():
-    """获取下一个任务的API"""
+    """获取下一个任务的API
+
+    带 count 参数时返回接下来 count 次触发的列表。
+    """
     try:
+        count = request.args.get('count', type=int)
+        if count is not None:
+            count = max(1, min(count, MAX_NEXT_FIRINGS))
+            current_time = datetime.datetime.now()
+            tasks = [format_next_task(*firing, current_time)
+                     for firing in get_next_firings(count, current_time)]
+            return jsonify({'tasks': tasks})
+        
         task = get_next_task()
         if task:
             return jsonify(task)
@@ -842,99 +2118,377 @@ def get_current_work_status():
 @login_required
 def work_status():
     """获取当前工作状态的API"""
+    try:
+        return daily_json_response('work_status', compute_work_status)
+    except Exception:
+        return jsonify({'error': '获取工作状态失败'}), 500
+
+def compute_work_status(today):
+    """计算工作状态，失败时抛出异常以免缓存错误结果"""
     status = get_current_work_status()
-    if status:
-        return jsonify(status)
-    return jsonify({'error': '获取工作状态失败'}), 500
+    if status is None:
+        raise RuntimeError('获取工作状态失败')
+    return status
 
 def start_background_threads():
     """启动后台线程"""
     try:
         logger.info("正在启动后台线程...")
-        check_and_restart_schedule_thread()
+        ensure_playback_worker()
+        ensure_schedule_thread()
         
         # 启动日历更新线程
         calendar_thread = threading.Thread(target=check_calendar_update, daemon=True)
         calendar_thread.start()
+        
+        # 启动音频预解码线程
+        audio_preload_thread = threading.Thread(target=preload_scheduled_audio, daemon=True)
+        audio_preload_thread.start()
+        audio_preload_wakeup.set()
+        
+        # 启动任务预检线程
+        preflight_thread = threading.Thread(target=preflight_scheduled_tasks, daemon=True)
+        preflight_thread.start()
+        
+        # 启动响度分析线程
+        loudness_thread = threading.Thread(target=loudness_analyzer, daemon=True)
+        loudness_thread.start()
         logger.info("后台线程启动完成")
     except Exception as e:
         logger.error(f"启动后台线程失败: {str(e)}")
 
-def check_and_restart_schedule_thread():
-    """检查定时任务线程状态，如果不在运行则重新启动"""
+def ensure_schedule_thread():
+    """确保定时任务线程正在运行
+
+    线程一直运行，时间表的修改通过 schedule_changes 发给它，不再为修改而重启线程。
+    """
     global schedule_thread
-    try:
-        # 如果线程存在且正在运行，先停止它
-        if schedule_thread and schedule_thread.is_alive():
-            logger.info("正在停止现有定时任务线程...")
-            # 设置标志以通知线程退出
-            schedule_thread.stop_flag = True
-            # 等待线程完成当前循环
-            schedule_thread.join(timeout=2)
-            schedule_thread = None
-        
-        # 创建并启动新线程
-        logger.info("正在创建新的定时任务线程...")
+    if schedule_thread is None or not schedule_thread.is_alive():
         schedule_thread = threading.Thread(target=check_schedule, daemon=True)
-        schedule_thread.stop_flag = False
         schedule_thread.start()
-        logger.info("定时任务线程已重新启动")
+
+def notify_schedule_changed():
+    """时间表已变化：唤醒预解码和预检线程，推送给页面并通知主进程
+
+    定时任务线程由 update_schedule_tasks 发送的增量修改唤醒。
+    """
+    audio_preload_wakeup.set()
+    preflight_wakeup.set()
+    notify_state_changed()
+    event_bus.publish('schedule', {'tasks': load_schedule()})
+    notify_leader('schedule')
+
+def get_misfire_grace(task):
+    """任务的补播宽限时间（秒），不小于准时的容差"""
+    grace = task.get('misfire_grace')
+    if grace is None:
+        grace = get_config_value('misfire_grace_seconds', DEFAULT_MISFIRE_GRACE_SECONDS)
+    return max(grace, SCHEDULE_MISFIRE_SECONDS)
+
+def misfire_outcome(index, task, fire_at, now):
+    """按任务的错过策略决定一次延迟触发的处理：'play' 补播、'missed' 错过、'coalesced' 并入之后的触发"""
+    policy = task.get('misfire', 'skip')
+    if policy == 'skip' or (now - fire_at).total_seconds() > get_misfire_grace(task):
+        return 'missed'
+    if policy == 'coalesce':
+        # 之后还有会播放的触发也已到期时，只补播最近的一次
+        day = fire_at + datetime.timedelta(days=1)
+        while day <= now:
+            if index.runs_on(task['id'], day.date()):
+                return 'coalesced'
+            day += datetime.timedelta(days=1)
+    return 'play'
+
+def recover_schedule_cursor(index, now):
+    """启动恢复：从上次心跳开始检查错过的触发，返回定时任务线程的起始时刻
+
+    载入各任务已处理的触发时刻，已播放或已记录的触发不会重复处理；
+    没有心跳（首次运行）时只检查最近 SCHEDULE_MISFIRE_SECONDS 秒。
+    """
+    cursor = now - datetime.timedelta(seconds=SCHEDULE_MISFIRE_SECONDS)
+    try:
+        heartbeat, fired = load_scheduler_state(set(index.tasks))
     except Exception as e:
-        logger.error(f"检查或重启定时任务线程时出错: {str(e)}")
+        logger.error(f"读取定时任务状态失败: {str(e)}")
+        return cursor
+    last_fired_at.update(fired)
+    if heartbeat is not None and heartbeat < cursor:
+        cursor = max(heartbeat, now - datetime.timedelta(days=SCHEDULE_RECOVERY_DAYS))
+        missed = sum(1 for fire_at, task in index.due(cursor, now, check_workday=False)
+                     if fire_at > last_fired_at.get(task['id'], datetime.datetime.min))
+        logger.warning(f"定时任务线程上次心跳为 {heartbeat.strftime('%Y-%m-%d %H:%M:%S')}，"
+                       f"检查此后错过的 {missed} 次触发")
+    return cursor
 
 def check_schedule():
-    """检查并执行定时任务"""
-    # 获取当前线程对象
-    current_thread = threading.current_thread()
-    
+    """检查并执行定时任务
+
+    在时间表索引中查找下一次触发时间，在 Event 上休眠到该时刻；
+    时间表变化时被提前唤醒，按 schedule_changes 中的修改增量调整自己的索引，
+    版本号不衔接（其他进程或手动修改了文件）时整体重新加载。cursor 之前的触发都已处理过，
+    处理完所有到期触发时把当前时刻保存为心跳，线程或服务重启后从心跳处继续。
+    延迟超过 SCHEDULE_MISFIRE_SECONDS 的触发按任务的错过策略处理。
+    """
     with app.app_context():
         logger.info("定时任务线程已启动")
-        last_check_time = None
+        schedule_wakeup.clear()
+        # 索引由本线程独占并增量修改，不使用 load_schedule_snapshot 共享的索引
+        schedule_version, data = schedule_store.snapshot()
+        index = ScheduleIndex(data['tasks'])
+        cursor = recover_schedule_cursor(index, datetime.datetime.now())
+        caught_up_at = None  # 最近一次处理完所有到期触发的时刻
+        heartbeat_at = None  # 最近一次保存心跳的时刻
         
-        while not getattr(current_thread, "stop_flag", False):
+        while True:
             try:
+                schedule_wakeup.clear()
+                changed = False
+                reload = False
+                while True:
+                    try:
+                        message = schedule_changes.get_nowait()
+                    except queue.Empty:
+                        break
+                    if message is None:
+                        reload = True
+                        continue
+                    base_version, changes = message
+                    if base_version == schedule_version:
+                        for action, task in changes:
+                            if action == 'remove':
+                                index.remove(task['id'])
+                            else:
+                                index.add(task)
+                        schedule_version += 1
+                        changed = True
+                    elif base_version > schedule_version:
+                        reload = True  # 中间有修改没有收到
+                    # 版本号更早的修改已包含在重新加载的内容中
+                
+                # 其他进程或手动编辑修改了文件时整体重新加载
+                version, data = schedule_store.snapshot()
+                if reload or version != schedule_version:
+                    schedule_version, index = version, ScheduleIndex(data['tasks'])
+                    changed = True
+                    logger.info(f"定时任务队列已重新加载，共 {len(index)} 个任务")
+                if changed and caught_up_at is not None:
+                    # 新加入的任务只补上刚过去不久的触发；正在补处理错过的触发时不移动 cursor
+                    cursor = max(cursor, caught_up_at - datetime.timedelta(seconds=SCHEDULE_MISFIRE_SECONDS))
+                
+                # 非工作日也要在触发时刻记录跳过，这里不检查工作日
+                upcoming = index.next_firings(cursor, 1, check_workday=False)
                 now = datetime.datetime.now()
-                current_time = now.strftime('%H:%M')
+                if not upcoming or upcoming[0][0] > now:
+                    # 到期的触发都已处理
+                    caught_up_at = now
+                    if heartbeat_at is None or (now - heartbeat_at).total_seconds() >= SCHEDULE_HEARTBEAT_SECONDS:
+                        save_heartbeat(now)
+                        heartbeat_at = now
+                if not upcoming:
+                    schedule_wakeup.wait(timeout=SCHEDULE_MAX_SLEEP)
+                    continue
                 
-                # 避免在同一分钟内重复执行
-                if current_time != last_check_time:
-                    last_check_time = current_time
-                    schedule = load_schedule()  # 重新加载时间表
-                    
-                    if current_time in schedule:
-                        task = schedule[current_time]
-                        if not task.get('workday_only', False) or workday(now):
-                            logger.info(f"执行定时任务: {current_time} - {task['music_file']}")
-                            play_music(os.path.join(MUSIC_DIR, task['music_file']))
-                        else:
-                            logger.info(f"跳过非工作日任务: {current_time} - {task['music_file']}")
+                fire_at = upcoming[0][0]
+                delay = (fire_at - now).total_seconds()
+                if delay > 0:
+                    # 休眠到触发时刻；设置上限以应对系统时间被校准
+                    schedule_wakeup.wait(timeout=min(delay, SCHEDULE_MAX_SLEEP))
+                    continue
                 
-                # 等待到下一秒的开始
-                next_second = (now + datetime.timedelta(seconds=1)).replace(microsecond=0)
-                sleep_time = (next_second - now).total_seconds()
-                time.sleep(max(0, sleep_time))
+                # 同一秒可能有多个任务，一起处理
+                cursor = fire_at + datetime.timedelta(seconds=1)
+                for fire_at, task in index.due(fire_at, cursor, check_workday=False):
+                    task_id = task['id']
+                    task_time = format_task_time(task['time'])
+                    if fire_at <= last_fired_at.get(task_id, datetime.datetime.min):
+                        continue  # 重启前已经处理过
+                    save_last_fired(task_id, fire_at)
+                    if not index.runs_on(task_id, fire_at.date()):
+                        logger.info(f"跳过非工作日任务: {task_time} - {task['music_file']}")
+                        record_execution(task_time, task['music_file'], fire_at, 'skipped', task_id=task_id)
+                        continue
+                    if -delay > SCHEDULE_MISFIRE_SECONDS:
+                        outcome = misfire_outcome(index, task, fire_at, now)
+                        late = f"{int(-delay)}秒"
+                        if outcome == 'missed':
+                            logger.warning(f"错过定时任务: {task_time} - {task['music_file']} (延迟{late})")
+                            record_execution(task_time, task['music_file'], fire_at, 'missed', task_id=task_id)
+                            continue
+                        if outcome == 'coalesced':
+                            logger.info(f"错过定时任务，并入之后的补播: {task_time} - {task['music_file']}")
+                            record_execution(task_time, task['music_file'], fire_at, 'coalesced', task_id=task_id)
+                            continue
+                        logger.warning(f"补播定时任务: {task_time} - {task['music_file']} (延迟{late})")
+                    else:
+                        logger.info(f"执行定时任务: {task_time} - {task['music_file']}")
+                    try:
+                        submit_playback('play', task['music_file'], source='schedule', task_time=task_time,
+                                        fired_at=fire_at, task_id=task_id, volume=task.get('volume'),
+                                        duck=task.get('duck', False), streaming=task.get('streaming', False),
+                                        playlist=task.get('playlist'), shuffle=task.get('shuffle', False))
+                    except Exception as e:
+                        # 单个任务提交失败不影响同一时刻的其他任务
+                        logger.error(f"提交定时任务失败: {task_time} - {str(e)}")
+                        record_execution(task_time, task['music_file'], fire_at, 'failed', task_id=task_id)
                 
             except Exception as e:
                 logger.error(f"定时任务错误: {str(e)}")
                 time.sleep(1)  # 出错时等待1秒后继续
+
+class SystemVolume:
+    """系统混音器音量
+
+    优先通过 pyalsaaudio 直接调用 ALSA；未安装时使用常驻的 `amixer -s` 进程，
+    从标准输入发送命令，不再每次调整都启动 shell 和 amixer 进程。
+    调整在后台线程中执行，拖动滑块时只应用最新的值；
+    配置文件在停止调整 VOLUME_SAVE_DELAY 秒后才保存一次。
+    """
+
+    def __init__(self, save_delay=VOLUME_SAVE_DELAY):
+        self.save_delay = save_delay
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.target = None  # 最新请求的音量
+        self.applied = None  # 已设置到系统混音器的音量
+        self.saved = None  # 已保存到配置文件的音量
+        self.changed_at = 0.0  # 最近一次请求的时刻（monotonic）
+        self.backend = None  # 'alsa'、'amixer'，不可用时为None
+        self.mixer = None
+        self.process = None
+        self.unavailable = False
+        self.requests = 0
+        self.applies = 0
+        self.saves = 0
+
+    def set(self, volume, persist=True):
+        """请求设置音量，立即返回；persist=False 表示该值已在配置文件中"""
+        with self.lock:
+            self.target = volume
+            self.requests += 1
+            self.changed_at = time.monotonic()
+            if not persist:
+                self.saved = volume
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._worker, daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+
+    def _worker(self):
+        while True:
+            with self.lock:
+                target, saved, changed_at = self.target, self.saved, self.changed_at
+            try:
+                if target != self.applied:
+                    self._apply(target)
+                    self.applied = target
+            except Exception as e:
+                logger.error(f"设置系统音量失败: {str(e)}")
+                self.applied = target  # 不反复重试同一个值
             
-            # 检查是否需要退出
-            if getattr(current_thread, "stop_flag", False):
-                break
-        
-        logger.info("定时任务线程已退出")
+            timeout = None
+            if target != saved:
+                remaining = self.save_delay - (time.monotonic() - changed_at)
+                if remaining <= 0:
+                    self._save(target)
+                else:
+                    timeout = remaining
+            self.wakeup.wait(timeout)
+            self.wakeup.clear()
+
+    def _save(self, volume):
+        if save_volume(volume):
+            with self.lock:
+                self.saved = volume
+                self.saves += 1
+
+    def flush(self):
+        """立即保存尚未保存的音量（退出时调用）"""
+        with self.lock:
+            target, saved = self.target, self.saved
+        if target is not None and target != saved:
+            self._save(target)
+
+    def _open(self):
+        """选择可用的混音器接口"""
+        control = get_config_value('mixer_control', DEFAULT_MIXER_CONTROL)
+        if alsaaudio is not None:
+            try:
+                self.mixer = alsaaudio.Mixer(control)
+                self.backend = 'alsa'
+                return
+            except Exception as e:
+                logger.warning(f"无法打开ALSA混音器 {control}: {str(e)}，改用 amixer")
+        try:
+            self.process = subprocess.Popen(
+                ['amixer', '-q', '-s'],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                text=True
+            )
+            self.control = control
+            self.backend = 'amixer'
+        except OSError as e:
+            self.unavailable = True
+            logger.warning(f"无法启动 amixer: {str(e)}，只调整播放音量")
+
+    def _apply(self, volume):
+        if self.unavailable:
+            return
+        for attempt in range(2):
+            if self.backend is None:
+                self._open()
+                if self.unavailable:
+                    return
+            try:
+                if self.backend == 'alsa':
+                    self.mixer.setvolume(int(volume))
+                else:
+                    if self.process.poll() is not None:
+                        raise BrokenPipeError('amixer 进程已退出')
+                    self.process.stdin.write(f"sset {self.control} {int(volume)}%\n")
+                    self.process.stdin.flush()
+                self.applies += 1
+                return
+            except (OSError, ValueError) as e:
+                # 混音器进程退出或设备变化，重新打开后重试一次
+                self.close()
+                if attempt:
+                    raise RuntimeError(str(e))
+
+    def close(self):
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=1)
+            except Exception:
+                self.process.kill()
+        self.process = None
+        self.mixer = None
+        self.backend = None
+
+    def status(self):
+        with self.lock:
+            return {
+                'backend': self.backend,
+                'target': self.target,
+                'applied': self.applied,
+                'saved': self.saved,
+                'requests': self.requests,
+                'applies': self.applies,
+                'saves': self.saves
+            }
+
+system_volume = SystemVolume()
+atexit.register(system_volume.flush)
 
 def load_volume():
-    """从配置文件加载音量设置"""
+    """从配置文件加载音量设置并同步系统音量"""
     global current_volume
     try:
-        config = load_config()
-        current_volume = config.get('volume', 80)
-        # 同步系统音量
-        try:
-            os.system(f'amixer set Master {current_volume}%')
-        except Exception as e:
-            logger.error(f"设置系统音量失败: {str(e)}")
+        current_volume = get_config_value('volume', 80)
+        system_volume.set(current_volume, persist=False)
     except Exception as e:
         logger.error(f"加载音量设置失败: {str(e)}")
         current_volume = 80
@@ -943,9 +2497,7 @@ def load_volume():
 def save_volume(volume):
     """保存音量设置到配置文件"""
     try:
-        config = load_config()
-        config['volume'] = volume
-        if save_config(config):
+        if update_config(lambda config: config.__setitem__('volume', volume)):
             logger.info(f"音量设置已保存: {volume}%")
             return True
         return False
@@ -953,30 +2505,41 @@ def save_volume(volume):
         logger.error(f"保存音量设置失败: {str(e)}")
         return False
 
+def parse_volume(value):
+    """把请求中的音量转换为整数，不是0到100之间的数字时抛出ValueError"""
+    if isinstance(value, bool):
+        raise ValueError('音量应为0到100的整数')
+    try:
+        volume = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError('音量应为0到100的整数')
+    if not 0 <= volume <= 100:
+        raise ValueError('音量应为0到100的整数')
+    return volume
+
 def set_volume(volume):
-    """设置音量（0-100）"""
+    """设置音量（0-100）
+
+    播放音量立即生效，系统音量和配置文件由 system_volume 在后台合并更新。
+    """
     global current_volume
-    current_volume = max(0, min(100, volume))
-    
-    # 设置系统音量
-    try:
-        os.system(f'amixer set Master {current_volume}%')
-    except Exception as e:
-        logger.error(f"设置系统音量失败: {str(e)}")
+    volume = parse_volume(volume)
+    if service_role == 'follower':
+        current_volume = leader_request('set_volume', volume)
+        return True
+    current_volume = volume
     
     # 设置pygame音量
-    if pygame.mixer.get_init():
-        pygame.mixer.music.set_volume(current_volume / 100.0)
-    
-    # 保存音量设置
-    save_volume(current_volume)
+    audio_output.set_volume(current_volume)
     
-    logger.info(f"音量已设置为: {current_volume}%")
+    # 设置系统音量并延迟保存
+    system_volume.set(current_volume)
     return True
 
 def get_volume():
     """获取当前音量（0-100）"""
-    global current_volume
+    if service_role == 'follower':
+        return leader_request('get_volume')
     return current_volume
 
 @app.route('/get_volume', methods=['GET'])
@@ -993,78 +2556,1108 @@ def get_volume_api():
 def set_volume_api():
     """设置音量的API端点"""
     try:
-        data = request.get_json()
-        volume = data.get('volume')
-        if volume is None:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or data.get('volume') is None:
             return jsonify({'status': 'error', 'message': '缺少volume参数'}), 400
+        try:
+            volume = parse_volume(data['volume'])
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
         
         if set_volume(volume):
-            return jsonify({'status': 'success', 'volume': get_volume()})
+            return jsonify({'status': 'success', 'volume': current_volume})
         else:
             return jsonify({'status': 'error', 'message': '设置音量失败'}), 500
     except Exception as e:
         logger.error(f"设置音量失败: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-def play_music(music_file):
-    """播放音乐"""
-    try:
-        # 先停止当前播放
-        stop_music()
-        
-        # 检查文件是否存在
-        if not os.path.exists(music_file):
-            logger.error(f"音乐文件不存在: {music_file}")
+class AudioCache:
+    """已解码音频（PCM）缓存
+
+    以文件路径为键、文件修改时间校验有效性，按内存预算进行 LRU 淘汰。
+    命中时直接从内存播放，无需读取和解码文件。
+    缓存的样本已按响度校正系数缩放，校正系数变化（分析完成、修改目标响度）后视为未缓存。
+    预检通过的文件被固定，触发前不会被淘汰（固定的文件合计可以超出预算）。
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.entries = OrderedDict()  # path -> (mtime, Sound, 字节数, 响度校正系数)
+        self.pinned = frozenset()  # 不淘汰的文件路径
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _sound_bytes(sound):
+        """根据时长和混音器参数估算 PCM 数据大小"""
+        frequency, size, channels = pygame.mixer.get_init()
+        return int(sound.get_length() * frequency * channels * abs(size) // 8)
+
+    def set_budget(self, budget_bytes):
+        """调整内存预算并淘汰超出部分"""
+        with self.lock:
+            self.budget_bytes = budget_bytes
+            self._evict()
+
+    def pin(self, paths):
+        """固定一组文件，替换之前固定的文件"""
+        with self.lock:
+            self.pinned = frozenset(paths)
+            self._evict()
+
+    def _evict(self):
+        for path in list(self.entries):
+            if self.total_bytes <= self.budget_bytes:
+                break
+            if path in self.pinned:
+                continue
+            nbytes = self.entries.pop(path)[2]
+            self.total_bytes -= nbytes
+            logger.info(f"音频缓存淘汰: {os.path.basename(path)}")
+
+    def contains(self, path, gain=1.0):
+        """文件是否已按 gain 缓存且未修改，不计入命中统计"""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
             return False
-            
-        # 确保音量已设置
-        global current_volume
-        if current_volume is None:
-            load_volume()
-            
-        # 初始化之前先退出pygame
-        if pygame.mixer.get_init():
-            pygame.mixer.quit()
-        
-        # 设置环境变量
-        os.environ['SDL_AUDIODRIVER'] = 'alsa'
-        os.environ['AUDIODEV'] = 'plughw:0,0'
+        with self.lock:
+            entry = self.entries.get(path)
+            return entry is not None and entry[0] == mtime and entry[3] == gain
+
+    def get(self, path, gain=1.0):
+        """返回按 gain 缩放后缓存的 Sound，文件已修改、校正系数不同或未缓存时返回None"""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry and entry[0] == mtime and entry[3] == gain:
+                self.entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    @staticmethod
+    def estimate_bytes(path):
+        """根据文件头估算解码后的 PCM 大小，无法估算时返回None"""
+        try:
+            info = probe_wav(path) if path.lower().endswith('.wav') else probe_mp3(path)
+        except Exception:
+            return None
+        if not info['duration']:
+            return None
+        frequency, size, channels = pygame.mixer.get_init()
+        return int(info['duration'] * frequency * channels * abs(size) // 8)
+
+    def load(self, path, gain=1.0, raise_errors=False):
+        """解码文件、按响度校正系数 gain 缩放样本并放入缓存，超出预算的文件不缓存，返回 Sound 或None
+
+        按文件头估算超出预算的文件不做整体解码（长音频整体解码会占用大量内存），
+        播放时分块解码。raise_errors=True 时解码失败抛出异常，用于区分无法解码和超出预算。
+        """
+        sound = self.get(path, gain)
+        if sound is not None:
+            return sound
+        estimated = self.estimate_bytes(path)
+        if estimated is not None and estimated > self.budget_bytes:
+            if raise_errors:
+                check_stream_decodable(path)
+            logger.warning(f"音频文件超出缓存预算，不缓存: {os.path.basename(path)}")
+            return None
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            started = time.perf_counter()
+            sound = pygame.mixer.Sound(path)
+            if gain != 1.0:
+                sound = pygame.sndarray.make_sound(scale_samples(pygame.sndarray.array(sound), gain))
+            nbytes = self._sound_bytes(sound)
+        except Exception as e:
+            logger.error(f"预解码音频失败: {os.path.basename(path)} - {str(e)}")
+            if raise_errors:
+                raise
+            return None
+        if nbytes > self.budget_bytes:
+            logger.warning(f"音频文件超出缓存预算，不缓存: {os.path.basename(path)}")
+            return None
         
-        # 使用测试成功的音频配置
+        with self.lock:
+            old = self.entries.pop(path, None)
+            if old:
+                self.total_bytes -= old[2]
+            self.entries[path] = (mtime, sound, nbytes, gain)
+            self.total_bytes += nbytes
+            self._evict()
+        logger.info(f"音频已解码缓存: {os.path.basename(path)} "
+                    f"({nbytes // 1024}KB, {round((time.perf_counter() - started) * 1000)}ms)")
+        return sound
+
+    def status(self):
+        with self.lock:
+            return {
+                'files': [os.path.basename(path) for path in self.entries],
+                'total_bytes': self.total_bytes,
+                'budget_bytes': self.budget_bytes,
+                'pinned': sorted(os.path.basename(path) for path in self.pinned),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+audio_cache = AudioCache(DEFAULT_AUDIO_CACHE_MB * 1024 * 1024)
+
+def check_stream_decodable(path):
+    """确认文件可以分块解码（只解码第一块），无法解码时抛出异常
+
+    非 PCM 编码的 WAV 不支持分块解码，播放时交给 pygame 流式播放，这里不报错。
+    """
+    try:
+        chunk = next(audio_stream.iter_chunks(path), None)
+    except wave.Error:
+        return
+    if chunk is None or not len(chunk):
+        raise ValueError('没有可播放的音频数据')
+
+class ChunkStream:
+    """分块解码播放
+
+    解码线程把文件逐块解码到有上限的缓冲区，再逐块排入声道的播放队列，
+    内存占用只取决于缓冲区上限，与文件时长无关。
+    每块解码后按所属曲目的响度校正系数缩放样本。
+    声道播放完当前块时下一块还没有准备好，记为一次欠载。
+
+    传入多个文件时作为播放列表依次播放：前一首的最后一块和后一首的第一块
+    在同一声道上首尾相接，中间没有间隙；缓冲区不会在曲目之间清空，
+    当前曲目播放的同时下一首已经开始解码。已在解码缓存中的曲目整首作为一块。
+    """
+
+    def __init__(self, paths, buffer_bytes, info=None):
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        self.info = info or {}  # 随队列状态返回的附加信息
+        self.on_track = None  # 进入新曲目时调用 on_track(stream, 曲目序号)
+        self.buffer_bytes = buffer_bytes
+        self.skip_through = -1  # 跳过此序号及之前的曲目
+        self.chunks = self._iter_chunks()
+        self.buffer = deque()  # (Sound, 字节数, 曲目序号)
+        self.buffered_bytes = 0
+        self.peak_bytes = 0
+        self.decoded = 0
+        self.underruns = 0
+        self.current_track = None  # 正在播放的曲目序号
+        self.queued_track = None  # 已排入声道队列、尚未开始播放的块所属曲目
+        self.channel = None
+        self.started = False
+        self.starved = False  # 正处于欠载中，避免同一次欠载重复计数
+        self.eof = False
+        self.closed = False
+        self.error = None
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        # 先同步解码第一块，文件无法解码时在这里抛出异常
+        self._fill()
+        if not self.buffer:
+            raise ValueError('没有可播放的音频数据')
+
+    @property
+    def path(self):
+        """正在播放（尚未开始时为第一首）的文件"""
+        return self.paths[self.current_track or 0]
+
+    def _iter_chunks(self):
+        """依次产生各曲目的 (曲目序号, Sound, 计入缓冲区的字节数)"""
+        for index, path in enumerate(self.paths):
+            if index <= self.skip_through:
+                continue
+            gain = get_track_gain(path)
+            sound = audio_cache.get(path, gain) if len(self.paths) > 1 else None
+            if sound is not None:
+                yield index, sound, 0  # 缓存中的声音不额外占用内存
+                continue
+            try:
+                for samples in audio_stream.iter_chunks(path):
+                    if index <= self.skip_through:
+                        break
+                    samples = np.ascontiguousarray(scale_samples(samples, gain))
+                    yield index, pygame.sndarray.make_sound(samples), samples.nbytes
+            except Exception as e:
+                if len(self.paths) == 1:
+                    raise
+                logger.error(f"播放列表中的文件无法解码，已跳过: {os.path.basename(path)} - {str(e)}")
+
+    def _fill(self):
+        """解码一块放入缓冲区，返回是否解码了新的一块"""
+        if self.eof or self.buffered_bytes >= self.buffer_bytes:
+            return False
+        item = next(self.chunks, None)
+        if item is None:
+            self.eof = True
+            return False
+        index, sound, nbytes = item
+        with self.lock:
+            if index <= self.skip_through:
+                return True  # 解码期间跳过了这首
+            self.buffer.append((sound, nbytes, index))
+            self.buffered_bytes += nbytes
+            self.peak_bytes = max(self.peak_bytes, self.buffered_bytes)
+        self.decoded += 1
+        return True
+
+    def _feed(self):
+        """声道的播放队列空出时排入下一块，播放进入新曲目时通知 on_track"""
+        changed = None
+        with self.lock:
+            if self.closed or self.channel.get_queue() is not None:
+                return
+            # 队列空出说明之前排入的块已经开始播放
+            if self.queued_track is not None:
+                if self.queued_track != self.current_track:
+                    changed = self.current_track = self.queued_track
+                self.queued_track = None
+            busy = self.channel.get_busy()
+            if not self.buffer:
+                if self.started and not busy and not self.eof and not self.starved:
+                    self.starved = True
+                    self.underruns += 1
+            else:
+                if self.started and not busy and not self.starved:
+                    self.underruns += 1
+                sound, nbytes, index = self.buffer.popleft()
+                self.buffered_bytes -= nbytes
+                self.channel.queue(sound)
+                if busy:
+                    self.queued_track = index
+                elif index != self.current_track:
+                    changed = self.current_track = index
+                self.started = True
+                self.starved = False
+        if changed is not None and self.on_track is not None:
+            self.on_track(self, changed)
+
+    def start(self, channel, on_track=None):
+        """在指定声道上开始播放，解码线程在后台继续填充缓冲区
+
+        on_track 在之后每次进入新曲目时调用（第一首开始播放时不调用）。
+        """
+        self.channel = channel
+        self._feed()
+        self.on_track = on_track
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
         try:
-            pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=512)
-            logger.info("音频初始化成功")
-            logger.info(f"音频配置: {pygame.mixer.get_init()}")
+            while not self.closed:
+                self._feed()
+                if self.eof and not self.buffer:
+                    break
+                if not self._fill():
+                    time.sleep(STREAM_POLL_INTERVAL)
         except Exception as e:
-            logger.error(f"音频初始化失败: {str(e)}")
+            self.error = str(e)
+            logger.error(f"分块解码失败: {os.path.basename(self.path)} - {str(e)}")
+        finally:
+            self.eof = True
+            self.finished.set()
+            audio_output.record_stream(self)
+
+    def active(self):
+        """是否还在播放（解码未结束或最后一块仍在播放）"""
+        return not self.finished.is_set() or self.channel.get_busy()
+
+    def skip(self):
+        """停止当前曲目，从下一首继续播放，返回是否有正在播放的曲目"""
+        with self.lock:
+            if self.closed or self.current_track is None:
+                return False
+            self.skip_through = max(self.skip_through, self.current_track)
+            self.buffer = deque(item for item in self.buffer if item[2] > self.skip_through)
+            self.buffered_bytes = sum(item[1] for item in self.buffer)
+            self.queued_track = None
+            self.starved = True  # 切换曲目的间隙不计为欠载
+            self.channel.stop()  # 同时清空声道的播放队列
+        return True
+
+    def queue_status(self):
+        """播放列表的状态"""
+        with self.lock:
+            position = self.current_track or 0
+            return dict(self.info, **{
+                'tracks': [os.path.basename(path) for path in self.paths],
+                'position': position,
+                'current': os.path.basename(self.paths[position]),
+                'buffered_tracks': sorted({item[2] for item in self.buffer} - {position}),
+                'finishing': self.eof
+            })
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.buffer.clear()
+            self.buffered_bytes = 0
+            if self.channel is not None:
+                self.channel.stop()
+
+def ramp_gain(start, end, initial, target, now):
+    """增益渐变在 now 时刻的值，参数可以是标量，也可以是同样长度的数组
+
+    采用等功率曲线（升高按正弦、降低按余弦），交叉淡化时总响度保持不变。
+    """
+    progress = np.clip((now - start) / np.maximum(end - start, 1e-6), 0.0, 1.0)
+    angle = progress * (np.pi / 2)
+    rising = target >= initial
+    shape = rising * np.sin(angle) + (1 - rising) * (1.0 - np.cos(angle))
+    return initial + (target - initial) * shape
+
+def gain_ramps(ramps, now):
+    """计算一组增益渐变在 now 时刻的值
+
+    ramps 为 N×4 数组，每行 [开始时刻, 结束时刻, 起始增益, 目标增益]。
+    """
+    return ramp_gain(*ramps.T, now)
+
+class PlaybackVoice:
+    """一路正在播放的音频：缓存声音和分块解码播放各占用一个保留声道，
+    无法分块解码的格式由 pygame.mixer.music 播放"""
+
+    def __init__(self, music_file, channel, base, trim, fade_in, now, stream=None):
+        self.music_file = music_file
+        self.channel = channel  # None 表示由 pygame.mixer.music 播放
+        self.stream = stream  # 分块解码播放时的 ChunkStream
+        self.base = base  # 播放音量（0-1）
+        self.trim = trim  # 声道音量中的响度校正系数，只用于 pygame.mixer.music（其余声音已缩放样本）
+        self.fade = [now, now + fade_in, 0.0 if fade_in > 0 else 1.0, 1.0]
+        self.duck = [now, now, 1.0, 1.0]
+        self.started_at = now
+        self.gain = None  # 最近一次设置的实际音量
+        self.stopping = False  # 淡出结束后停止
+        self.ducking = False  # 叠加播放：结束后恢复其他音乐的音量
+
+    @property
+    def source(self):
+        if self.channel is None:
+            return 'music'
+        return 'stream' if self.stream is not None else 'cache'
+
+    def ramp(self, envelope, now, duration, target):
+        """从当前值开始向 target 渐变"""
+        current = float(ramp_gain(*envelope, now))
+        envelope[:] = [now, now + duration, current, target]
+
+    def fade_out(self, now, duration):
+        self.ramp(self.fade, now, duration, 0.0)
+        self.stopping = True
+
+    def busy(self):
+        if self.channel is None:
+            return pygame.mixer.music.get_busy()
+        if self.stream is not None:
+            return self.stream.active()
+        return self.channel.get_busy()
+
+    def apply(self, gain):
+        if self.channel is None:
+            pygame.mixer.music.set_volume(gain)
+        else:
+            self.channel.set_volume(gain)
+        self.gain = gain
+
+    def stop(self):
+        if self.channel is None:
+            pygame.mixer.music.stop()
+        elif self.stream is not None:
+            self.stream.close()
+        else:
+            self.channel.stop()
+
+class AudioOutput:
+    """常驻的音频输出设备
+
+    启动时打开一次并保持可用，播放时不再反复 quit/init 混音器；
+    设备出错时自动重新打开并重试。
+
+    淡入淡出、交叉淡化和叠加播放时的压低音量由增益线程完成：有渐变进行时
+    每个混音缓冲周期用 NumPy 一次算出所有声音的增益并设置到声道上，
+    没有渐变时线程休眠，不占用CPU。
+    """
+
+    def __init__(self, frequency=44100, size=-16, channels=2, buffer=512):
+        self.params = {'frequency': frequency, 'size': size, 'channels': channels, 'buffer': buffer}
+        self.lock = threading.RLock()
+        self.opened_at = None
+        self.reopen_count = 0
+        self.last_error = None
+        self.last_start_latency_ms = None
+        self.last_source = None
+        self.channels = []  # 播放缓存音频的保留声道
+        self.voices = []  # 正在播放（含正在淡出）的声音
+        self.voices_lock = threading.Lock()
+        self.gain_wakeup = threading.Event()
+        self.gain_thread = None
+        self.stream_stats = {'streams': 0, 'underruns': 0, 'peak_buffer_bytes': 0}  # 已结束的分块解码播放
+
+    def open(self):
+        """打开音频设备，已打开时直接返回"""
+        with self.lock:
+            if pygame.mixer.get_init():
+                return True
+            # 设置环境变量，允许通过环境变量覆盖默认设备
+            os.environ.setdefault('SDL_AUDIODRIVER', 'alsa')
+            os.environ.setdefault('AUDIODEV', 'plughw:0,0')
+            try:
+                pygame.mixer.init(**self.params)
+                pygame.mixer.set_reserved(AUDIO_CHANNELS)
+                self.channels = [pygame.mixer.Channel(i) for i in range(AUDIO_CHANNELS)]
+                with self.voices_lock:
+                    self.voices = []
+                self.opened_at = datetime.datetime.now()
+                self.last_error = None
+                if self.gain_thread is None or not self.gain_thread.is_alive():
+                    self.gain_thread = threading.Thread(target=self._gain_loop, daemon=True)
+                    self.gain_thread.start()
+                logger.info(f"音频设备已打开: {pygame.mixer.get_init()}")
+                return True
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"音频初始化失败: {str(e)}")
+                return False
+
+    def reopen(self):
+        """关闭并重新打开音频设备"""
+        with self.lock:
+            logger.warning("正在重新打开音频设备...")
+            with self.voices_lock:
+                for voice in self.voices:
+                    if voice.stream is not None:
+                        voice.stream.close()
+                self.voices = []
+            try:
+                if pygame.mixer.get_init():
+                    pygame.mixer.quit()
+            except Exception as e:
+                logger.error(f"关闭音频设备失败: {str(e)}")
+            self.reopen_count += 1
+            return self.open()
+
+    def is_busy(self):
+        """是否正在播放（缓存声道或流式播放）"""
+        if not pygame.mixer.get_init():
             return False
+        return pygame.mixer.music.get_busy() or any(channel.get_busy() for channel in self.channels)
+
+    def _wait_started(self, started, voice):
+        """等待播放真正开始，返回启动延迟（毫秒），超时返回None"""
+        deadline = started + AUDIO_START_TIMEOUT
+        while True:
+            if voice.busy():
+                return (time.perf_counter() - started) * 1000
+            if time.perf_counter() >= deadline:
+                return None
+            time.sleep(AUDIO_START_POLL_INTERVAL)
+
+    @staticmethod
+    def fade_settings():
+        """读取渐变设置，返回以秒为单位的字典"""
+        settings = {}
+        for key, default in (('fade_in_ms', DEFAULT_FADE_IN_MS), ('fade_out_ms', DEFAULT_FADE_OUT_MS),
+                             ('crossfade_ms', DEFAULT_CROSSFADE_MS), ('duck_ms', DEFAULT_DUCK_MS)):
+            settings[key[:-3]] = max(0, get_config_value(key, default)) / 1000.0
+        settings['duck_volume'] = max(0, min(100, get_config_value('duck_volume', DEFAULT_DUCK_VOLUME))) / 100.0
+        return settings
+
+    def _take_channel(self):
+        """取得一个空闲的保留声道，都在使用时停止最早的声音"""
+        used = {id(voice.channel) for voice in self.voices if voice.channel is not None}
+        for channel in self.channels:
+            if id(channel) not in used:
+                return channel
+        oldest = next(voice for voice in self.voices if voice.channel is not None)
+        oldest.stop()
+        self.voices.remove(oldest)
+        return oldest.channel
+
+    def stream_buffer_bytes(self):
+        """分块解码播放的缓冲区上限，至少能容纳两块"""
+        frequency, size, channels = pygame.mixer.get_init()
+        chunk_bytes = int(audio_stream.STREAM_CHUNK_SECONDS * frequency) * channels * abs(size) // 8
+        return max(get_config_value('stream_buffer_kb', DEFAULT_STREAM_BUFFER_KB) * 1024, 2 * chunk_bytes)
+
+    def record_stream(self, stream):
+        """分块解码播放结束时累计统计信息"""
+        with self.voices_lock:
+            self.stream_stats['streams'] += 1
+            self.stream_stats['underruns'] += stream.underruns
+            self.stream_stats['peak_buffer_bytes'] = max(self.stream_stats['peak_buffer_bytes'], stream.peak_bytes)
+        if stream.underruns:
+            logger.warning(f"分块解码播放出现 {stream.underruns} 次缓冲欠载: {os.path.basename(stream.path)}")
+
+    def play(self, music_file, volume=None, duck=False, trim=1.0, streaming=False, playlist=None, queue_info=None):
+        """播放音乐文件，设备异常时重新打开设备并重试一次
+
+        正在播放的声音交叉淡出；duck 为 True 时改为压低音量，本次播放结束后恢复。
+        trim 为响度校正系数：缓存和分块解码的声音已按该系数缩放样本，声道音量只包含音量和渐变；
+        交给 pygame.mixer.music 播放的文件无法处理样本，仍与音量相乘，最大为1（只能衰减）。
+        streaming 为 True 时不使用解码缓存，始终分块解码播放。
+        playlist 为文件路径列表时（第一首为 music_file）在同一声道上分块解码、无缝连续播放，
+        切换曲目时按新曲目更新响度校正；queue_info 随队列状态返回。
+        """
+        settings = self.fade_settings()
+        base = 1.0 if volume is None else volume / 100.0
+        with self.lock:
+            for attempt in range(2):
+                if attempt and not self.reopen():
+                    return False
+                if not self.open():
+                    continue
+                
+                started = time.perf_counter()
+                # 优先从解码缓存播放，未命中时分块解码播放，不支持分块解码的格式交给 pygame 流式播放
+                sound = None if streaming or playlist else audio_cache.get(music_file, trim)
+                stream = None
+                if playlist:
+                    try:
+                        stream = ChunkStream(playlist, self.stream_buffer_bytes(), queue_info)
+                    except Exception as e:
+                        self.last_error = f"播放列表中没有可以播放的文件: {str(e)}"
+                        logger.error(self.last_error)
+                        return False
+                    # 前面的曲目无法解码时从第一首能解码的曲目开始
+                    first = stream.paths[stream.buffer[0][2]]
+                    if first != music_file:
+                        music_file = first
+                        trim = get_track_gain(first)
+                elif sound is None:
+                    try:
+                        stream = ChunkStream(music_file, self.stream_buffer_bytes())
+                    except Exception as e:
+                        logger.info(f"无法分块解码，改用 pygame 流式播放: {os.path.basename(music_file)} - {str(e)}")
+                try:
+                    with self.voices_lock:
+                        now = time.perf_counter()
+                        current = [voice for voice in self.voices if not voice.stopping]
+                        if sound is None and stream is None:
+                            # 流式播放只有一路，加载新文件前必须停止正在流式播放的声音
+                            for voice in [voice for voice in self.voices if voice.channel is None]:
+                                voice.stop()
+                                self.voices.remove(voice)
+                            current = [voice for voice in current if voice.channel is not None]
+                        
+                        if duck and current:
+                            for voice in current:
+                                voice.ramp(voice.duck, now, settings['duck'], settings['duck_volume'])
+                            fade_in = settings['fade_in']
+                        elif current and settings['crossfade'] > 0:
+                            for voice in current:
+                                voice.fade_out(now, settings['crossfade'])
+                            fade_in = settings['crossfade']
+                        else:
+                            for voice in current:
+                                voice.stop()
+                                self.voices.remove(voice)
+                            fade_in = settings['fade_in']
+                        
+                        channel = self._take_channel() if sound is not None or stream is not None else None
+                        voice = PlaybackVoice(music_file, channel, base, 1.0 if channel is not None else trim,
+                                              fade_in, now, stream)
+                        voice.ducking = bool(duck and current)
+                        voice.apply(min(base * voice.trim * voice.fade[2], 1.0))
+                        if stream is not None:
+                            stream.start(channel, self._track_changed if playlist else None)
+                        elif channel is not None:
+                            channel.play(sound)
+                        else:
+                            try:
+                                pygame.mixer.music.load(music_file)
+                            except pygame.error as e:
+                                # 文件无法解码，重开设备也无济于事
+                                self.last_error = str(e)
+                                logger.error(f"加载音乐失败: {str(e)}")
+                                return False
+                            pygame.mixer.music.play()
+                        self.voices.append(voice)
+                        self.last_source = voice.source
+                    self.gain_wakeup.set()
+                except pygame.error as e:
+                    self.last_error = str(e)
+                    logger.error(f"播放音乐失败: {str(e)}")
+                    if stream is not None:
+                        stream.close()
+                    continue
+                
+                latency = self._wait_started(started, voice)
+                if latency is None:
+                    self.last_error = "播放未能开始"
+                    logger.error("播放失败：pygame未能开始播放")
+                    continue
+                
+                self.last_start_latency_ms = round(latency, 1)
+                source_name = {'cache': '缓存', 'stream': '分块解码', 'music': '磁盘'}[self.last_source]
+                logger.info(f"音乐开始播放（{source_name}），启动延迟 {self.last_start_latency_ms}ms")
+                return True
+            return False
+
+    def _track_changed(self, stream, index):
+        """播放列表进入新曲目，通知队列状态变化（各曲目的响度校正已在解码时处理）"""
+        path = stream.paths[index]
+        trim = get_track_gain(path)
+        with self.voices_lock:
+            for voice in self.voices:
+                if voice.stream is stream:
+                    voice.music_file = path
+        if index:
+            logger.info(f"播放列表第 {index + 1}/{len(stream.paths)} 首: {os.path.basename(path)}"
+                        + (f"（响度校正 {20 * np.log10(trim):+.1f}dB）" if trim != 1.0 else ''))
+        notify_state_changed()
+
+    def playlist_voice(self):
+        """最近开始播放、未在淡出的播放列表，没有时返回None"""
+        with self.voices_lock:
+            for voice in reversed(self.voices):
+                # 只有播放列表设置了 on_track
+                if voice.stream is not None and voice.stream.on_track is not None and not voice.stopping:
+                    return voice
+        return None
+
+    def next_track(self):
+        """播放列表跳到下一首，返回是否有正在播放的播放列表"""
+        voice = self.playlist_voice()
+        if voice is None or not voice.stream.skip():
+            return False
+        logger.info(f"播放列表跳过: {os.path.basename(voice.music_file)}")
+        return True
+
+    def queue_status(self):
+        """正在播放的播放列表的状态，没有时返回None"""
+        voice = self.playlist_voice()
+        return voice.stream.queue_status() if voice is not None else None
+
+    def stop(self, fade_out=None):
+        """停止播放，保持设备打开；fade_out 为淡出时间（秒），None 时使用配置"""
+        if fade_out is None:
+            fade_out = self.fade_settings()['fade_out']
+        with self.lock:
+            if not pygame.mixer.get_init():
+                return
+            with self.voices_lock:
+                if fade_out > 0 and self.voices:
+                    now = time.perf_counter()
+                    for voice in self.voices:
+                        if not voice.stopping or voice.fade[1] > now + fade_out:
+                            voice.fade_out(now, fade_out)
+                else:
+                    for voice in self.voices:
+                        voice.stop()
+                    self.voices = []
+                    pygame.mixer.music.stop()
+                    for channel in self.channels:
+                        channel.stop()
+            self.gain_wakeup.set()
+
+    def set_volume(self, volume):
+        """调整正在播放的音量（0-100）"""
+        with self.voices_lock:
+            for voice in self.voices:
+                voice.base = volume / 100.0
+        self.gain_wakeup.set()
+
+    def _update_gains(self):
+        """计算并设置所有声音当前的增益，返回下次更新前的等待时间，None 表示无需更新"""
+        with self.voices_lock:
+            now = time.perf_counter()
+            # 清理已自然结束的声音，叠加播放结束后恢复其他声音的音量
+            finished = [voice for voice in self.voices
+                        if now - voice.started_at > AUDIO_START_TIMEOUT and not voice.busy()]
+            for voice in finished:
+                self.voices.remove(voice)
+            if any(voice.ducking for voice in finished) and not any(voice.ducking for voice in self.voices):
+                duck_time = self.fade_settings()['duck']
+                for voice in self.voices:
+                    voice.ramp(voice.duck, now, duck_time, 1.0)
+            if not self.voices:
+                return None
+            
+            ramps = np.array([voice.fade + voice.duck for voice in self.voices])
+            levels = np.array([voice.base * voice.trim for voice in self.voices])
+            gains = np.minimum(levels, 1.0) * gain_ramps(ramps[:, :4], now) * gain_ramps(ramps[:, 4:], now)
+            for voice, gain in zip(list(self.voices), gains.tolist()):
+                if voice.stopping and now >= voice.fade[1]:
+                    voice.stop()
+                    self.voices.remove(voice)
+                elif gain != voice.gain:
+                    voice.apply(gain)
             
-        # 设置音量
-        if current_volume is not None:
+            if (ramps[:, [1, 5]] > now).any():
+                frequency, _, _ = pygame.mixer.get_init()
+                return self.params['buffer'] / frequency
+            if any(voice.ducking for voice in self.voices):
+                return GAIN_WATCH_INTERVAL
+            return None
+
+    def _gain_loop(self):
+        """增益线程：有渐变时按混音缓冲周期更新增益，否则休眠到下一次播放、停止或调整音量"""
+        while True:
+            self.gain_wakeup.clear()
             try:
-                pygame.mixer.music.set_volume(current_volume / 100.0)
-                logger.info(f"音量设置为: {current_volume}%")
+                interval = self._update_gains() if pygame.mixer.get_init() else None
             except Exception as e:
-                logger.error(f"设置音量失败: {str(e)}")
+                logger.error(f"更新播放音量失败: {str(e)}")
+                interval = None
+            if interval is None:
+                self.gain_wakeup.wait()
+            else:
+                self.gain_wakeup.wait(interval)
+
+    def status(self):
+        """返回设备状态和最近一次的启动延迟"""
+        with self.lock:
+            initialized = pygame.mixer.get_init()
+            with self.voices_lock:
+                voices = [{
+                    'music_file': os.path.basename(voice.music_file),
+                    'source': voice.source,
+                    'gain': None if voice.gain is None else round(voice.gain, 3),
+                    'stopping': voice.stopping,
+                    'ducking': voice.ducking,
+                    'buffered_bytes': voice.stream.buffered_bytes if voice.stream else None,
+                    'underruns': voice.stream.underruns if voice.stream else None
+                } for voice in self.voices]
+                stream_stats = dict(self.stream_stats)
+            return {
+                'initialized': bool(initialized),
+                'config': list(initialized) if initialized else None,
+                'opened_at': self.opened_at.strftime('%Y-%m-%d %H:%M:%S') if self.opened_at else None,
+                'reopen_count': self.reopen_count,
+                'busy': self.is_busy(),
+                'voices': voices,
+                'stream': stream_stats,
+                'last_source': self.last_source,
+                'last_start_latency_ms': self.last_start_latency_ms,
+                'last_error': self.last_error,
+                'cache': audio_cache.status()
+            }
+
+audio_output = AudioOutput()
+
+def preload_scheduled_audio():
+    """后台预解码时间表中引用的所有音乐文件"""
+    while True:
+        audio_preload_wakeup.wait()
+        audio_preload_wakeup.clear()
+        try:
+            if not audio_output.open():
+                continue
+            audio_cache.set_budget(int(get_config_value('audio_cache_mb', DEFAULT_AUDIO_CACHE_MB) * 1024 * 1024))
+            # 分块解码播放的任务不预解码
+            music_files = sorted({task['music_file'] for task in load_schedule()
+                                  if task.get('enabled', True) and not task.get('streaming')})
+            for music_file in music_files:
+                if audio_preload_wakeup.is_set():
+                    break  # 时间表又变化了，重新开始
+                path = os.path.join(MUSIC_DIR, music_file)
+                if os.path.exists(path):
+                    audio_cache.load(path, get_track_gain(path))
+        except Exception as e:
+            logger.error(f"预解码音频失败: {str(e)}")
+
+def get_preflight_minutes():
+    """获取提前预检的时间（分钟）"""
+    return max(0, get_config_value('preflight_minutes', DEFAULT_PREFLIGHT_MINUTES))
+
+def preflight_check(fire_at, task):
+    """检查即将触发的任务：文件存在、可以解码并已放入缓存、音频设备已打开"""
+    music_file = task['music_file']
+    path = os.path.join(MUSIC_DIR, music_file)
+    result = {
+        'task_id': task['id'],
+        'task_time': format_task_time(task['time']),
+        'music_file': music_file,
+        'fire_at': fire_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'checked_at': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'status': 'ready',
+        'source': None,
+        'error': None
+    }
+    try:
+        if not os.path.exists(path):
+            raise RuntimeError('音乐文件不存在')
+        # 播放列表只预解码第一首，其余曲目在播放前一首时解码
+        missing = [name for name in task.get('playlist') or [] if not os.path.exists(os.path.join(MUSIC_DIR, name))]
+        if missing:
+            raise RuntimeError(f"播放列表中的音乐文件不存在: {'、'.join(missing)}")
+        if not audio_output.open():
+            raise RuntimeError(f"音频设备无法打开: {audio_output.last_error}")
+        try:
+            if task.get('streaming'):
+                check_stream_decodable(path)
+                sound = None
+            else:
+                sound = audio_cache.load(path, get_track_gain(path), raise_errors=True)
+        except Exception as e:
+            raise RuntimeError(f"音乐文件无法解码: {str(e)}")
+        # 超出缓存预算或指定分块解码的文件已确认可以解码，触发时分块解码播放
+        result['source'] = 'cache' if sound is not None else 'stream'
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = str(e)
+    return result
+
+def preflight_scheduled_tasks():
+    """预检线程：在每次触发前若干分钟检查文件、预解码并打开音频设备
+
+    预检通过后触发时直接从内存播放：预检窗口内的文件在缓存中固定到触发之后，
+    每次检查时确认仍在缓存中（文件被修改时重新预检）。预检失败会记录日志并通过
+    /api/preflight 和事件流报告，之后每分钟重试直到触发。
+    """
+    while True:
+        preflight_wakeup.clear()
+        timeout = PREFLIGHT_MAX_SLEEP
+        try:
+            window = datetime.timedelta(minutes=get_preflight_minutes())
+            now = datetime.datetime.now()
+            firings = get_next_firings(PREFLIGHT_LOOKAHEAD, now)
+            due = [(fire_at, task) for fire_at, task in firings if fire_at - window <= now]
+            if len(due) < len(firings):
+                # 还未进入预检窗口，休眠到窗口开始
+                timeout = min(timeout, (firings[len(due)][0] - window - now).total_seconds())
+            if due:
+                # 触发之后醒来，解除对应文件的固定
+                timeout = min(timeout, (due[0][0] - now).total_seconds() + 1)
+            audio_cache.pin(os.path.join(MUSIC_DIR, task['music_file'])
+                            for _, task in due if not task.get('streaming'))
+            upcoming = set()
+            for fire_at, task in due:
+                key = (fire_at, task['id'])
+                upcoming.add(key)
+                path = os.path.join(MUSIC_DIR, task['music_file'])
+                with preflight_lock:
+                    previous = preflight_results.get(key)
+                if previous is not None and previous['status'] == 'ready' \
+                        and previous['music_file'] == task['music_file'] \
+                        and (previous['source'] != 'cache'
+                             or audio_cache.contains(path, get_track_gain(path))):
+                    continue
+                
+                result = preflight_check(fire_at, task)
+                with preflight_lock:
+                    preflight_results[key] = result
+                if previous is not None and previous['error'] == result['error']:
+                    continue  # 重试仍然失败且原因相同，不重复记录
+                if result['status'] == 'ready':
+                    logger.info(f"预检通过: {result['task_time']} {task['music_file']}（{result['source']}）")
+                else:
+                    logger.error(f"预检失败: {result['task_time']} {task['music_file']} - {result['error']}")
+                event_bus.publish('preflight', result)
             
-        # 加载并播放音乐
-        logger.info(f"开始播放音乐: {music_file}")
+            # 已触发或已从时间表删除的任务不再保留
+            with preflight_lock:
+                for key in [key for key in preflight_results if key not in upcoming]:
+                    del preflight_results[key]
+        except Exception as e:
+            logger.error(f"任务预检失败: {str(e)}")
+        preflight_wakeup.wait(max(timeout, 0.1))
+
+def get_preflight_status():
+    """获取预检窗口内各任务的预检结果"""
+    with preflight_lock:
+        results = [preflight_results[key] for key in sorted(preflight_results)]
+    return {'minutes': get_preflight_minutes(), 'results': [dict(result) for result in results]}
+
+@app.route('/api/preflight', methods=['GET'])
+@login_required
+def preflight_status():
+    """获取即将触发的任务的预检结果"""
+    try:
+        if service_role == 'follower':
+            return jsonify(leader_request('preflight'))
+        return jsonify(get_preflight_status())
+    except Exception as e:
+        logger.error(f"获取预检结果失败: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/audio-status', methods=['GET'])
+@login_required
+def audio_status():
+    """获取音频设备状态的API"""
+    try:
+        if service_role == 'follower':
+            return jsonify(leader_request('audio_status'))
+        return jsonify(audio_output.status())
+    except Exception as e:
+        logger.error(f"获取音频状态失败: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def submit_playback(action, music_file=None, source='api', task_time=None, fired_at=None,
+                    task_id=None, volume=None, duck=False, streaming=False, playlist=None, shuffle=False):
+    """提交播放命令到音频工作线程，立即返回任务ID
+
+    action 为 play、stop 或 next（播放列表跳到下一首）；
+    定时任务触发的命令带有 task_time、task_id 和 fired_at，执行结果会写入执行记录；
+    volume 为本次播放的音量（0-100），None 时使用全局音量；
+    duck 为 True 时正在播放的音乐压低音量继续播放，而不是被替换；
+    streaming 为 True 时分块解码播放，不使用解码缓存；
+    playlist 为音乐文件名的列表时依次无缝播放，shuffle 为 True 时打乱顺序。
+    """
+    if service_role == 'follower':
+        return leader_request('submit', action=action, music_file=music_file, source=source,
+                              task_time=task_time, fired_at=fired_at, task_id=task_id, volume=volume,
+                              duck=duck, streaming=streaming, playlist=playlist, shuffle=shuffle)
+    ensure_playback_worker()
+    job_id = uuid.uuid4().hex[:12]
+    job = {
+        'id': job_id,
+        'action': action,
+        'music_file': music_file,
+        'source': source,
+        'status': 'queued',
+        'submitted_at': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'finished_at': None,
+        'error': None,
+        'task_time': task_time,
+        'task_id': task_id,
+        'volume': volume,
+        'duck': duck,
+        'streaming': streaming,
+        'playlist': playlist,
+        'shuffle': shuffle,
+        'fired_at': fired_at.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3] if fired_at else None
+    }
+    with playback_jobs_lock:
+        playback_jobs[job_id] = job
+        playback_job_events[job_id] = threading.Event()
+        # 只保留最近的任务记录
+        while len(playback_jobs) > MAX_PLAYBACK_JOBS:
+            old_id, _ = playback_jobs.popitem(last=False)
+            playback_job_events.pop(old_id, None)
+    playback_queue.put(job_id)
+    return job_id
+
+def get_playback_job(job_id):
+    """获取播放任务状态的副本，不存在时返回None"""
+    if service_role == 'follower':
+        return leader_request('job', job_id)
+    with playback_jobs_lock:
+        job = playback_jobs.get(job_id)
+        return dict(job) if job else None
+
+def wait_playback_job(job_id, timeout=None):
+    """等待播放任务完成，返回任务状态"""
+    if service_role == 'follower':
+        return leader_request('wait', job_id, timeout, timeout=None if timeout is None else timeout + LEADER_REQUEST_TIMEOUT)
+    with playback_jobs_lock:
+        event = playback_job_events.get(job_id)
+    if event:
+        event.wait(timeout)
+    return get_playback_job(job_id)
+
+def _finish_playback_job(job_id, status, error=None):
+    with playback_jobs_lock:
+        job = playback_jobs.get(job_id)
+        if job:
+            job['status'] = status
+            job['error'] = error
+            job['finished_at'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        event = playback_job_events.get(job_id)
+    if event:
+        event.set()
+    if job and job['task_time']:
+        latency = audio_output.last_start_latency_ms if status == 'done' else None
+        record_execution(job['task_time'], job['music_file'],
+                         datetime.datetime.strptime(job['fired_at'], '%Y-%m-%d %H:%M:%S.%f'),
+                         status, latency, task_id=job['task_id'])
+    if job:
+        event_bus.publish('playback_job', dict(job))
+    notify_state_changed()
+
+def playback_worker():
+    """音频工作线程：按顺序执行播放命令，积压的手动播放、停止命令只执行最新的一条"""
+    while True:
+        job_id = playback_queue.get()
         try:
-            pygame.mixer.music.load(music_file)
-            pygame.mixer.music.play()
-        except pygame.error as e:
-            logger.error(f"加载或播放音乐失败: {str(e)}")
+            with playback_jobs_lock:
+                job = playback_jobs.get(job_id)
+                if job is None:
+                    continue
+                job = dict(job)
+                playback_jobs[job_id]['status'] = 'running'
+            
+            # 手动的播放、停止命令后面还有更新的命令时已无意义；定时任务和叠加播放总是执行
+            if job['source'] != 'schedule' and job['action'] in ('play', 'stop') and not job['duck'] \
+                    and not playback_queue.empty():
+                _finish_playback_job(job_id, 'superseded')
+                continue
+            
+            if job['action'] == 'play':
+                if job['playlist']:
+                    # 播放列表跳过不存在的文件，随机播放时每次重新打乱
+                    playlist = [os.path.join(MUSIC_DIR, name) for name in job['playlist']]
+                    for path in playlist:
+                        if not os.path.exists(path):
+                            logger.warning(f"播放列表中的音乐文件不存在，已跳过: {path}")
+                    playlist = [path for path in playlist if os.path.exists(path)]
+                    if job['shuffle']:
+                        random.shuffle(playlist)
+                    music_path = playlist[0] if playlist else None
+                else:
+                    playlist = None
+                    music_path = os.path.join(MUSIC_DIR, job['music_file'])
+                    if not os.path.exists(music_path):
+                        music_path = None
+                if music_path is None:
+                    logger.error(f"音乐文件不存在: {job['music_file']}")
+                    _finish_playback_job(job_id, 'failed', '音乐文件不存在')
+                    continue
+                ok = play_music(music_path, job['volume'], job['duck'], job['streaming'], playlist,
+                                {'task_id': job['task_id'], 'shuffle': job['shuffle']})
+            elif job['action'] == 'next':
+                ok = audio_output.next_track()
+                if not ok:
+                    _finish_playback_job(job_id, 'failed', '没有正在播放的播放列表')
+                    continue
+            else:
+                ok = stop_music()
+            
+            if ok:
+                _finish_playback_job(job_id, 'done')
+            else:
+                _finish_playback_job(job_id, 'failed', audio_output.last_error or '播放失败')
+        except Exception as e:
+            logger.error(f"执行播放命令失败: {str(e)}")
+            _finish_playback_job(job_id, 'failed', str(e))
+        finally:
+            playback_queue.task_done()
+
+def ensure_playback_worker():
+    """确保音频工作线程正在运行"""
+    global playback_thread
+    with playback_jobs_lock:
+        if playback_thread is None or not playback_thread.is_alive():
+            playback_thread = threading.Thread(target=playback_worker, daemon=True)
+            playback_thread.start()
+
+def play_music(music_file, volume=None, duck=False, streaming=False, playlist=None, queue_info=None):
+    """播放音乐，volume 为本次播放的音量（0-100），None 时使用全局音量
+
+    正在播放的音乐按配置交叉淡出；duck 为 True 时改为压低音量，新音乐结束后恢复；
+    streaming 为 True 时分块解码播放；playlist 为文件路径列表时从 music_file 开始依次无缝播放，
+    queue_info 为随队列状态返回的附加信息。
+    """
+    try:
+        # 检查文件是否存在
+        if not os.path.exists(music_file):
+            logger.error(f"音乐文件不存在: {music_file}")
             return False
+            
+        # 确保音量已设置
+        if current_volume is None:
+            load_volume()
         
-        # 等待一小段时间确保播放开始
-        time.sleep(0.5)
-        
-        if pygame.mixer.music.get_busy():
-            logger.info("音乐开始播放")
-            return True
-        else:
-            logger.error("播放失败：pygame未能开始播放")
-            return False
+        trim = get_track_gain(music_file)
+        logger.info(f"开始播放{f'列表（共 {len(playlist)} 首）' if playlist else '音乐'}: {music_file}"
+                    + (f"（响度校正 {20 * np.log10(trim):+.1f}dB）" if trim != 1.0 else ''))
+        return audio_output.play(music_file, current_volume if volume is None else volume, duck, trim, streaming,
+                                 playlist, queue_info)
             
     except Exception as e:
         logger.error(f"播放音乐时发生错误: {str(e)}")
@@ -1073,88 +3666,594 @@ def play_music(music_file):
         return False
 
 def stop_music():
-    """停止播放"""
+    """停止播放（按配置淡出）"""
     try:
-        # 停止pygame音乐播放
-        if pygame.mixer.get_init():
-            pygame.mixer.music.stop()
+        audio_output.stop()
         logger.info("音乐播放已停止")
         return True
     except Exception as e:
         logger.error(f"停止播放时发生错误: {str(e)}")
         return False
 
-def workday(date):
-    """判断今天是否为工作日"""
-    weekday = date.isoweekday()  # 今天是星期几
+def _compute_workday(date, week_schedule):
+    """按节假日数据和大小周设置计算某一天是否为工作日"""
+    weekday = date.isoweekday()  # 星期几
     week_of_year = date.isocalendar()[1]
-    print('这周是第', week_of_year, "周")
-    
-    week_schedule = get_week_schedule()
     is_odd_week = week_of_year % 2 == 1
     
     if chinese_calendar.is_workday(date):
-        print("今天是", date, "为工作日", single_or_weekend()[0])
         return True
     elif week_schedule["saturday_work"] and not chinese_calendar.is_in_lieu(date) and weekday == 6:
+        # 单休周的周六上班，法定节假日除外
         if (is_odd_week and not week_schedule["odd_week_rest"]) or \
            (not is_odd_week and not week_schedule["even_week_rest"]):
-            if date not in chinese_calendar.holidays.keys():
-                print("这周单休，今天是周六，要上班哦")
+            if date not in chinese_calendar.holidays:
                 return True
-    
-    print("今天是", date, single_or_weekend()[0], "今天放假哦！")
     return False
 
-def single_or_weekend():
-    """判断今天是单休还是双休"""
-    weeks = int(datetime.datetime.now().strftime("%W"))  # 获取当前日期为今年的周数
-    week_schedule = get_week_schedule()
+def build_workday_calendar(week_schedule):
+    """预计算节假日数据覆盖年份内每一天的工作日标记"""
+    years = [day.year for day in chinese_calendar.holidays]
+    start = datetime.date(min(years), 1, 1)
+    end = datetime.date(max(years), 12, 31)
+    base = start.toordinal()
+    bitmap = bytearray(end.toordinal() - base + 1)
+    
+    # 范围已确定，直接查节假日数据表，避免 chinese_calendar 每次调用都重新校验年份范围
+    statutory_workdays = chinese_calendar.workdays
+    statutory_holidays = chinese_calendar.holidays
+    in_lieu_days = chinese_calendar.in_lieu_days
+    day = start
+    for index in range(len(bitmap)):
+        weekday = day.isoweekday()
+        if day in statutory_workdays or (weekday <= 5 and day not in statutory_holidays):
+            bitmap[index] = 1
+        elif week_schedule["saturday_work"] and weekday == 6 and day not in in_lieu_days \
+                and day not in statutory_holidays:
+            # 单休周的周六上班
+            is_odd_week = day.isocalendar()[1] % 2 == 1
+            if (is_odd_week and not week_schedule["odd_week_rest"]) or \
+               (not is_odd_week and not week_schedule["even_week_rest"]):
+                bitmap[index] = 1
+        day += datetime.timedelta(days=1)
+    
+    logger.info(f"工作日日历已生成: {start} - {end}, 周设置 {week_schedule}")
+    return {
+        'key': tuple(sorted(week_schedule.items())),
+        'week_schedule': dict(week_schedule),
+        'base': base,
+        'bitmap': bitmap,
+        # 按顺序排列的工作日序号，用于二分查找下一个工作日
+        'ordinals': array('l', (base + index for index, flag in enumerate(bitmap) if flag))
+    }
+
+def get_workday_calendar():
+    """获取当前周设置对应的工作日日历，周设置变化后才重新生成"""
+    global workday_calendar, workday_calendar_checked_at
+    # 其他进程可能修改了配置文件，最多每秒检查一次修改时间
+    now = time.monotonic()
+    if workday_calendar is not None and now - workday_calendar_checked_at >= CONFIG_CHECK_INTERVAL:
+        workday_calendar_checked_at = now
+        if config_store.snapshot()[0] != workday_calendar['config_version']:
+            workday_calendar_dirty.set()
+    
+    calendar = workday_calendar
+    if calendar is not None and not workday_calendar_dirty.is_set():
+        return calendar
     
-    if weeks % 2:  # 奇数周
-        rs = "本周为双休" if week_schedule["odd_week_rest"] else "本周为单休", \
-             'weekend' if week_schedule["odd_week_rest"] else 'single'
-    else:  # 偶数周
-        rs = "本周为双休" if week_schedule["even_week_rest"] else "本周为单休", \
-             'weekend' if week_schedule["even_week_rest"] else 'single'
-    return rs
-
-def generate_password(password):
+    with workday_calendar_lock:
+        if workday_calendar is None or workday_calendar_dirty.is_set():
+            workday_calendar_dirty.clear()
+            config_version, config = config_store.snapshot()
+            week_schedule = dict(DEFAULT_WEEK_SCHEDULE, **config.get('week_schedule', {}))
+            key = tuple(sorted(week_schedule.items()))
+            if workday_calendar is None or workday_calendar['key'] != key:
+                workday_calendar = build_workday_calendar(week_schedule)
+            workday_calendar['config_version'] = config_version
+        return workday_calendar
+
+def invalidate_workday_calendar():
+    """配置保存后标记工作日日历需要检查周设置是否变化"""
+    workday_calendar_dirty.set()
+
+def workday(date):
+    """判断指定日期是否为工作日
+
+    在预计算的日历表中查找，超出节假日数据范围的日期按规则即时计算。
+    """
+    calendar = get_workday_calendar()
+    index = date.toordinal() - calendar['base']
+    if 0 <= index < len(calendar['bitmap']):
+        return bool(calendar['bitmap'][index])
+    return _compute_workday(date, calendar['week_schedule'])
+
+def next_workday(date):
+    """返回 date 当天或之后的第一个工作日，超出节假日数据范围时返回None"""
+    calendar = get_workday_calendar()
+    ordinals = calendar['ordinals']
+    index = bisect.bisect_left(ordinals, date.toordinal())
+    if index < len(ordinals):
+        return datetime.date.fromordinal(ordinals[index])
+    
+    # 超出日历表范围时逐日计算
+    try:
+        for offset in range(MAX_WORKDAY_SEARCH_DAYS):
+            day = date + datetime.timedelta(days=offset)
+            if _compute_workday(day, calendar['week_schedule']):
+                return day
+    except NotImplementedError:
+        pass
+    return None
+
+def get_password_hash_method():
+    """获取配置的密码哈希方法，格式与 werkzeug 相同，如 pbkdf2:sha256:260000"""
+    return get_config_value('password_hash_method', DEFAULT_PASSWORD_HASH_METHOD)
+
+def get_password_pool():
+    """获取密码哈希线程池
+
+    哈希计算很耗 CPU，放到固定数量的线程中执行，并限制排队数量，
+    大量登录请求不会占满 CPU 影响定时任务和播放。
+    """
+    global password_pool, password_pool_slots
+    with password_pool_lock:
+        if password_pool is None:
+            workers = max(1, int(get_config_value('password_hash_workers', DEFAULT_PASSWORD_HASH_WORKERS)))
+            password_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password')
+            password_pool_slots = threading.BoundedSemaphore(workers * 4)
+        return password_pool, password_pool_slots
+
+def run_password_task(func, *args):
+    """在密码哈希线程池中执行并等待结果，排队已满时抛出 RuntimeError"""
+    pool, slots = get_password_pool()
+    if not slots.acquire(timeout=PASSWORD_HASH_TIMEOUT):
+        raise RuntimeError('密码验证请求过多，请稍后重试')
+    try:
+        return pool.submit(func, *args).result(timeout=PASSWORD_HASH_TIMEOUT)
+    finally:
+        slots.release()
+
+def generate_password(password, method=None):
     """生成密码哈希"""
-    return generate_password_hash(password)
+    return run_password_task(generate_password_hash, password, method or get_password_hash_method())
 
 def verify_password(hash, password):
     """验证密码"""
-    return check_password_hash(hash, password)
+    return run_password_task(check_password_hash, hash, password)
+
+def password_needs_rehash(stored_hash, method):
+    """判断已存哈希的算法或参数是否与配置不同"""
+    prefix = password_hash_prefixes.get(method)
+    if prefix is None:
+        # werkzeug 会补全默认参数（如迭代次数），用一次实际生成的哈希确定前缀
+        prefix = generate_password('', method).split('$', 1)[0]
+        password_hash_prefixes[method] = prefix
+    return stored_hash.split('$', 1)[0] != prefix
+
+def rehash_password_if_needed(username, password, stored_hash):
+    """登录成功后按当前配置重新计算密码哈希，配置变化对用户透明"""
+    try:
+        method = get_password_hash_method()
+        if not password_needs_rehash(stored_hash, method):
+            return
+        users = load_users()
+        if username not in users or users[username]['password'] != stored_hash:
+            return
+        users[username]['password'] = generate_password(password, method)
+        if save_users(users):
+            app.logger.info(f"用户 {username} 的密码哈希已更新为 {method}")
+    except Exception as e:
+        app.logger.error(f"更新密码哈希失败: {str(e)}")
 
 def save_users(users):
     """保存用户信息"""
     try:
-        users_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'users.json')
-        with open(users_file, 'w', encoding='utf-8') as f:
+        # 先写临时文件再替换，读取方不会看到写了一半的文件
+        temp_file = USERS_FILE + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
             json.dump(users, f, indent=4, ensure_ascii=False)
+        
+        # 替换原文件并同步更新缓存
+        with users_cache_lock:
+            os.replace(temp_file, USERS_FILE)
+            users_cache['data'] = {username: dict(record) for username, record in users.items()}
+            users_cache['mtime'] = _users_file_mtime()
         return True
     except Exception as e:
         app.logger.error(f"保存用户信息失败: {str(e)}")
         return False
 
+def get_config_version():
+    """配置的版本号，其他进程保存配置后最多一秒内可见"""
+    return get_workday_calendar()['config_version']
+
+def get_daily_response(name, compute):
+    """获取按天变化的接口内容
+
+    内容只在日期或配置变化后由 compute(today) 重新计算一次，
+    返回包含 data、body、etag、last_modified 的缓存项。
+    """
+    today = datetime.datetime.now().date()
+    key = (today, get_config_version())
+    entry = daily_responses.get(name)
+    if entry is not None and entry['key'] == key:
+        return entry
+    
+    with daily_responses_lock:
+        entry = daily_responses.get(name)
+        if entry is not None and entry['key'] == key:
+            return entry
+        data = compute(today)
+        body = json.dumps(data, ensure_ascii=False)
+        etag = hashlib.sha1(body.encode('utf-8')).hexdigest()[:16]
+        # 内容未变时保留原来的修改时间，浏览器的缓存仍然有效
+        if entry is not None and entry['etag'] == etag:
+            last_modified = entry['last_modified']
+        else:
+            last_modified = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        entry = {'key': key, 'data': data, 'body': body, 'etag': etag, 'last_modified': last_modified}
+        daily_responses[name] = entry
+        return entry
+
+def daily_json_response(name, compute):
+    """返回带 ETag/Last-Modified 的 JSON 响应，浏览器重新验证时内容未变则返回304"""
+    entry = get_daily_response(name, compute)
+    response = Response(entry['body'], mimetype='application/json')
+    response.set_etag(entry['etag'])
+    response.last_modified = entry['last_modified']
+    # 允许浏览器缓存，但每次使用前都要重新验证
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def invalidate_daily_responses():
+    """周设置修改后清除按天缓存的接口内容"""
+    with daily_responses_lock:
+        daily_responses.clear()
+
+def compute_holiday_info(today):
+    """计算指定日期的法定节假日信息"""
+    return {
+        'is_holiday': chinese_calendar.is_holiday(today),
+        'is_in_lieu': chinese_calendar.is_in_lieu(today),
+        'is_workday': chinese_calendar.is_workday(today)
+    }
+
 @app.route('/api/holiday-info', methods=['GET'])
 def get_holiday_info():
     """获取当前日期的节假日信息"""
-    today = datetime.datetime.now().date()
+    try:
+        return daily_json_response('holiday_info', compute_holiday_info)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def compute_live_state():
+    """计算推送给页面的各项状态"""
+    try:
+        holiday_info = get_daily_response('holiday_info', compute_holiday_info)['data']
+    except Exception as e:
+        holiday_info = {'error': str(e)}
+    return {
+        'calendar': {
+            'holiday_info': holiday_info,
+            'week_schedule': get_week_schedule(),
+            'work_status': get_current_work_status()
+        },
+        'next_task': get_next_task(),
+        'task_overview': get_task_overview(),
+        'playback': get_playback_state()
+    }
+
+def get_playback_state():
+    """播放状态：主进程直接读取音频设备，其他进程使用主进程推送的状态"""
+    if service_role == 'follower':
+        return dict(leader_playback_state)
+    return {'busy': audio_output.is_busy(), 'queue': audio_output.queue_status()}
+
+def get_live_state():
+    """获取最近一次计算的状态，尚未计算时立即计算"""
+    with live_state_lock:
+        if not live_state:
+            live_state.update(compute_live_state())
+        return dict(live_state)
+
+def notify_state_changed():
+    """通知状态监视线程立即重新计算状态"""
+    state_monitor_wakeup.set()
+
+def state_monitor():
+    """状态监视线程：有页面订阅时定期计算状态，只推送发生变化的部分
+
+    播放状态每秒检查一次，任务和日历状态每分钟或在时间表、配置变化时重新计算，
+    计算量与打开的页面数量无关。
+    """
+    last_minute = None
+    while True:
+        # 没有页面订阅时一直休眠，直到有新的订阅或状态变化
+        timeout = STATE_MONITOR_INTERVAL if event_bus.has_subscribers() else None
+        woken = state_monitor_wakeup.wait(timeout=timeout)
+        state_monitor_wakeup.clear()
+        if not event_bus.has_subscribers():
+            last_minute = None
+            continue
+        try:
+            minute = datetime.datetime.now().strftime('%Y-%m-%d %H:%M')
+            if woken or minute != last_minute:
+                last_minute = minute
+                state = compute_live_state()
+            else:
+                state = {'playback': get_playback_state()}
+            
+            changed = {}
+            with live_state_lock:
+                for event, data in state.items():
+                    if live_state.get(event) != data:
+                        live_state[event] = data
+                        changed[event] = data
+            for event, data in changed.items():
+                event_bus.publish(event, data)
+        except Exception as e:
+            logger.error(f"状态监视错误: {str(e)}")
+
+def ensure_state_monitor():
+    """确保状态监视线程正在运行"""
+    global state_monitor_thread
+    with live_state_lock:
+        if state_monitor_thread is None or not state_monitor_thread.is_alive():
+            state_monitor_thread = threading.Thread(target=state_monitor, daemon=True)
+            state_monitor_thread.start()
+
+def format_sse(event, data):
+    """格式化一条 Server-Sent Events 消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/api/events')
+@login_required
+def event_stream():
+    """服务器推送事件流：连接时发送完整状态，之后只推送变化"""
+    ensure_state_monitor()
+    subscriber = event_bus.subscribe()
+    notify_state_changed()
+    
+    def generate():
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            for event, data in get_live_state().items():
+                yield format_sse(event, data)
+            while True:
+                try:
+                    event, data = subscriber.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if event == 'resync':
+                    for event, data in get_live_state().items():
+                        yield format_sse(event, data)
+                else:
+                    yield format_sse(event, data)
+        finally:
+            event_bus.unsubscribe(subscriber)
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def acquire_leadership():
+    """尝试取得主进程锁，成功返回True
+
+    锁随进程退出自动释放，其他工作进程随后可以接管。
+    """
+    global leader_lock_file
+    if leader_lock_file is not None:
+        return True
+    os.makedirs(DATA_DIR, mode=0o700, exist_ok=True)
+    lock_file = open(LEADER_LOCK_FILE, 'a+')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    leader_lock_file = lock_file
+    return True
+
+def start_services():
+    """启动后台服务：取得主进程锁的进程运行定时任务和音频设备，其余进程转发请求"""
+    # 每个进程都提供音乐列表接口，各自维护音乐库索引
+    ensure_music_watcher()
+    if acquire_leadership():
+        start_leader_services()
+    else:
+        start_follower_services()
+
+def start_leader_services():
+    """主进程：打开音频设备，启动定时任务等后台线程和控制通道"""
+    global service_role
+    service_role = 'leader'
+    logger.info(f"进程 {os.getpid()} 成为主进程，负责定时任务和音频设备")
+    
+    # 加载音量设置
+    load_volume()
+    
+    # 打开常驻音频设备
+    if audio_output.open():
+        logger.info("音频系统初始化成功")
+    else:
+        logger.warning("音频系统初始化失败，将在播放时重试")
+    
+    start_background_threads()
+    threading.Thread(target=serve_control_channel, daemon=True).start()
+
+def start_follower_services():
+    """从进程：只提供接口，转发播放命令并中继主进程的事件，同时等待接管"""
+    global service_role
+    service_role = 'follower'
+    logger.info(f"进程 {os.getpid()} 作为从进程运行，播放命令将转发给主进程")
+    threading.Thread(target=relay_leader_events, daemon=True).start()
+    threading.Thread(target=standby_for_leadership, daemon=True).start()
+
+def standby_for_leadership():
+    """从进程定期尝试取得主进程锁，主进程退出后接管"""
+    while service_role == 'follower':
+        time.sleep(LEADER_RETRY_SECONDS)
+        if acquire_leadership():
+            logger.warning("主进程已退出，本进程接管定时任务和音频设备")
+            start_leader_services()
+            notify_state_changed()
+
+def _control_authkey():
+    """获取控制通道的认证密钥
+
+    密钥随机生成并以 0600 权限保存在数据目录中，同一部署的各工作进程共用。
+    先写临时文件再用 os.link 放到正式位置，多个进程同时首次启动时
+    只有一个能创建成功，其余进程读取已有的密钥。
+    """
+    global control_authkey
+    if control_authkey is not None:
+        return control_authkey
+    try:
+        with open(CONTROL_KEY_FILE, 'rb') as f:
+            key = f.read()
+    except FileNotFoundError:
+        key = b''
+    if not key:
+        temp_file = f"{CONTROL_KEY_FILE}.{os.getpid()}.tmp"
+        fd = os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(secrets.token_bytes(32))
+            os.link(temp_file, CONTROL_KEY_FILE)
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(temp_file)
+        with open(CONTROL_KEY_FILE, 'rb') as f:
+            key = f.read()
+    control_authkey = key
+    return key
+
+def serve_control_channel():
+    """主进程的控制通道，供同一主机上的其他工作进程转发命令"""
+    try:
+        if os.path.exists(CONTROL_SOCKET):
+            os.unlink(CONTROL_SOCKET)
+        listener = Listener(CONTROL_SOCKET, family='AF_UNIX', authkey=_control_authkey())
+        os.chmod(CONTROL_SOCKET, 0o600)
+    except Exception as e:
+        logger.error(f"启动控制通道失败: {str(e)}")
+        return
     
+    while True:
+        try:
+            conn = listener.accept()
+        except Exception as e:
+            logger.error(f"控制通道连接失败: {str(e)}")
+            continue
+        threading.Thread(target=handle_control_connection, args=(conn,), daemon=True).start()
+
+def handle_control_connection(conn):
+    """处理一个控制通道连接上的请求"""
     try:
-        is_holiday = chinese_calendar.is_holiday(today)
-        is_in_lieu = chinese_calendar.is_in_lieu(today)
-        is_workday = chinese_calendar.is_workday(today)
+        command, args, kwargs = conn.recv()
+        if command == 'subscribe':
+            # 持续转发本进程的事件，直到对方断开
+            subscriber = event_bus.subscribe()
+            ensure_state_monitor()
+            notify_state_changed()
+            try:
+                conn.send(('playback', get_playback_state()))
+                while True:
+                    try:
+                        conn.send(subscriber.get(timeout=SSE_KEEPALIVE_SECONDS))
+                    except queue.Empty:
+                        conn.send(('keepalive', None))
+            finally:
+                event_bus.unsubscribe(subscriber)
         
-        return jsonify({
-            'is_holiday': is_holiday,
-            'is_in_lieu': is_in_lieu,
-            'is_workday': is_workday
-        })
+        handlers = {
+            'submit': submit_playback,
+            'job': get_playback_job,
+            'wait': wait_playback_job,
+            'audio_status': audio_output.status,
+            'preflight': get_preflight_status,
+            'clear_logs': clear_logs,
+            'set_volume': lambda volume: set_volume(volume) and current_volume,
+            'get_volume': get_volume,
+            'notify': apply_remote_change
+        }
+        try:
+            conn.send(('ok', handlers[command](*args, **kwargs)))
+        except Exception as e:
+            conn.send(('error', str(e)))
+    except (EOFError, OSError):
+        pass
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        logger.error(f"处理控制命令失败: {str(e)}")
+    finally:
+        conn.close()
+
+def notify_leader(change):
+    """从进程修改了时间表或配置后通知主进程立即重新加载"""
+    if service_role != 'follower':
+        return
+    try:
+        leader_request('notify', change)
+    except Exception as e:
+        logger.warning(f"通知主进程重新加载失败，将在下次检查时生效: {str(e)}")
+
+def apply_remote_change(change):
+    """主进程处理从进程的修改通知"""
+    if change == 'schedule':
+        # 其他进程的版本号与本进程无关，整体重新加载
+        post_schedule_changes()
+        notify_schedule_changed()
+    elif change == 'config':
+        invalidate_workday_calendar()
+        notify_state_changed()
+
+def leader_request(command, *args, timeout=LEADER_REQUEST_TIMEOUT, **kwargs):
+    """向主进程发送命令并返回结果"""
+    with Client(CONTROL_SOCKET, family='AF_UNIX', authkey=_control_authkey()) as conn:
+        conn.send((command, args, kwargs))
+        if not conn.poll(timeout):
+            raise TimeoutError('主进程响应超时')
+        status, result = conn.recv()
+    if status == 'error':
+        raise RuntimeError(result)
+    return result
+
+def relay_leader_events():
+    """从进程订阅主进程的事件，转发给本进程的页面"""
+    global leader_playback_state
+    while service_role == 'follower':
+        try:
+            with Client(CONTROL_SOCKET, family='AF_UNIX', authkey=_control_authkey()) as conn:
+                conn.send(('subscribe', (), {}))
+                while service_role == 'follower':
+                    event, data = conn.recv()
+                    if event == 'logs':
+                        # 主进程的日志记入本进程缓冲区，使用本进程的序号
+                        for line in data['lines']:
+                            seq = append_log_line(line)
+                            event_bus.publish('logs', {'lines': [line], 'last_seq': seq})
+                    elif event == 'logs_cleared':
+                        clear_log_buffer()
+                    elif event == 'playback':
+                        leader_playback_state = data
+                        notify_state_changed()
+                    elif event == 'playback_job':
+                        event_bus.publish(event, data)
+                    elif event == 'schedule':
+                        event_bus.publish(event, data)
+                        notify_state_changed()
+                    elif event in ('calendar', 'task_overview'):
+                        # 配置或执行记录在主进程发生变化，本进程重新计算
+                        workday_calendar_dirty.set()
+                        notify_state_changed()
+        except Exception:
+            # 主进程尚未就绪或已退出，稍后重试
+            time.sleep(LEADER_RETRY_SECONDS)
 
 if __name__ == '__main__':
     try:
@@ -1163,13 +4262,10 @@ if __name__ == '__main__':
             import locale
             locale.setlocale(locale.LC_ALL, 'C.UTF-8')
         
-        # 加载音量设置
-        load_volume()
-        
-        # 启动后台线程
-        start_background_threads()
+        # 启动后台服务（加载音量、打开音频设备、启动后台线程）
+        start_services()
 
-        # 启动Flask应用
+        # 启动Flask应用（开发服务器，生产环境请使用 gunicorn -c gunicorn.conf.py wsgi:app）
         app.run(host='0.0.0.0', port=80, threaded=True)
     except Exception as e:
         logger.error(f"应用启动失败: {str(e)}")
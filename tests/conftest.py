@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""测试公共设置
+
+play_music 在导入时按 HOME 确定数据目录并打开日志文件，
+因此先把 HOME 指向临时目录、使用虚拟音频设备，再导入模块。
+"""
+import os
+import tempfile
+
+os.environ['HOME'] = tempfile.mkdtemp(prefix='time-play-test-')
+os.environ['SDL_AUDIODRIVER'] = 'dummy'
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+
+import queue
+
+import pytest
+
+import play_music
+
+
+@pytest.fixture(autouse=True)
+def isolated_files(tmp_path, monkeypatch):
+    """每个测试使用独立的配置文件、时间表文件和执行记录数据库"""
+    for store, name in ((play_music.config_store, 'config.json'), (play_music.schedule_store, 'schedule.json')):
+        monkeypatch.setattr(store, 'path', str(tmp_path / name))
+        monkeypatch.setattr(store, 'data', None)
+        monkeypatch.setattr(store, 'mtime', None)
+    monkeypatch.setattr(play_music, 'SCHEDULE_FILE', str(tmp_path / 'schedule.json'))
+    monkeypatch.setattr(play_music, 'HISTORY_DB', str(tmp_path / 'history.db'))
+    monkeypatch.setattr(play_music, 'history_db', None)
+    monkeypatch.setattr(play_music, 'last_fired_at', {})
+    monkeypatch.setitem(play_music.schedule_cache, 'index', None)
+    play_music.invalidate_workday_calendar()
+    yield tmp_path
+    if play_music.history_db is not None:
+        play_music.history_db.close()
+    # 丢弃测试中发给定时任务线程的修改
+    while True:
+        try:
+            play_music.schedule_changes.get_nowait()
+        except queue.Empty:
+            break
+
+
+
+@pytest.fixture
+def make_task():
+    """返回构造规范化任务的函数：make_task(任务ID, 时间, **其他字段)"""
+    def make(task_id, time, **fields):
+        return play_music.normalize_task(dict({'time': time, 'music_file': 'bell.mp3'}, **fields), task_id)
+    return make
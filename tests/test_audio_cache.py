@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""已解码音频缓存：LRU 淘汰、预检文件的固定和响度校正"""
+import os
+import wave
+
+import numpy as np
+import pygame
+import pytest
+
+from play_music import AudioCache, scale_samples
+
+
+@pytest.fixture(scope='module', autouse=True)
+def mixer():
+    # 根目录的 test_audio.py 会把 SDL_AUDIODRIVER 改为 alsa
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+    pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=512)
+    yield
+    pygame.mixer.quit()
+
+
+def write_wav(path, seconds=0.5, level=0):
+    samples = np.full((int(44100 * seconds), 2), level, dtype=np.int16)
+    with wave.open(str(path), 'wb') as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(44100)
+        f.writeframes(samples.tobytes())
+    return str(path)
+
+
+def test_lru_eviction(tmp_path):
+    paths = [write_wav(tmp_path / f"{name}.wav") for name in 'abc']
+    one = AudioCache.estimate_bytes(paths[0])
+    cache = AudioCache(one * 2)
+    for path in paths:
+        assert cache.load(path) is not None
+    assert cache.status()['files'] == ['b.wav', 'c.wav']
+
+
+def test_pinned_files_are_not_evicted(tmp_path):
+    paths = [write_wav(tmp_path / f"{name}.wav") for name in 'abc']
+    cache = AudioCache(AudioCache.estimate_bytes(paths[0]) * 2)
+    cache.pin([paths[0]])
+    for path in paths:
+        cache.load(path)
+    assert cache.contains(paths[0])
+    assert cache.status()['files'] == ['a.wav', 'c.wav']
+
+    # 固定的文件合计超出预算时保留，解除固定后淘汰
+    cache.pin(paths[1:])
+    cache.load(paths[1])
+    assert set(cache.status()['files']) == {'b.wav', 'c.wav'}
+    cache.pin([])
+    assert cache.total_bytes <= cache.budget_bytes
+
+
+def test_contains_detects_modified_file(tmp_path):
+    path = write_wav(tmp_path / 'a.wav')
+    cache = AudioCache(10 * 1024 * 1024)
+    cache.load(path)
+    hits = cache.hits
+    assert cache.contains(path)
+    assert cache.hits == hits  # 不计入命中统计
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert not cache.contains(path)
+
+
+
+def test_scale_samples_boosts_and_clips():
+    samples = np.array([[1000, -1000], [20000, -20000]], dtype=np.int16)
+    scaled = scale_samples(samples, 2.0)
+    assert scaled.dtype == np.int16
+    assert scaled.tolist() == [[2000, -2000], [32767, -32768]]
+    assert scale_samples(samples, 1.0) is samples
+
+
+def test_cached_sound_is_scaled_per_gain(tmp_path):
+    path = write_wav(tmp_path / 'quiet.wav', level=1000)
+    cache = AudioCache(10 * 1024 * 1024)
+    sound = cache.load(path, 2.0)
+    assert int(pygame.sndarray.array(sound).max()) == 2000
+    assert cache.get(path, 2.0) is sound
+    assert cache.contains(path, 2.0)
+    # 校正系数变化后需要重新解码
+    assert cache.get(path) is None
+    assert not cache.contains(path, 1.5)
+    assert int(pygame.sndarray.array(cache.load(path)).max()) == 1000
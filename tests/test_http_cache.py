@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""按天缓存的接口：ETag/Last-Modified 和 304"""
+import pytest
+
+import play_music
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setitem(play_music.app.config, 'LOGIN_DISABLED', True)
+    play_music.invalidate_daily_responses()
+    yield play_music.app.test_client()
+    play_music.invalidate_daily_responses()
+
+
+def test_revalidation_returns_304(client):
+    response = client.get('/api/week-schedule')
+    assert response.status_code == 200
+    assert response.get_json() == play_music.DEFAULT_WEEK_SCHEDULE
+    assert response.headers['Cache-Control'] == 'no-cache'
+    etag = response.headers['ETag']
+
+    cached = client.get('/api/week-schedule', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+    assert client.get('/api/week-schedule', headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_content_is_computed_once_per_day(client, monkeypatch):
+    calls = []
+
+    def compute(today):
+        calls.append(today)
+        return {'is_holiday': False, 'is_in_lieu': False, 'is_workday': True}
+
+    monkeypatch.setattr(play_music, 'compute_holiday_info', compute)
+    first = client.get('/api/holiday-info')
+    second = client.get('/api/holiday-info', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 304
+    assert len(calls) == 1
+
+
+def test_config_change_invalidates_etag(client):
+    etag = client.get('/api/week-schedule').headers['ETag']
+    saved = client.post('/api/week-schedule', json={'odd_week_rest': False, 'even_week_rest': False})
+    assert saved.get_json() == {'status': 'success'}
+
+    response = client.get('/api/week-schedule', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['odd_week_rest'] is False
+    assert response.headers['ETag'] != etag
+
+
+def test_unchanged_content_keeps_last_modified(client):
+    first = play_music.get_daily_response('constant', lambda today: {'value': 1})
+    # 配置变化后重新计算，内容相同时浏览器的缓存仍然有效
+    play_music.update_config(lambda config: config.__setitem__('volume', 50))
+    second = play_music.get_daily_response('constant', lambda today: {'value': 1})
+    assert second['key'] != first['key']
+    assert second['etag'] == first['etag']
+    assert second['last_modified'] == first['last_modified']
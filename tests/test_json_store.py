@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""JsonFileStore：快照、版本号、并发修改和格式迁移"""
+import json
+import os
+import threading
+
+from play_music import JsonFileStore
+
+
+def make_store(tmp_path, **kwargs):
+    return JsonFileStore(str(tmp_path / 'data.json'), default=lambda: {'items': []}, **kwargs)
+
+
+def test_default_content_until_first_write(tmp_path):
+    store = make_store(tmp_path)
+    version, data = store.snapshot()
+    assert data == {'items': []}
+    assert not os.path.exists(store.path)
+    # 没有变化时返回同一个快照，版本号不变
+    assert store.snapshot() == (version, data)
+    assert store.snapshot()[1] is data
+
+
+def test_update_bumps_version_and_keeps_old_snapshot(tmp_path):
+    changes = []
+    store = make_store(tmp_path, on_change=lambda: changes.append(store.version))
+    version, before = store.snapshot()
+    result = store.update(lambda data: data['items'].append(1) or 'done')
+    assert result == 'done'
+    new_version, after = store.snapshot()
+    assert new_version == version + 1
+    assert after == {'items': [1]}
+    assert before == {'items': []}  # 已发布的快照不会被修改
+    assert changes == [new_version]
+    with open(store.path, encoding='utf-8') as f:
+        assert json.load(f) == {'items': [1]}
+
+
+def test_failed_update_is_not_saved(tmp_path):
+    store = make_store(tmp_path)
+    store.update(lambda data: data['items'].append(1))
+    version = store.snapshot()[0]
+
+    def fail(data):
+        data['items'].append(2)
+        raise ValueError('bad')
+
+    try:
+        store.update(fail)
+    except ValueError:
+        pass
+    assert store.snapshot() == (version, {'items': [1]})
+    with open(store.path, encoding='utf-8') as f:
+        assert json.load(f) == {'items': [1]}
+
+
+def test_reloads_after_external_edit(tmp_path):
+    store = make_store(tmp_path)
+    store.update(lambda data: data['items'].append(1))
+    version = store.snapshot()[0]
+    with open(store.path, 'w', encoding='utf-8') as f:
+        json.dump({'items': [1, 2]}, f)
+    os.utime(store.path, ns=(0, store.mtime + 1))
+    assert store.snapshot() == (version + 1, {'items': [1, 2]})
+
+
+def test_corrupt_file_keeps_last_good_content(tmp_path):
+    store = make_store(tmp_path)
+    store.update(lambda data: data['items'].append(1))
+    version = store.snapshot()[0]
+    with open(store.path, 'w', encoding='utf-8') as f:
+        f.write('{not json')
+    os.utime(store.path, ns=(0, store.mtime + 1))
+    assert store.snapshot() == (version, {'items': [1]})
+
+
+def test_two_stores_on_one_file_do_not_lose_updates(tmp_path):
+    # 两个实例相当于两个进程，各自用文件锁串行化
+    stores = [make_store(tmp_path), make_store(tmp_path)]
+
+    def worker(store):
+        for _ in range(25):
+            store.update(lambda data: data['items'].append(len(data['items'])))
+
+    threads = [threading.Thread(target=worker, args=(store,)) for store in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with open(stores[0].path, encoding='utf-8') as f:
+        assert json.load(f)['items'] == list(range(50))
+
+
+def test_migrate_writes_back_only_when_changed(tmp_path):
+    calls = []
+
+    def migrate(data):
+        calls.append(dict(data))
+        if 'version' in data:
+            return data, False
+        return {'version': 2, 'items': data['items']}, True
+
+    path = tmp_path / 'data.json'
+    path.write_text(json.dumps({'items': [1]}), encoding='utf-8')
+    store = make_store(tmp_path, migrate=migrate)
+    assert store.snapshot()[1] == {'version': 2, 'items': [1]}
+    assert json.loads(path.read_text(encoding='utf-8')) == {'version': 2, 'items': [1]}
+
+    # 写回的文件不会再次触发迁移
+    mtime = store.mtime
+    store.data = None
+    assert store.snapshot()[1] == {'version': 2, 'items': [1]}
+    assert store.mtime == mtime
+    assert len(calls) == 2
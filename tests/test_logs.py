@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""日志游标：增量读取、缓冲区溢出和清除"""
+from collections import deque
+
+import pytest
+
+import play_music
+
+
+@pytest.fixture(autouse=True)
+def small_log_buffer(monkeypatch):
+    monkeypatch.setattr(play_music, 'log_buffer', deque(maxlen=5))
+    monkeypatch.setattr(play_music, 'log_seq', 0)
+    monkeypatch.setattr(play_music, 'log_cleared_seq', 0)
+
+
+def append(*lines):
+    return [play_music.append_log_line(line) for line in lines]
+
+
+def test_returns_only_new_lines():
+    append('a', 'b')
+    result = play_music.get_logs_since(0, 10)
+    assert result == {'logs': ['a', 'b'], 'last_seq': 2, 'reset': False, 'more': False}
+    append('c')
+    assert play_music.get_logs_since(result['last_seq'], 10)['logs'] == ['c']
+    # 没有新日志时游标不变
+    assert play_music.get_logs_since(3, 10) == {'logs': [], 'last_seq': 3, 'reset': False, 'more': False}
+
+
+def test_limit_pages_through_new_lines():
+    append('a', 'b', 'c')
+    first = play_music.get_logs_since(0, 2)
+    assert first['logs'] == ['a', 'b'] and first['more']
+    second = play_music.get_logs_since(first['last_seq'], 2)
+    assert second['logs'] == ['c'] and not second['more']
+
+
+def test_cursor_older_than_buffer_resets():
+    append(*'abcdefg')  # 缓冲区只保留最后 5 条
+    result = play_music.get_logs_since(1, 3)
+    assert result == {'logs': ['e', 'f', 'g'], 'last_seq': 7, 'reset': True, 'more': False}
+    # 游标正好接上缓冲区最早的一条时不需要重置
+    assert play_music.get_logs_since(2, 10)['logs'] == list('cdefg')
+
+
+def test_cursor_from_the_future_resets():
+    append('a')
+    assert play_music.get_logs_since(99, 10)['reset']
+
+
+def test_clear_resets_existing_cursors():
+    append('a', 'b')
+    play_music.clear_log_buffer()
+    result = play_music.get_logs_since(2, 10)
+    assert result == {'logs': [], 'last_seq': 3, 'reset': True, 'more': False}
+    append('c')
+    assert play_music.get_logs_since(result['last_seq'], 10)['logs'] == ['c']
+
+
+def test_logs_api(monkeypatch):
+    monkeypatch.setitem(play_music.app.config, 'LOGIN_DISABLED', True)
+    append('a', 'b', 'c')
+    client = play_music.app.test_client()
+    assert client.get('/api/logs?since=1').get_json()['logs'] == ['b', 'c']
+    assert client.get('/api/logs?limit=2').get_json() == {'logs': ['b', 'c'], 'last_seq': 3}
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""错过策略和启动恢复"""
+import datetime
+
+import play_music
+from play_music import ScheduleIndex
+
+
+def test_misfire_grace_defaults_and_floor(make_task):
+    assert play_music.get_misfire_grace(make_task('a', '08:00')) == play_music.DEFAULT_MISFIRE_GRACE_SECONDS
+    assert play_music.get_misfire_grace(make_task('a', '08:00', misfire_grace=1200)) == 1200
+    # 宽限时间不小于准时的容差
+    assert play_music.get_misfire_grace(make_task('a', '08:00', misfire_grace=0)) == play_music.SCHEDULE_MISFIRE_SECONDS
+    play_music.update_config(lambda config: config.update(misfire_grace_seconds=300))
+    assert play_music.get_misfire_grace(make_task('a', '08:00')) == 300
+
+
+def test_misfire_outcome_by_policy(make_task):
+    fire_at = datetime.datetime(2025, 3, 3, 8, 0)
+    tasks = {
+        'skip': make_task('skip', '08:00'),
+        'late': make_task('late', '08:00', misfire='run_late', misfire_grace=600),
+        'coalesce': make_task('coalesce', '08:00', misfire='coalesce', misfire_grace=3 * 86400),
+    }
+    index = ScheduleIndex(list(tasks.values()))
+    within = fire_at + datetime.timedelta(minutes=5)
+    beyond = fire_at + datetime.timedelta(minutes=20)
+    assert play_music.misfire_outcome(index, tasks['skip'], fire_at, within) == 'missed'
+    assert play_music.misfire_outcome(index, tasks['late'], fire_at, within) == 'play'
+    assert play_music.misfire_outcome(index, tasks['late'], fire_at, beyond) == 'missed'
+
+    # 两天后恢复：前一次并入之后的触发，最近一次补播
+    now = fire_at + datetime.timedelta(days=1, hours=1)
+    assert play_music.misfire_outcome(index, tasks['coalesce'], fire_at, now) == 'coalesced'
+    assert play_music.misfire_outcome(index, tasks['coalesce'], fire_at + datetime.timedelta(days=1), now) == 'play'
+
+
+def test_coalesce_ignores_days_the_task_does_not_run(make_task):
+    task = make_task('mon', '08:00', misfire='coalesce', misfire_grace=7 * 86400, weekdays=[0])
+    index = ScheduleIndex([task])
+    monday = datetime.datetime(2025, 3, 3, 8, 0)
+    assert play_music.misfire_outcome(index, task, monday, monday + datetime.timedelta(days=3)) == 'play'
+
+
+def test_scheduler_state_round_trip():
+    fired_at = datetime.datetime(2025, 3, 3, 8, 0)
+    play_music.save_last_fired('a', fired_at)
+    play_music.save_last_fired('gone', fired_at)
+    play_music.save_heartbeat(fired_at + datetime.timedelta(seconds=5))
+    heartbeat, fired = play_music.load_scheduler_state({'a'})
+    assert heartbeat == fired_at + datetime.timedelta(seconds=5)
+    assert fired == {'a': fired_at}
+    # 已删除任务的记录被清理
+    assert play_music.load_scheduler_state({'a', 'gone'})[1] == {'a': fired_at}
+
+
+def test_recover_without_heartbeat_checks_recent_window(make_task):
+    now = datetime.datetime(2025, 3, 3, 9, 0)
+    cursor = play_music.recover_schedule_cursor(ScheduleIndex([make_task('a', '08:00')]), now)
+    assert cursor == now - datetime.timedelta(seconds=play_music.SCHEDULE_MISFIRE_SECONDS)
+
+
+def test_recover_resumes_from_heartbeat(make_task):
+    index = ScheduleIndex([make_task('a', '08:00'), make_task('b', '08:30')])
+    now = datetime.datetime(2025, 3, 3, 9, 0)
+    heartbeat = datetime.datetime(2025, 3, 3, 7, 0)
+    play_music.save_heartbeat(heartbeat)
+    play_music.save_last_fired('a', datetime.datetime(2025, 3, 3, 8, 0))
+    assert play_music.recover_schedule_cursor(index, now) == heartbeat
+    # 已处理过的触发载入内存，定时任务线程据此跳过
+    assert play_music.last_fired_at == {'a': datetime.datetime(2025, 3, 3, 8, 0)}
+
+
+def test_recover_is_limited_to_recovery_days(make_task):
+    now = datetime.datetime(2025, 3, 30, 9, 0)
+    play_music.save_heartbeat(now - datetime.timedelta(days=30))
+    cursor = play_music.recover_schedule_cursor(ScheduleIndex([make_task('a', '08:00')]), now)
+    assert cursor == now - datetime.timedelta(days=play_music.SCHEDULE_RECOVERY_DAYS)
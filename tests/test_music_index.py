@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""音乐库索引：扫描在后台进行，不阻塞读取"""
+import json
+import threading
+
+import pytest
+
+import play_music
+
+
+@pytest.fixture
+def music_dir(tmp_path, monkeypatch):
+    directory = tmp_path / 'music'
+    directory.mkdir()
+    monkeypatch.setattr(play_music, 'MUSIC_DIR', str(directory))
+    monkeypatch.setattr(play_music, 'MUSIC_INDEX_FILE', str(tmp_path / 'music_index.json'))
+    monkeypatch.setattr(play_music, 'music_index', {'files': {}, 'version': 0, 'dir_mtime': None, 'scanned_at': 0.0})
+    monkeypatch.setattr(play_music, 'ensure_music_watcher', lambda: None)
+    return directory
+
+
+def test_persisted_index_is_served_while_scanning(music_dir, monkeypatch):
+    old_entry = {'name': 'old.wav', 'size': 1, 'mtime': 1, 'hash': None}
+    with open(play_music.MUSIC_INDEX_FILE, 'w', encoding='utf-8') as f:
+        json.dump({'music_dir': play_music.MUSIC_DIR, 'files': {'old.wav': old_entry}}, f)
+    (music_dir / 'new.wav').write_bytes(b'RIFF')
+
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_index(name, stat):
+        started.set()
+        release.wait(5)
+        return {'name': name, 'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': None}
+
+    monkeypatch.setattr(play_music, 'index_music_file', slow_index)
+    scan = threading.Thread(target=play_music.scan_music_index, kwargs={'full': True})
+    scan.start()
+    assert started.wait(5)
+
+    # 扫描进行中，读取立即返回上次保存的索引
+    version, files = play_music.get_music_index()
+    assert list(files) == ['old.wav']
+    assert not release.is_set()
+
+    release.set()
+    scan.join(5)
+    new_version, files = play_music.get_music_index()
+    assert list(files) == ['new.wav'] and new_version > version
+    with open(play_music.MUSIC_INDEX_FILE, encoding='utf-8') as f:
+        assert list(json.load(f)['files']) == ['new.wav']
+
+
+def test_unchanged_files_are_not_reindexed(music_dir, monkeypatch):
+    (music_dir / 'a.wav').write_bytes(b'RIFF')
+    calls = []
+    monkeypatch.setattr(play_music, 'index_music_file',
+                        lambda name, stat: calls.append(name) or
+                        {'name': name, 'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': None})
+    play_music.scan_music_index(full=True)
+    version = play_music.music_index['version']
+    play_music.scan_music_index(full=True)
+    assert calls == ['a.wav']
+    assert play_music.music_index['version'] == version
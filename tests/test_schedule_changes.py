@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""修改时间表时发给定时任务线程的增量修改"""
+import play_music
+from play_music import ScheduleIndex
+
+
+def take_changes():
+    messages = []
+    while not play_music.schedule_changes.empty():
+        messages.append(play_music.schedule_changes.get_nowait())
+    return messages
+
+
+def apply_changes(index, version, messages):
+    """与定时任务线程相同的方式应用修改，返回新的版本号"""
+    for base_version, changes in messages:
+        assert base_version == version
+        for action, task in changes:
+            if action == 'remove':
+                index.remove(task['id'])
+            else:
+                index.add(task)
+        version += 1
+    return version
+
+
+def test_each_edit_posts_its_changes(make_task):
+    version, data = play_music.schedule_store.snapshot()
+    index = ScheduleIndex(data['tasks'])
+
+    ok, _ = play_music.modify_schedule(lambda tasks: tasks.extend([make_task('a', '08:00'), make_task('b', '09:00')]))
+    assert ok
+    messages = take_changes()
+    assert [(base, [(action, task['id']) for action, task in changes]) for base, changes in messages] == \
+        [(version, [('add', 'a'), ('add', 'b')])]
+    version = apply_changes(index, version, messages)
+
+    def edit(tasks):
+        tasks[0]['time'] = '10:00:00'
+        del tasks[1]
+        tasks.append(make_task('c', '07:00'))
+
+    play_music.modify_schedule(edit)
+    messages = take_changes()
+    assert sorted((action, task['id']) for action, task in messages[0][1]) == \
+        [('add', 'c'), ('remove', 'b'), ('update', 'a')]
+    version = apply_changes(index, version, messages)
+
+    # 增量调整后的索引与按文件重新建立的一致
+    store_version, data = play_music.schedule_store.snapshot()
+    assert version == store_version
+    rebuilt = ScheduleIndex(data['tasks'])
+    assert index.ids == rebuilt.ids == ['c', 'a']
+    assert list(index.seconds) == list(rebuilt.seconds)
+
+
+def test_unchanged_tasks_are_not_posted(make_task):
+    play_music.modify_schedule(lambda tasks: tasks.append(make_task('a', '08:00')))
+    take_changes()
+    play_music.modify_schedule(lambda tasks: None)
+    assert [changes for _, changes in take_changes()] == [[]]
+
+
+def test_failed_edit_posts_nothing(make_task):
+    def fail(tasks):
+        tasks.append(make_task('a', '08:00'))
+        raise ValueError('bad')
+
+    ok, message = play_music.modify_schedule(fail)
+    assert not ok and 'bad' in message
+    assert take_changes() == []
+    assert play_music.load_schedule() == []
+
+
+def test_follower_does_not_post(monkeypatch, make_task):
+    monkeypatch.setattr(play_music, 'service_role', 'follower')
+    monkeypatch.setattr(play_music, 'notify_leader', lambda change: None)
+    play_music.modify_schedule(lambda tasks: tasks.append(make_task('a', '08:00')))
+    assert take_changes() == []
+
+
+def test_remote_change_requests_reload():
+    play_music.apply_remote_change('schedule')
+    assert take_changes() == [None]
+    assert play_music.schedule_wakeup.is_set()
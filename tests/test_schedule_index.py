@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""ScheduleIndex：时间窗口查询、下一次触发和增量调整"""
+import datetime
+import json
+import random
+
+import play_music
+from play_music import ScheduleIndex
+
+
+def brute_force_next(index, start, count, days, check_workday=True):
+    """逐日用 due() 查找，作为 next_firings 的对照"""
+    end = datetime.datetime.combine(start.date() + datetime.timedelta(days=days), datetime.time())
+    return index.due(start, end, check_workday)[:count]
+
+
+def test_due_window_is_half_open_and_sorted(make_task):
+    index = ScheduleIndex([
+        make_task('b', '08:00:00'),
+        make_task('a', '08:00:00'),
+        make_task('c', '08:00:30'),
+        make_task('d', '09:00:00'),
+    ])
+    start = datetime.datetime(2025, 3, 3, 8, 0, 0)
+    firings = index.due(start, start + datetime.timedelta(seconds=30))
+    assert [task['id'] for _, task in firings] == ['a', 'b']
+    assert all(fire_at == start for fire_at, _ in firings)
+
+    # 开始时刻有小数秒时，该秒的触发已经过去
+    firings = index.due(start + datetime.timedelta(microseconds=1), start + datetime.timedelta(minutes=5))
+    assert [task['id'] for _, task in firings] == ['c']
+
+
+def test_due_spans_midnight(make_task):
+    index = ScheduleIndex([make_task('late', '23:59:59'), make_task('early', '00:00:01')])
+    start = datetime.datetime(2025, 3, 3, 23, 0)
+    firings = index.due(start, start + datetime.timedelta(hours=2))
+    assert [(fire_at.day, task['id']) for fire_at, task in firings] == [(3, 'late'), (4, 'early')]
+
+
+def test_runs_on_rules(make_task):
+    index = ScheduleIndex([
+        make_task('mon', '08:00', weekdays=[0]),
+        make_task('range', '08:00', start_date='2025-03-04', end_date='2025-03-05'),
+        make_task('off', '08:00', enabled=False),
+    ])
+    monday = datetime.date(2025, 3, 3)
+    assert index.runs_on('mon', monday)
+    assert not index.runs_on('mon', monday + datetime.timedelta(days=1))
+    assert not index.runs_on('range', monday)
+    assert index.runs_on('range', monday + datetime.timedelta(days=2))
+    assert not index.runs_on('off', monday)
+    assert index.enabled_count == 2
+
+
+def test_next_firings_skips_holiday_for_workday_only_tasks(make_task):
+    index = ScheduleIndex([make_task('bell', '07:30', workday_only=True)])
+    # 2025 年国庆假期为 10 月 1 日至 8 日
+    firings = index.next_firings(datetime.datetime(2025, 9, 30, 12, 0), count=1)
+    assert firings[0][0] == datetime.datetime(2025, 10, 9, 7, 30)
+    # 不检查工作日时每天都触发
+    firings = index.next_firings(datetime.datetime(2025, 9, 30, 12, 0), count=1, check_workday=False)
+    assert firings[0][0] == datetime.datetime(2025, 10, 1, 7, 30)
+
+
+def test_next_firings_matches_day_by_day_search(make_task):
+    rng = random.Random(17)
+    for _ in range(20):
+        tasks = []
+        for n in range(rng.randint(1, 6)):
+            tasks.append(make_task(
+                f"t{n}",
+                f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.choice([0, 30]):02d}",
+                workday_only=rng.random() < 0.7,
+                weekdays=rng.choice([None, [0, 2, 4], [5, 6]]),
+                enabled=rng.random() < 0.9,
+            ))
+        index = ScheduleIndex(tasks)
+        start = datetime.datetime(2025, 1, 1) + datetime.timedelta(minutes=rng.randint(0, 300 * 24 * 60))
+        # 节假日数据只到 2026 年底，两种查找都限制在此之前
+        days = (datetime.date(2027, 1, 1) - start.date()).days
+        assert index.next_firings(start, count=5, max_days=days) == brute_force_next(index, start, 5, days)
+
+
+def test_next_firings_gives_up_after_max_days(make_task):
+    index = ScheduleIndex([make_task('once', '08:00', start_date='2025-01-01', end_date='2025-01-01')])
+    assert index.next_firings(datetime.datetime(2025, 1, 2), count=1) == []
+    assert ScheduleIndex([]).next_firings(datetime.datetime(2025, 1, 2)) == []
+
+
+def test_add_and_remove_match_rebuilt_index(make_task):
+    rng = random.Random(25)
+    index = ScheduleIndex([])
+    tasks = {}
+    for step in range(300):
+        task_id = f"t{rng.randint(0, 15)}"
+        if task_id in tasks and rng.random() < 0.4:
+            assert index.remove(task_id)
+            del tasks[task_id]
+        else:
+            task = make_task(task_id, f"08:{rng.randint(0, 3):02d}:00",
+                             workday_only=rng.random() < 0.5, enabled=rng.random() < 0.8)
+            index.add(task)
+            tasks[task_id] = task
+        rebuilt = ScheduleIndex(list(tasks.values()))
+        assert index.ids == rebuilt.ids
+        assert list(index.seconds) == list(rebuilt.seconds)
+        assert index.enabled_count == rebuilt.enabled_count
+        assert index.workday_only_count == rebuilt.workday_only_count
+    assert not index.remove('missing')
+
+
+def test_migrate_persists_ids_for_tasks_without_id(isolated_files):
+    path = isolated_files / 'schedule.json'
+    path.write_text(json.dumps({'version': 2, 'tasks': [
+        {'time': '08:00', 'music_file': 'a.mp3'},
+        {'id': 'keep', 'time': '09:00', 'music_file': 'b.mp3'},
+    ]}), encoding='utf-8')
+    tasks = play_music.load_schedule()
+    saved = json.loads(path.read_text(encoding='utf-8'))['tasks']
+    assert [task['id'] for task in saved] == [task['id'] for task in tasks]
+    assert tasks[1]['id'] == 'keep'
+
+    # 重新加载得到同样的ID
+    play_music.schedule_store.data = None
+    assert [task['id'] for task in play_music.load_schedule()] == [task['id'] for task in tasks]
+
+
+def test_migrate_v1_schedule(isolated_files):
+    path = isolated_files / 'schedule.json'
+    path.write_text(json.dumps({'08:00': {'music_file': 'a.mp3', 'workday_only': True}}), encoding='utf-8')
+    tasks = play_music.load_schedule()
+    assert [(task['time'], task['workday_only']) for task in tasks] == [('08:00:00', True)]
+    assert json.loads(path.read_text(encoding='utf-8'))['version'] == play_music.SCHEDULE_FORMAT_VERSION
+    assert (isolated_files / 'schedule.json.v1.bak').exists()
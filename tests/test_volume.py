@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""音量参数校验"""
+import pytest
+
+import play_music
+
+
+@pytest.mark.parametrize('value, expected', [(0, 0), (100, 100), ('40', 40), (55.0, 55)])
+def test_parse_volume_accepts_numbers_in_range(value, expected):
+    assert play_music.parse_volume(value) == expected
+
+
+@pytest.mark.parametrize('value', ['abc', '', None, True, [50], -1, 101, float('nan'), float('inf')])
+def test_parse_volume_rejects_invalid_values(value):
+    with pytest.raises(ValueError):
+        play_music.parse_volume(value)
+
+
+@pytest.mark.parametrize('body', [{'volume': 'abc'}, {'volume': 150}, {'volume': None}, {}, [50]])
+def test_set_volume_api_rejects_invalid_input(monkeypatch, body):
+    monkeypatch.setitem(play_music.app.config, 'LOGIN_DISABLED', True)
+    monkeypatch.setattr(play_music, 'set_volume', lambda volume: pytest.fail('不应设置音量'))
+    response = play_music.app.test_client().post('/set_volume', json=body)
+    assert response.status_code == 400
+    assert response.get_json()['status'] == 'error'
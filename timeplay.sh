@@ -84,7 +84,7 @@ Type=simple
 User=$SUDO_USER
 WorkingDirectory=$APP_DIR
 Environment=PYTHONUNBUFFERED=1
-ExecStart=$VENV_DIR/bin/python $APP_DIR/play_music.py
+ExecStart=$VENV_DIR/bin/gunicorn -c $APP_DIR/gunicorn.conf.py wsgi:app
 Restart=on-failure
 RestartSec=5
 StartLimitInterval=60
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+登录性能测试：比较不同密码哈希设置下每秒可完成的登录验证次数
+
+示例:
+    python3 tools/bench_login.py
+    python3 tools/bench_login.py -m pbkdf2:sha256:260000 -m pbkdf2:sha256:50000 -t 1 -t 4
+    python3 tools/bench_login.py --url http://127.0.0.1 --username admin --password xxx
+"""
+import sys
+import time
+import argparse
+import threading
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHODS = [
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:260000',
+    'pbkdf2:sha256:100000',
+    'pbkdf2:sha256:50000',
+]
+
+def measure(func, duration, threads):
+    """在指定线程数下反复执行 func，返回 (完成次数, 实际耗时)"""
+    stop_at = time.perf_counter() + duration
+    counts = [0] * threads
+
+    def worker(index):
+        while time.perf_counter() < stop_at:
+            func()
+            counts[index] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    return sum(counts), time.perf_counter() - start
+
+def bench_local(methods, thread_counts, duration, password='benchmark-password'):
+    """本机测试各哈希方法的验证速度"""
+    print(f"{'哈希方法':<28}{'生成耗时(ms)':>14}", end='')
+    for threads in thread_counts:
+        print(f"{f'{threads}线程 次/秒':>16}", end='')
+    print()
+
+    for method in methods:
+        try:
+            start = time.perf_counter()
+            stored_hash = generate_password_hash(password, method)
+            hash_ms = (time.perf_counter() - start) * 1000
+        except Exception as e:
+            print(f"{method:<28}不支持: {str(e)}")
+            continue
+
+        print(f"{method:<28}{hash_ms:>14.1f}", end='', flush=True)
+        for threads in thread_counts:
+            count, elapsed = measure(lambda: check_password_hash(stored_hash, password), duration, threads)
+            print(f"{count / elapsed:>16.1f}", end='', flush=True)
+        print()
+
+def bench_server(url, username, password, thread_counts, duration):
+    """对运行中的服务测试登录接口的吞吐量（使用服务当前的哈希配置）"""
+    login_url = url.rstrip('/') + '/login'
+    data = urllib.parse.urlencode({'username': username, 'password': password}).encode('utf-8')
+    failures = []
+    lock = threading.Lock()
+
+    class NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    opener = urllib.request.build_opener(NoRedirect)
+
+    def login_once():
+        try:
+            opener.open(login_url, data=data, timeout=30)
+            # 登录成功会重定向到首页，返回200说明停留在登录页（验证失败）
+            with lock:
+                failures.append('用户名或密码错误')
+        except urllib.error.HTTPError as e:
+            if e.code != 302:
+                with lock:
+                    failures.append(f"HTTP {e.code}")
+        except Exception as e:
+            with lock:
+                failures.append(str(e))
+
+    print(f"测试地址: {login_url}")
+    for threads in thread_counts:
+        failures.clear()
+        count, elapsed = measure(login_once, duration, threads)
+        print(f"{threads}线程: {count / elapsed:.1f} 次/秒，失败 {len(failures)} 次")
+        if failures:
+            print(f"  首个错误: {failures[0]}")
+
+def main():
+    parser = argparse.ArgumentParser(description='登录性能测试工具')
+    parser.add_argument('-m', '--method', action='append', dest='methods',
+                        help='要测试的哈希方法，可重复指定（默认测试一组常用设置）')
+    parser.add_argument('-t', '--threads', action='append', type=int, dest='thread_counts',
+                        help='并发线程数，可重复指定（默认 1 和 4）')
+    parser.add_argument('-d', '--duration', type=float, default=3, help='每项测试持续时间（秒）')
+    parser.add_argument('--url', help='测试运行中的服务，如 http://127.0.0.1')
+    parser.add_argument('--username', default='admin', help='测试服务时使用的用户名')
+    parser.add_argument('--password', help='测试服务时使用的密码')
+
+    args = parser.parse_args()
+    thread_counts = args.thread_counts or [1, 4]
+
+    if args.url:
+        if not args.password:
+            print("错误: 测试服务时需要指定 --password")
+            sys.exit(1)
+        bench_server(args.url, args.username, args.password, thread_counts, args.duration)
+    else:
+        bench_local(args.methods or DEFAULT_METHODS, thread_counts, args.duration)
+
+if __name__ == '__main__':
+    main()